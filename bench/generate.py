@@ -0,0 +1,130 @@
+import os
+import json
+import random
+import argparse
+
+# Synthetic inputs for the benchmarks, shaped like datain/submissions.json,
+# aquariumdatain/submissions.json and datain/code_submissions.json, with
+# answer lengths in the range real applications have.
+
+WORDS = (
+    "blockchain ledger token wallet smart contract validator consensus escrow payment "
+    "decentralized marketplace community governance liquidity oracle bridge identity privacy "
+    "zero-knowledge NFT DeFi lending yield staking AI model inference dataset training agent "
+    "analytics dashboard platform users developers onboarding adoption revenue partnership "
+    "security audit scalability latency throughput transparent verifiable incentive reward "
+    "sustainability education remittance cross-border micro-payments compliance regulation "
+    "prototype testnet mainnet integration API SDK open-source cohort residency XRPL hooks"
+).split()
+FILLER = "the a of to and for with on our we will that this is by in as it can".split()
+
+NAME_PARTS = ["Chain", "Ledger", "Garden", "Lens", "Pay", "Mind", "Vault", "Bridge", "Hive", "Nova", "Link", "Flow"]
+APPLICANT_TYPES = ["Project Owner", "Developer", "Researcher", "Designer"]
+TECH = ["Python", "TypeScript", "Rust", "Solidity", "React", "FastAPI", "PostgreSQL", "PyTorch", "xrpl.js", "IPFS"]
+
+def sentence(rng, min_words=8, max_words=20):
+    words = [rng.choice(WORDS) if rng.random() < 0.55 else rng.choice(FILLER)
+             for _ in range(rng.randint(min_words, max_words))]
+    return words[0].capitalize() + " " + " ".join(words[1:]) + "."
+
+def paragraph(rng, min_words, max_words):
+    target = rng.randint(min_words, max_words)
+    sentences = []
+    count = 0
+    while count < target:
+        s = sentence(rng)
+        sentences.append(s)
+        count += len(s.split())
+    return " ".join(sentences)
+
+def code_block(rng, min_lines, max_lines):
+    lines = []
+    for n in range(rng.randint(min_lines, max_lines)):
+        name = rng.choice(WORDS).replace("-", "_").lower()
+        if n % 6 == 0:
+            lines.append(f"def {name}_{n}(ledger, amount):")
+        elif n % 6 == 5:
+            lines.append(f"    return {name}")
+        else:
+            lines.append(f"    {name} = ledger.{rng.choice(WORDS).replace('-', '_').lower()}(amount * {n})")
+    return "\n".join(lines)
+
+def pitch_submission(rng, index):
+    return {
+        "id": index,
+        "name": rng.choice(NAME_PARTS) + rng.choice(NAME_PARTS),
+        "high_level_pitch": sentence(rng, 8, 20),
+        "project_pitch": paragraph(rng, 60, 200),
+        "pitch_video_url": f"https://example.com/video-{index}",
+    }
+
+def aquarium_submission(rng, index):
+    responses = {f"q{n}": paragraph(rng, 20, 120) for n in range(1, 7)}
+    responses["q7"] = str(rng.randint(1, 5))
+    return {
+        "id": f"applicant{index}",
+        "applicant_type": rng.choice(APPLICANT_TYPES),
+        "responses": responses,
+    }
+
+def code_submission(rng, index):
+    return {
+        "id": f"team{index}",
+        "readme": "# " + rng.choice(NAME_PARTS) + "\n\n" + "\n\n".join(
+            paragraph(rng, 60, 200) for _ in range(rng.randint(2, 10))
+        ),
+        "high_level_explanation": paragraph(rng, 40, 120),
+        "hackathon_requirements": paragraph(rng, 20, 80),
+        "code_snippet": code_block(rng, 20, 200),
+        "tech_stack": ", ".join(rng.sample(TECH, rng.randint(2, 5))),
+    }
+
+GENERATORS = {
+    "datain/submissions": pitch_submission,
+    "aquariumdatain/submissions": aquarium_submission,
+    "datain/code_submissions": code_submission,
+}
+
+def write_records(path, records, fmt):
+    """
+    Write records as JSON Lines or as a JSON array, one record at a time.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        f.write("[\n")
+        for index, record in enumerate(records):
+            if index:
+                f.write(",\n")
+            f.write(json.dumps(record, ensure_ascii=False))
+        f.write("\n]")
+
+def generate(out_dir, records, fmt="jsonl", seed=0):
+    """
+    Generate all three input sets with `records` entries each under `out_dir`.
+    Returns {input name: path}.
+    """
+    paths = {}
+    for name, make in GENERATORS.items():
+        rng = random.Random(f"{seed}-{name}")
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        write_records(path, (make(rng, index) for index in range(1, records + 1)), fmt)
+        paths[name] = path
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic submission inputs for benchmarking.")
+    parser.add_argument("--records", type=int, default=100, help="records per input set (10 to 100000)")
+    parser.add_argument("--format", choices=["jsonl", "json"], default="jsonl")
+    parser.add_argument("--out", default="bench/data", help="output folder")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for name, path in generate(args.out, args.records, args.format, args.seed).items():
+        print(f"{name}: {args.records} records -> {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+SCRIPTS_DIR = os.path.join(ROOT, "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from generate import generate  # noqa: E402
+from standin_server import start_standin_server  # noqa: E402
+
+# Each entry point, the generated input it reads and the folders it writes to
+PIPELINES = {
+    "pitch": {"script": "sub_evaluation.py", "input": "datain/submissions", "outputs": ["dataout"]},
+    "panel": {"script": "evaluation_test.py", "input": "datain/submissions", "outputs": ["dataout"]},
+    "aquarium": {"script": "aquarium_evaluation.py", "input": "aquariumdatain/submissions", "outputs": ["aquariumdataout"]},
+    "code-review": {"script": "code_review.py", "input": "datain/code_submissions", "outputs": ["dataout"]},
+}
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def folder_size(path):
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(folder, name))
+    return total
+
+def read_call_metrics(path):
+    """
+    Client-side view of a run from the telemetry file the child wrote:
+    latency of every uncached call (including retries and waiting on the
+    rate limiter), token totals and estimated cost.
+    """
+    latencies = []
+    tokens = 0
+    cost = 0.0
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["outcome"] == "cache_hit":
+                    continue
+                latencies.append(record["latency_ms"] / 1000.0)
+                tokens += (record["prompt_tokens"] or 0) + (record["completion_tokens"] or 0)
+                cost += record["cost_usd"]
+    return sorted(latencies), tokens, cost
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_pipeline(name, input_path, server, concurrency, keep_dir=None, profile=False):
+    """
+    Run one entry point as a child process against the stand-in server, in a
+    fresh working folder, and measure it. With `profile` the script runs with
+    --profile and its per-stage breakdown is added to the result.
+    """
+    pipeline = PIPELINES[name]
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    os.makedirs(os.path.join(workdir, "dataout"), exist_ok=True)
+
+    env = dict(os.environ)
+    env.update({
+        "EVAL_BACKEND": "http",
+        "EVAL_BASE_URL": server.base_url,
+        "OPENAI_API_KEY": "bench",
+        "EVAL_CACHE": "off",
+        "EVAL_CONCURRENCY": str(concurrency),
+        "EVAL_HTTP_POOL_SIZE": str(concurrency),
+        "EVAL_RPM": "1000000000",
+        "EVAL_TPM": "1000000000",
+        "EVAL_METRICS": "on",
+        "EVAL_METRICS_PATH": os.path.join(workdir, "metrics", "llm_calls.jsonl"),
+    })
+
+    with server.stats_lock:
+        server.latencies.clear()
+        for key in server.stats:
+            server.stats[key] = 0
+
+    command = [sys.executable, os.path.join(SCRIPTS_DIR, pipeline["script"]), "--input", input_path]
+    if profile:
+        command.append("--profile")
+        env["EVAL_PROFILE_DIR"] = os.path.join(workdir, "profile")
+    log_path = os.path.join(workdir, "run.log")
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        child = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives the child's own resource usage, including its peak RSS
+        _, status, usage = os.wait4(child.pid, 0)
+    wall = time.perf_counter() - started
+
+    with server.stats_lock:
+        server_latencies = sorted(server.latencies)
+        stats = dict(server.stats)
+    latencies, tokens, cost = read_call_metrics(env["EVAL_METRICS_PATH"])
+
+    output_bytes = sum(
+        folder_size(os.path.join(workdir, folder)) for folder in pipeline["outputs"]
+    )
+    result = {
+        "pipeline": name,
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "wall_seconds": round(wall, 3),
+        "calls": stats["requests"],
+        "calls_per_second": round(stats["requests"] / wall, 2) if wall else 0.0,
+        "rate_limited": stats["rate_limited"],
+        "errors": stats["errors"],
+        # Per call as the scripts see it, and as the server spent on it
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+        },
+        "server_latency_ms": {
+            "p50": round(percentile(server_latencies, 50) * 1000, 1),
+            "p95": round(percentile(server_latencies, 95) * 1000, 1),
+            "p99": round(percentile(server_latencies, 99) * 1000, 1),
+        },
+        "tokens": tokens,
+        "estimated_cost_usd": round(cost, 4),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "output_bytes": output_bytes,
+    }
+    stages_path = os.path.join(workdir, "profile", "stages.json")
+    if profile and os.path.exists(stages_path):
+        with open(stages_path, "r", encoding="utf-8") as f:
+            stages = json.load(f)["stages"]
+        result["stages"] = {stage: {"calls": entry["calls"], "seconds": round(entry["seconds"], 4)}
+                            for stage, entry in stages.items()}
+    if result["exit_code"] != 0:
+        result["log_tail"] = open(log_path, encoding="utf-8").read()[-2000:]
+
+    if keep_dir:
+        shutil.copytree(workdir, os.path.join(keep_dir, name), dirs_exist_ok=True)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def print_table(results):
+    header = f"{'pipeline':<12} {'records':>8} {'wall s':>9} {'calls':>8} {'calls/s':>9} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'out KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['pipeline']:<12} {r['records']:>8} {r['wall_seconds']:>9.2f} {r['calls']:>8} "
+              f"{r['calls_per_second']:>9.1f} {r['latency_ms']['p50']:>8.1f} {r['latency_ms']['p95']:>8.1f} "
+              f"{r['latency_ms']['p99']:>8.1f} {r['peak_rss_mb']:>8.1f} {r['output_bytes'] / 1024:>9.0f}"
+              + ("" if r["exit_code"] == 0 else f"  FAILED ({r['exit_code']})"))
+
+def print_stages(results):
+    """
+    The local stages of each profiled run (everything but the API calls), slowest first.
+    """
+    print("\nLocal stages (seconds, summed over threads):")
+    for r in results:
+        stages = {name: entry for name, entry in r.get("stages", {}).items() if name not in ("api_call", "evaluate")}
+        if stages:
+            ordered = sorted(stages.items(), key=lambda item: -item[1]["seconds"])
+            print(f"  {r['pipeline']:<12} {r['records']:>8}  "
+                  + ", ".join(f"{name} {entry['seconds']:.3f}" for name, entry in ordered))
+
+def print_comparison(results, baseline_path):
+    """
+    Compare wall time, throughput and memory against a saved run.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["pipeline"], r["records"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    for r in results:
+        old = previous.get((r["pipeline"], r["records"]))
+        if not old:
+            continue
+        def ratio(key):
+            return r[key] / old[key] if old[key] else float("nan")
+        print(f"  {r['pipeline']:<12} {r['records']:>8}  wall x{ratio('wall_seconds'):.2f}  "
+              f"calls/s x{ratio('calls_per_second'):.2f}  RSS x{ratio('peak_rss_mb'):.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation pipelines against a latency-controlled stand-in backend.")
+    parser.add_argument("--records", type=int, nargs="+", default=[10, 100], help="input sizes to run (10 to 100000)")
+    parser.add_argument("--pipelines", nargs="+", choices=sorted(PIPELINES), default=sorted(PIPELINES))
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in mean seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--data", default=os.path.join(BENCH_DIR, "data"), help="where generated inputs are kept")
+    parser.add_argument("--results", default=os.path.join(BENCH_DIR, "results"), help="where result JSON files are saved")
+    parser.add_argument("--compare", help="a previous result JSON file to compare against")
+    parser.add_argument("--keep-outputs", help="copy each run's working folder here")
+    parser.add_argument("--profile", action="store_true",
+                        help="run each script with --profile and report its local stages (keep the "
+                             "stack files with --keep-outputs)")
+    args = parser.parse_args(argv)
+
+    server = start_standin_server(
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=0.5,
+    )
+
+    results = []
+    try:
+        for records in args.records:
+            data_dir = os.path.join(args.data, str(records))
+            inputs = generate(data_dir, records, "jsonl")
+            for name in args.pipelines:
+                print(f"Running {name} on {records} records...", flush=True)
+                keep_dir = os.path.join(args.keep_outputs, str(records)) if args.keep_outputs else None
+                result = run_pipeline(name, inputs[PIPELINES[name]["input"]], server, args.concurrency, keep_dir,
+                                      args.profile)
+                result["records"] = records
+                results.append(result)
+    finally:
+        server.shutdown()
+
+    print()
+    print_table(results)
+    if args.profile:
+        print_stages(results)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    os.makedirs(args.results, exist_ok=True)
+    output_path = os.path.join(args.results, f"bench_{report['commit']}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, "w", encoding="utf-8") as out:
+        json.dump(report, out, indent=2)
+    print(f"\nResults saved to {output_path}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+if __name__ == "__main__":
+    main()
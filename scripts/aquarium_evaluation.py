@@ -1,11 +1,27 @@
 import os
-import json
-import csv
-import openai
+import argparse
+import itertools
+import statistics
+
+from cascade import Cascade, add_cascade_arguments
+from checkpoint import Journal
+from dedup import DuplicateLinker, find_duplicates, DEDUP_MODE
+from eval_engine import run_jobs, iter_batches, MAX_CONCURRENCY
+from jsonl_io import JsonlWriter, iter_records, rank_jsonl, read_at, write_ranked_json
+from leaderboard import Leaderboard, LEADERBOARD_SIZE, write_csv_atomic
+from llm_cache import get_cache
+from llm_backend import get_backend
+from multi_persona import get_multi_persona_evaluation, MULTI_PERSONA_MODE
+from profiling import add_profile_arguments, finish_profiling, profiled, stage, start_profiling
+from result_store import add_store_arguments, open_store
+from structured_output import SCORE_RANGE, StructuredOutputError, structured_completion
+from telemetry import get_telemetry, report_run
+from tournament import TOURNAMENT_SIZE, Tournament, write_tournament_outputs
 
 # export OPENAI_API_KEY="sk-xxxxxxxxxxxxxxxxxxxxxxxx"
 API_KEY = os.environ.get("OPENAI_API_KEY")
-openai.api_key = API_KEY
+# Shared LLM backend, OpenAI by default (set EVAL_BACKEND / EVAL_BASE_URL to change it)
+client = get_backend(api_key=API_KEY)
 
 # define model here 4.5, mini etc. 
 MODEL_NAME = "gpt-4" 
@@ -76,6 +92,21 @@ WEIGHTS = {
     "applicant_background_and_skills": 0.2
 }
 
+# List fields every agent's evaluation may carry
+LIST_KEYS = ("open_questions", "interview_questions")
+
+# Adaptive panel: agents are asked one at a time in ADAPTIVE_ORDER, and the
+# rest are skipped once the applicant's overall_score can no longer end up on
+# the other side of DECISION_THRESHOLD, whatever they would say. While the
+# agents' weighted scores spread more than ADAPTIVE_MAX_SPREAD apart, the
+# next agent is always asked. Enable with --adaptive or: export EVAL_ADAPTIVE=1
+ADAPTIVE_MODE = os.environ.get("EVAL_ADAPTIVE", "0") == "1"
+DECISION_THRESHOLD = float(os.environ.get("EVAL_DECISION_THRESHOLD", "3.5"))
+ADAPTIVE_MIN_AGENTS = int(os.environ.get("EVAL_ADAPTIVE_MIN_AGENTS", "2"))
+ADAPTIVE_MAX_SPREAD = float(os.environ.get("EVAL_ADAPTIVE_MAX_SPREAD", "1.0"))
+# Agent names, most informative first; agents not listed are asked last
+ADAPTIVE_ORDER = [agent["agent_name"] for agent in AGENTS]
+
 # Additional background info 
 BACKGROUND_INFO = (
     "XRPL Commons Aquarium Cohort #6 focuses on the intersection of AI and blockchain "
@@ -85,7 +116,7 @@ BACKGROUND_INFO = (
     "visionaries who can collaborate to push the boundaries of AI on the XRPL."
 )
 
-def build_agent_prompt(agent_role_prompt, applicant_type, applicant_responses, background_info):
+def build_questions_text(applicant_responses):
     question_blocks = []
     for q_key, q_context in QUESTION_CONTEXTS.items():
         answer = applicant_responses.get(q_key, "")
@@ -94,7 +125,10 @@ def build_agent_prompt(agent_role_prompt, applicant_type, applicant_responses, b
             f"Applicant's Answer: {answer}\n"
         )
 
-    all_questions_text = "\n".join(question_blocks)
+    return "\n".join(question_blocks)
+
+def build_agent_prompt(agent_role_prompt, applicant_type, applicant_responses, background_info):
+    all_questions_text = build_questions_text(applicant_responses)
 
     prompt = f"""
 {agent_role_prompt}
@@ -139,21 +173,103 @@ Return ONLY valid JSON with exactly these keys:
 """
     return prompt.strip()
 
-def get_agent_evaluation(role_prompt, applicant_type, applicant_responses, background_info):
-    prompt_text = build_agent_prompt(role_prompt, applicant_type, applicant_responses, background_info)
+def build_panel_prompt(agents, applicant_type, applicant_responses, background_info):
+    """
+    Single-call variant of build_agent_prompt: the application is sent once and
+    every agent in `agents` is asked for its evaluation, keyed by agent_name.
+    """
+    all_questions_text = build_questions_text(applicant_responses)
+
+    panel_text = "\n\n".join(
+        f'Panelist "{agent["agent_name"]}":\n{agent["role_prompt"]}' for agent in agents
+    )
+
+    example_entry = """{
+    "alignment_with_cohort_focus": <number>,
+    "feasibility_and_technical_strength": <number>,
+    "innovative_potential": <number>,
+    "ecosystem_fit": <number>,
+    "applicant_background_and_skills": <number>,
+    "summary": "...",
+    "open_questions": ["...", "..."],
+    "interview_questions": ["...", "..."]
+  }"""
+    example_json = ",\n".join(f'  "{agent["agent_name"]}": {example_entry}' for agent in agents)
+
+    prompt = f"""
+You are a review panel of {len(agents)} independent experts. Each panelist evaluates the
+application separately, strictly from their own perspective:
+
+{panel_text}
+
+You are reviewing an application to the XRPL Commons Aquarium Cohort #6.
+The focus is on integrating AI and the XRP Ledger.
+
+Applicant Type: {applicant_type}
+
+Background Info:
+{background_info}
+
+Below are the applicant's answers to the 7 questions, each with contextual notes:
+
+{all_questions_text}
+
+For EACH panelist, evaluate this applicant on the following 1-5 scale criteria:
+1) alignment_with_cohort_focus
+2) feasibility_and_technical_strength
+3) innovative_potential
+4) ecosystem_fit
+5) applicant_background_and_skills
+
+Then, for each panelist, provide:
+- The five scores.
+- A brief 'summary' (1-3 sentences) explaining that panelist's reasoning.
+- Up to 2-3 'open_questions' if anything is unclear about the application.
+- 2-3 follow-up 'interview_questions' for the applicant.
+
+Return ONLY valid JSON: one object keyed by panelist name, with exactly these keys per panelist:
+{{
+{example_json}
+}}
+"""
+    return prompt.strip()
+
+def get_agent_evaluation(role_prompt, applicant_type, applicant_responses, background_info,
+                         agent_name=None, applicant_id=None):
+    with stage("render_prompt"):
+        prompt_text = build_agent_prompt(role_prompt, applicant_type, applicant_responses, background_info)
     try:
-        response = openai.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": prompt_text}],
-            temperature=0.0
-        )
-        ai_text = response.choices[0].message.content.strip()
-        result_json = json.loads(ai_text)
-        return result_json
+        return structured_completion(client, MODEL_NAME, prompt_text, list(WEIGHTS), LIST_KEYS,
+                                     persona=agent_name, submission_id=applicant_id)
+    except StructuredOutputError as e:
+        print(f"Invalid JSON from OpenAI: {e}")
+        return None
     except Exception as e:
         print(f"Error calling OpenAI: {e}")
         return None
 
+def get_panel_evaluation(agents, applicant_type, applicant_responses, background_info, applicant_id=None):
+    """
+    Multi-persona mode: one request for the whole panel. Agents missing from
+    the reply (or with an invalid evaluation) fall back to their own calls,
+    sent concurrently.
+    Returns {agent_name: evaluation or None}.
+    """
+    with stage("render_prompt"):
+        prompt_text = build_panel_prompt(agents, applicant_type, applicant_responses, background_info)
+    score_keys = list(WEIGHTS)
+    evaluations = get_multi_persona_evaluation(
+        client, MODEL_NAME, prompt_text,
+        {agent["agent_name"]: score_keys for agent in agents},
+        list_keys=LIST_KEYS,
+        submission_id=applicant_id,
+    )
+    missing = [agent for agent in agents if agent["agent_name"] not in evaluations]
+    jobs = [(agent["role_prompt"], applicant_type, applicant_responses, background_info, agent["agent_name"],
+             applicant_id) for agent in missing]
+    evaluations.update(zip([agent["agent_name"] for agent in missing], run_jobs(jobs, get_agent_evaluation)))
+    return evaluations
+
 def calculate_weighted_score(ai_result):
     if not ai_result:
         return 0.0
@@ -165,129 +281,485 @@ def calculate_weighted_score(ai_result):
     total += ai_result.get("applicant_background_and_skills", 0) * WEIGHTS["applicant_background_and_skills"]
     return round(total, 3)
 
-def main():
-    # 1) Read applicant submissions from aquariumdatain/submissions.json
-    input_file = "aquariumdatain/submissions.json"
-    with open(input_file, "r", encoding="utf-8") as f:
-        submissions = json.load(f)
-
-    results = []
-
-    # 2) Iterate over each applicant
-    for sub in submissions:
+def build_agent_record(agent, agent_eval):
+    """
+    Attach the agent name and weighted score to one agent's raw evaluation.
+    """
+    if agent_eval:
+        agent_eval["agent_name"] = agent["agent_name"]
+        agent_eval["weighted_score"] = calculate_weighted_score(agent_eval)
+        return agent_eval
+    # If there's an error, store it to preserve the agent_name
+    return {
+        "agent_name": agent["agent_name"],
+        "error": True
+    }
+
+def calculate_overall_score(agent_evaluations):
+    """
+    Average the weighted scores of every agent that returned a valid evaluation.
+    """
+    valid_evals = [ae for ae in agent_evaluations if not ae.get("error") and not ae.get("skipped")]
+    if not valid_evals:
+        return 0
+    overall_score = sum(ae["weighted_score"] for ae in valid_evals) / len(valid_evals)
+    return round(overall_score, 3)
+
+def applicant_text(sub):
+    """
+    The text compared by the near-duplicate pre-pass.
+    """
+    responses = sub.get("responses", {})
+    return " ".join([str(sub.get("applicant_type", ""))] + [str(responses[key]) for key in sorted(responses)])
+
+def batch_prompts(sub):
+    """
+    The per-agent requests a run makes for one applicant, as (persona, prompt)
+    pairs, for Batch API mode (see batch_mode.py).
+    """
+    return [
+        (agent["agent_name"], build_agent_prompt(agent["role_prompt"], sub.get("applicant_type", "Unknown"),
+                                                 sub.get("responses", {}), BACKGROUND_INFO))
+        for agent in AGENTS
+    ]
+
+def evaluate_persona(sub, persona):
+    """
+    One agent's evaluation of one applicant, for job-queue workers (see
+    job_queue.py). Returns None if the call failed.
+    """
+    agent = next(agent for agent in AGENTS if agent["agent_name"] == persona)
+    return get_agent_evaluation(agent["role_prompt"], sub.get("applicant_type", "Unknown"),
+                                sub.get("responses", {}), BACKGROUND_INFO, persona, sub.get("id"))
+
+def evaluate_and_journal(journal, agents, applicant_id, applicant_type, applicant_responses):
+    """
+    Worker for one applicant and one or more agents: call the agent (or the
+    whole panel in one request), then journal each raw result right away so
+    it survives a crash of the rest of the run.
+    Returns {agent_name: evaluation or None}.
+    """
+    if len(agents) > 1:
+        evaluations = get_panel_evaluation(agents, applicant_type, applicant_responses, BACKGROUND_INFO, applicant_id)
+    else:
+        agent = agents[0]
+        evaluations = {agent["agent_name"]: get_agent_evaluation(
+            agent["role_prompt"], applicant_type, applicant_responses, BACKGROUND_INFO,
+            agent["agent_name"], applicant_id,
+        )}
+    for agent in agents:
+        journal.record(applicant_id, agent["agent_name"], evaluations[agent["agent_name"]])
+    return evaluations
+
+def adaptive_order():
+    order = [name for name in ADAPTIVE_ORDER if any(agent["agent_name"] == name for agent in AGENTS)]
+    return [agent for name in order for agent in AGENTS if agent["agent_name"] == name] + \
+        [agent for agent in AGENTS if agent["agent_name"] not in order]
+
+def decision_bounds(weighted_scores, remaining):
+    """
+    The lowest and highest overall_score the applicant can still end up with
+    when `remaining` more agents answer (anywhere from the lowest to the
+    highest possible weighted score, or not at all).
+    """
+    total_weight = sum(WEIGHTS.values())
+    lowest, highest = SCORE_RANGE[0] * total_weight, SCORE_RANGE[1] * total_weight
+    n = len(weighted_scores)
+    current = sum(weighted_scores) / n
+    worst = min(current, (sum(weighted_scores) + lowest * remaining) / (n + remaining))
+    best = max(current, (sum(weighted_scores) + highest * remaining) / (n + remaining))
+    return worst, best
+
+def evaluate_adaptively(journal, applicant_id, applicant_type, applicant_responses, done,
+                        threshold=DECISION_THRESHOLD):
+    """
+    Worker for one applicant in adaptive mode: ask the agents one at a time
+    and stop as soon as the accept/reject decision against `threshold` is
+    settled and the agents agree.
+    Returns ({agent_name: evaluation or None} for the agents asked, {
+    "decision", "threshold", "asked", "skipped"}).
+    """
+    agents = adaptive_order()
+    evaluations = {}
+    weighted_scores = []
+    for position, agent in enumerate(agents):
+        key = (str(applicant_id), agent["agent_name"])
+        if key in done:
+            evaluation = done[key]
+        else:
+            evaluation = get_agent_evaluation(
+                agent["role_prompt"], applicant_type, applicant_responses, BACKGROUND_INFO,
+                agent["agent_name"], applicant_id,
+            )
+            journal.record(applicant_id, agent["agent_name"], evaluation)
+        evaluations[agent["agent_name"]] = evaluation
+        if evaluation:
+            weighted_scores.append(calculate_weighted_score(evaluation))
+
+        remaining = len(agents) - position - 1
+        if not remaining or len(weighted_scores) < ADAPTIVE_MIN_AGENTS:
+            continue
+        spread = statistics.pstdev(weighted_scores)
+        worst, best = decision_bounds(weighted_scores, remaining)
+        if spread <= ADAPTIVE_MAX_SPREAD and (worst >= threshold or best < threshold):
+            break
+
+    skipped = [agent["agent_name"] for agent in agents if agent["agent_name"] not in evaluations]
+    telemetry = get_telemetry()
+    telemetry.count("adaptive_asked", len(evaluations))
+    telemetry.count("adaptive_skipped", len(skipped))
+    overall = sum(weighted_scores) / len(weighted_scores) if weighted_scores else 0
+    return evaluations, {
+        "decision": "accept" if overall >= threshold else "reject",
+        "threshold": threshold,
+        "asked": len(evaluations),
+        "skipped": skipped,
+    }
+
+def adaptive_report(threshold=DECISION_THRESHOLD):
+    """
+    How many agent calls the adaptive panel skipped, and roughly what they
+    would have cost (at the average cost of the agent calls made).
+    """
+    telemetry = get_telemetry()
+    asked = telemetry.counters.get("adaptive_asked", 0)
+    skipped = telemetry.counters.get("adaptive_skipped", 0)
+    agent_names = {agent["agent_name"] for agent in AGENTS}
+    made = telemetry.totals(lambda model, persona: model == MODEL_NAME and persona in agent_names)
+    per_call = made["cost_usd"] / made["calls"] if made["calls"] else 0.0
+    total = asked + skipped
+    return (f"Adaptive panel (threshold {threshold}): {asked} agent evaluations used, "
+            f"{skipped} of {total} skipped ({100.0 * skipped / total if total else 0.0:.1f}%), "
+            f"~${skipped * per_call:.4f} saved")
+
+def evaluate_submissions(submissions, journal, done=None, multi_persona=False, adaptive=False,
+                         threshold=DECISION_THRESHOLD):
+    """
+    Evaluate every applicant with every agent and return the unsorted results.
+    Pairs found in `done` ({(applicant_id, agent_name): result}) are reused
+    instead of being sent to the API again, and removed from `done` once used
+    so a streamed run does not keep them all in memory.
+    With `multi_persona`, each applicant's remaining agents share one request.
+    With `adaptive`, each applicant's agents are asked one after the other
+    until the decision against `threshold` is settled, and the agents left
+    out are marked skipped.
+    """
+    if done is None:
+        done = {}
+
+    if adaptive:
+        jobs = [(journal, sub.get("id"), sub.get("applicant_type", "Unknown"), sub.get("responses", {}), done,
+                 threshold) for sub in submissions]
+        results = []
+        for sub, (evaluations, outcome) in zip(submissions, run_jobs(jobs, evaluate_adaptively, MAX_CONCURRENCY)):
+            agent_evaluations = []
+            for agent in AGENTS:
+                done.pop((str(sub.get("id")), agent["agent_name"]), None)
+                if agent["agent_name"] in evaluations:
+                    agent_evaluations.append(build_agent_record(agent, evaluations[agent["agent_name"]]))
+                else:
+                    agent_evaluations.append({"agent_name": agent["agent_name"], "skipped": True})
+            results.append({
+                "id": sub.get("id"),
+                "agent_evaluations": agent_evaluations,
+                "overall_score": calculate_overall_score(agent_evaluations),
+                "adaptive": outcome,
+            })
+        return results
+
+    # Fan out one job per (applicant, agent) pair that still needs a call (or one
+    # per applicant in multi-persona mode) and run them concurrently.
+    # Results come back in job order and are regrouped by submission position,
+    # so a repeated or missing id can't mix up (or lose) anyone's evaluations.
+    jobs = []
+    owners = []
+    for index, sub in enumerate(submissions):
         applicant_id = sub.get("id")
         applicant_type = sub.get("applicant_type", "Unknown")
         applicant_responses = sub.get("responses", {})
+        pending = [agent for agent in AGENTS if (str(applicant_id), agent["agent_name"]) not in done]
+        if not pending:
+            continue
+        if multi_persona:
+            jobs.append((journal, pending, applicant_id, applicant_type, applicant_responses))
+            owners.append(index)
+        else:
+            for agent in pending:
+                jobs.append((journal, [agent], applicant_id, applicant_type, applicant_responses))
+                owners.append(index)
+
+    fresh = [{} for _ in submissions]
+    job_results = run_jobs(jobs, evaluate_and_journal, MAX_CONCURRENCY)
+    for index, evaluations in zip(owners, job_results):
+        fresh[index].update(evaluations)
+
+    results = []
+    for sub, evaluations in zip(submissions, fresh):
+        applicant_id = sub.get("id")
 
         agent_evaluations = []
         for agent in AGENTS:
-            agent_eval = get_agent_evaluation(
-                agent["role_prompt"], applicant_type, applicant_responses, BACKGROUND_INFO
-            )
-            if agent_eval:
-                w_score = calculate_weighted_score(agent_eval)
-                agent_eval["agent_name"] = agent["agent_name"]
-                agent_eval["weighted_score"] = w_score
+            if agent["agent_name"] in evaluations:
+                agent_eval = evaluations[agent["agent_name"]]
             else:
-                # If there's an error, store it to preserve the agent_name
-                agent_eval = {
-                    "agent_name": agent["agent_name"],
-                    "error": True
-                }
-
-            agent_evaluations.append(agent_eval)
-
-        # Calculate overall score for the applicant
-        valid_evals = [ae for ae in agent_evaluations if not ae.get("error")]
-        if valid_evals:
-            overall_score = sum(ae["weighted_score"] for ae in valid_evals) / len(valid_evals)
-        else:
-            overall_score = 0
+                agent_eval = done.get((str(applicant_id), agent["agent_name"]))
+            agent_evaluations.append(build_agent_record(agent, agent_eval))
 
         # Store the final record
         results.append({
             "id": applicant_id,
             "agent_evaluations": agent_evaluations,
-            "overall_score": round(overall_score, 3)
+            "overall_score": calculate_overall_score(agent_evaluations)
         })
 
+    # Dropped only now, so every submission sharing an id got the reused results
+    for sub in submissions:
+        for agent in AGENTS:
+            done.pop((str(sub.get("id")), agent["agent_name"]), None)
+    return results
+
+DETAIL_COLUMNS = [
+    "rank",
+    "id",
+    "overall_score",
+    "agent_name",
+    "alignment_with_cohort_focus",
+    "feasibility_and_technical_strength",
+    "innovative_potential",
+    "ecosystem_fit",
+    "applicant_background_and_skills",
+    "summary",
+    "open_questions",
+    "interview_questions"
+]
+
+def write_summary_csv(path, scores):
+    """
+    [id, overall_score] rows for easy import into Google Sheets,
+    from (applicant_id, overall_score) pairs in rank order.
+    """
+    write_csv_atomic(path, itertools.chain([["id", "overall_score"]], ([a, s] for a, s in scores)))
+
+def write_top_details_csv(path, top_candidates):
+    """
+    One row per agent for each top candidate: scores, summary and questions.
+    """
+    rows = [DETAIL_COLUMNS]
+    for rank, candidate in enumerate(top_candidates, start=1):
+        for agent_eval in candidate["agent_evaluations"]:
+            if agent_eval.get("error") or agent_eval.get("skipped"):
+                # If an agent had an error, skip or record partial info
+                continue
+
+            # Flatten open_questions and interview_questions into strings
+            open_qs = ", ".join(agent_eval.get("open_questions", []))
+            interview_qs = ", ".join(agent_eval.get("interview_questions", []))
+
+            rows.append([
+                rank,
+                candidate["id"],
+                candidate["overall_score"],
+                agent_eval["agent_name"],
+                agent_eval.get("alignment_with_cohort_focus", ""),
+                agent_eval.get("feasibility_and_technical_strength", ""),
+                agent_eval.get("innovative_potential", ""),
+                agent_eval.get("ecosystem_fit", ""),
+                agent_eval.get("applicant_background_and_skills", ""),
+                agent_eval.get("summary", ""),
+                open_qs,
+                interview_qs
+            ])
+    write_csv_atomic(path, rows)
+
+def live_leaderboard(output_folder, top_n=3):
+    """
+    Leaderboard that rewrites eval_summary.csv (the best applicants so far)
+    and top_candidates_details.csv (the top N) during the run, so judges can
+    start before it finishes. write_outputs() replaces both at the end.
+    """
+    def on_flush(records):
+        write_summary_csv(os.path.join(output_folder, "eval_summary.csv"),
+                          ((r["id"], r["overall_score"]) for r in records))
+        write_top_details_csv(os.path.join(output_folder, "top_candidates_details.csv"), records[:top_n])
+
+    return Leaderboard(on_flush, size=max(LEADERBOARD_SIZE, top_n))
+
+def write_outputs(results_file, output_folder, top_n=3):
+    """
+    Separate ranking pass over the streamed results file: write
+    evaluations.json, eval_summary.csv and top_candidates_details.csv into
+    `output_folder` while only holding (score, id, offset) per applicant.
+    """
     # 3) Sort descending by overall_score
-    results.sort(key=lambda x: x["overall_score"], reverse=True)
+    with stage("rank"):
+        ranking = rank_jsonl(results_file)
 
     # 4) Write JSON results to aquariumdataout/questions1_7/evaluations.json
-    output_folder = "aquariumdataout/questions1_7"
     os.makedirs(output_folder, exist_ok=True)
     output_json_file = os.path.join(output_folder, "evaluations.json")
-    with open(output_json_file, "w", encoding="utf-8") as out:
-        json.dump(results, out, indent=2, ensure_ascii=False)
+    with stage("write_json"):
+        write_ranked_json(results_file, ranking, output_json_file)
     print(f"Evaluation complete. Full JSON results written to {output_json_file}")
 
     # 5) Create a summary CSV with [id, overall_score] for easy import into Google Sheets
     output_csv_file = os.path.join(output_folder, "eval_summary.csv")
-    with open(output_csv_file, "w", encoding="utf-8", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        # Write a header row
-        writer.writerow(["id", "overall_score"])
-        # Write each applicant row
-        for entry in results:
-            writer.writerow([entry["id"], entry["overall_score"]])
+    with stage("write_csv"):
+        write_summary_csv(output_csv_file, ((applicant_id, score) for score, applicant_id, _ in ranking))
     print(f"Summary CSV with [id, overall_score] written to {output_csv_file}")
 
     # 6) Optionally, pick top N candidates (e.g., top 3) for quick reference
-    top_n = 3
-    top_candidates = results[:top_n]
+    with open(results_file, "rb") as f:
+        top_candidates = [read_at(f, offset) for _, _, offset in ranking[:top_n]]
     print("\nTop Candidates:")
     for idx, candidate in enumerate(top_candidates, start=1):
         print(f"{idx}. ID = {candidate['id']}, Overall Score = {candidate['overall_score']}")
 
     # 7) Create a detailed CSV for the top N, including each agent's scores, summary, questions
     top_details_file = os.path.join(output_folder, "top_candidates_details.csv")
-    with open(top_details_file, "w", encoding="utf-8", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        # Write a header row for the detailed table
-        writer.writerow([
-            "rank",
-            "id",
-            "overall_score",
-            "agent_name",
-            "alignment_with_cohort_focus",
-            "feasibility_and_technical_strength",
-            "innovative_potential",
-            "ecosystem_fit",
-            "applicant_background_and_skills",
-            "summary",
-            "open_questions",
-            "interview_questions"
-        ])
-
-        for rank, candidate in enumerate(top_candidates, start=1):
-            for agent_eval in candidate["agent_evaluations"]:
-                if agent_eval.get("error"):
-                    # If an agent had an error, skip or record partial info
-                    continue
-
-                # Flatten open_questions and interview_questions into strings
-                open_qs = ", ".join(agent_eval.get("open_questions", []))
-                interview_qs = ", ".join(agent_eval.get("interview_questions", []))
-
-                row = [
-                    rank,
-                    candidate["id"],
-                    candidate["overall_score"],
-                    agent_eval["agent_name"],
-                    agent_eval.get("alignment_with_cohort_focus", ""),
-                    agent_eval.get("feasibility_and_technical_strength", ""),
-                    agent_eval.get("innovative_potential", ""),
-                    agent_eval.get("ecosystem_fit", ""),
-                    agent_eval.get("applicant_background_and_skills", ""),
-                    agent_eval.get("summary", ""),
-                    open_qs,
-                    interview_qs
-                ]
-                writer.writerow(row)
-
+    with stage("write_csv"):
+        write_top_details_csv(top_details_file, top_candidates)
     print(f"Detailed CSV for top {top_n} candidates written to {top_details_file}")
 
+def has_panel_evaluation(record):
+    """
+    True for an applicant the panel actually evaluated: not a copy of a
+    near-duplicate and not screened out by the cascade (or failed for every agent).
+    """
+    if record.get("duplicate_of") is not None:
+        return False
+    return any(not ae.get("error") and not ae.get("skipped") for ae in record.get("agent_evaluations", []))
+
+def run_tournament(results_file, input_path, output_folder, size=TOURNAMENT_SIZE):
+    """
+    Re-rank the top `size` applicants the panel evaluated with pairwise
+    comparisons of their answers and write tournament_ranking.csv next to
+    the other outputs.
+    """
+    finalists = []
+    with open(results_file, "rb") as f:
+        for _, _, offset in rank_jsonl(results_file):
+            if len(finalists) == size:
+                break
+            record = read_at(f, offset)
+            if has_panel_evaluation(record):
+                finalists.append(record)
+    finalist_ids = {str(record["id"]) for record in finalists}
+    applicants = {str(sub.get("id")): sub for sub in iter_records(input_path) if str(sub.get("id")) in finalist_ids}
+
+    def text_of(record):
+        sub = applicants.get(str(record["id"]), {})
+        return (f"Applicant Type: {sub.get('applicant_type', 'Unknown')}\n\n"
+                f"{build_questions_text(sub.get('responses', {}))}")
+
+    tournament = Tournament(client, MODEL_NAME, BACKGROUND_INFO, text_of)
+    ranked = tournament.rank(finalists)
+    ranking_file = write_tournament_outputs(output_folder, ranked, tournament)
+    print(f"\nTournament ranking of the top {len(ranked)}:")
+    for rank, record in enumerate(ranked[:10], start=1):
+        print(f"{rank}. ID = {record['id']}, Overall Score = {record['overall_score']}")
+    print(f"Refined ranking written to {ranking_file}")
+    print(tournament.report(len(ranked)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate XRPL Commons Aquarium applicants with a panel of AI agents.")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip (applicant, agent) pairs already recorded in the journal")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="like --resume, but re-run the pairs that were journaled as errors")
+    parser.add_argument("--input", default="aquariumdatain/submissions.json",
+                        help="applicant submissions as a JSON array or a .jsonl file")
+    parser.add_argument("--multi-persona", action="store_true", default=MULTI_PERSONA_MODE,
+                        help="ask the whole agent panel in one request per applicant")
+    parser.add_argument("--dedup", action="store_true", default=DEDUP_MODE,
+                        help="evaluate one applicant per cluster of near-duplicates and link the rest")
+    parser.add_argument("--adaptive", action="store_true", default=ADAPTIVE_MODE,
+                        help="ask agents one at a time and skip the rest once the decision is settled")
+    parser.add_argument("--threshold", type=float, default=DECISION_THRESHOLD,
+                        help=f"overall_score separating accepted from rejected applicants (default {DECISION_THRESHOLD})")
+    parser.add_argument("--tournament", type=int, nargs="?", const=TOURNAMENT_SIZE, metavar="K",
+                        help=f"re-rank the top K (default {TOURNAMENT_SIZE}) with pairwise comparisons")
+    add_cascade_arguments(parser, "applicant")
+    add_store_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.adaptive and args.multi_persona:
+        parser.error("--adaptive asks the agents one at a time; it cannot be combined with --multi-persona")
+    start_profiling(args)
+
+    # Every finished pair is journaled as it completes, next to the outputs
+    output_folder = "aquariumdataout/questions1_7"
+    journal = Journal(os.path.join(output_folder, "journal.jsonl"))
+    if args.resume or args.retry_errors:
+        done = journal.load()
+        if args.retry_errors:
+            errored = [key for key, result in done.items() if result is None]
+            print(f"Retrying {len(errored)} errored (applicant, agent) pairs from {journal.path}")
+            for key in errored:
+                del done[key]
+    else:
+        journal.reset()
+        done = {}
+
+    # 1) Stream applicant submissions from aquariumdatain/submissions.json a window
+    # at a time, and 2) write each finished applicant to results.jsonl as it completes
+    results_file = os.path.join(output_folder, "results.jsonl")
+    print(f"Evaluating applicants from {args.input} with {len(AGENTS)} agents, "
+          f"up to {MAX_CONCURRENCY} calls in flight...")
+    with stage("dedup"):
+        linker = DuplicateLinker(find_duplicates(iter_records(args.input), applicant_text) if args.dedup else {})
+    cascade = None
+    if args.cascade:
+        cascade = Cascade(client, BACKGROUND_INFO, applicant_text, os.path.join(output_folder, "screening.jsonl"),
+                          args.screen_model, args.screen_top_fraction, args.screen_min_score)
+        with stage("screening"):
+            cascade.screen(iter_records(args.input), skip=linker.duplicates)
+    leaderboard = live_leaderboard(output_folder)
+    # The aquarium keeps its results.jsonl (resume and ranking read it); the store gets a copy
+    store = open_store(args, "aquarium", MODEL_NAME, args.input)
+    with JsonlWriter(results_file) as writer:
+        for batch in iter_batches(profiled("load", iter_records(args.input))):
+            originals = linker.originals(batch)
+            if cascade:
+                finalists = [sub for sub in originals if cascade.passes(sub)]
+                with stage("evaluate"):
+                    records = evaluate_submissions(finalists, journal, done, args.multi_persona, args.adaptive,
+                                                   args.threshold)
+                for record in records:
+                    record["screening"] = cascade.screening(record)
+                # Screened-out applicants keep a record, ranked below every finalist
+                records += [
+                    {"id": sub.get("id"), "agent_evaluations": [], "overall_score": 0,
+                     "screening": cascade.screening(sub)}
+                    for sub in originals if not cascade.passes(sub)
+                ]
+            else:
+                with stage("evaluate"):
+                    records = evaluate_submissions(originals, journal, done, args.multi_persona, args.adaptive,
+                                                   args.threshold)
+            with stage("write_results"):
+                for record in linker.link(batch, records):
+                    writer.write(record)
+                    leaderboard.add(record)
+                    if store:
+                        store.add_record(record)
+                leaderboard.maybe_flush()
+            print(f"  {writer.count} applicants evaluated")
+
+    write_outputs(results_file, output_folder)
+    if args.tournament:
+        with stage("tournament"):
+            run_tournament(results_file, args.input, output_folder, args.tournament)
+    if store:
+        store.finish_run()
+        store.close()
+    print(get_cache().summary())
+    report_run()
+    if cascade:
+        print(cascade.report(MODEL_NAME, [agent["agent_name"] for agent in AGENTS]))
+    if args.adaptive:
+        print(adaptive_report(args.threshold))
+    finish_profiling()
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import argparse
+import importlib
+
+from jsonl_io import JsonlWriter, iter_records
+from llm_cache import get_cache
+from llm_client import request_key
+from telemetry import call_cost
+
+# Batch API mode: instead of calling the API submission by submission, render
+# every request a run would make offline, submit them as Batch API jobs (half
+# the price, no rate limits, results within 24h), load the replies into the
+# response cache, and then run the script as usual. Every request is a cache
+# hit, so the scoring and output files are exactly those of a normal run.
+#
+#   python scripts/batch_mode.py aquarium              # prepare, submit, wait, import, score
+#   python scripts/batch_mode.py aquarium --no-wait    # prepare and submit, then exit
+#   python scripts/batch_mode.py aquarium              # later: picks up where it left off
+#   python scripts/batch_mode.py panel --prepare-only  # just write the request files
+#
+# A script whose prompts depend on earlier calls (code-review condenses
+# oversized submissions first, see needs_condensing) makes those calls
+# interactively while preparing. With --prepare-only such submissions are
+# left out instead, so preparing makes no API call; their requests are sent
+# interactively when the script runs.
+#
+# Everything lives under batchdata/<target>/: the JSONL request files, a
+# manifest of (custom_id, submission, persona), the downloaded outputs and
+# state.json with the file and batch ids, so an interrupted run resumes.
+BATCH_DIR = os.environ.get("EVAL_BATCH_DIR", "batchdata")
+BATCH_POLL_INTERVAL = float(os.environ.get("EVAL_BATCH_POLL_INTERVAL", "30"))
+# Per-file limits of the Batch API; larger runs are split over several batches
+BATCH_MAX_REQUESTS = int(os.environ.get("EVAL_BATCH_MAX_REQUESTS", "50000"))
+BATCH_MAX_BYTES = int(float(os.environ.get("EVAL_BATCH_MAX_MB", "190")) * 1024 * 1024)
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# Batch API requests are billed at this fraction of the interactive price
+BATCH_DISCOUNT = 0.5
+
+# Target -> (module, default input)
+TARGETS = {
+    "aquarium": ("aquarium_evaluation", "aquariumdatain/submissions.json"),
+    "pitch": ("sub_evaluation", "datain/submissions.json"),
+    "panel": ("evaluation_test", "datain/submissions.json"),
+    "code-review": ("code_review", "datain/code_submissions.json"),
+}
+
+def load_state(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(path, state):
+    """
+    Write state.json atomically, so an interrupted run never leaves it half written.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        json.dump(state, out, indent=2)
+    os.replace(tmp_path, path)
+
+def prepare(module, input_path, folder, offline=False):
+    """
+    Render every request the script would send for `input_path` into Batch
+    API input files (one request per line, custom_id = the request's cache
+    key). Requests already in the cache, and repeats of the same request,
+    are left out. With `offline`, submissions whose prompts need API calls
+    first (the module's needs_condensing) are left out too.
+    Returns the new state with one entry per input file.
+    """
+    needs_calls = getattr(module, "needs_condensing", None) if offline else None
+    cache = get_cache()
+    model = module.MODEL_NAME
+    seen = set()
+    chunks = []
+    writer = None
+    manifest = JsonlWriter(os.path.join(folder, "manifest.jsonl"))
+    skipped = 0
+    left_out = []
+
+    try:
+        for sub in iter_records(input_path):
+            if needs_calls and needs_calls(sub):
+                left_out.append(sub.get("id"))
+                continue
+            for persona, prompt_text in module.batch_prompts(sub):
+                key = request_key(model, prompt_text)
+                if key in seen or cache.contains(key):
+                    skipped += 1
+                    continue
+                seen.add(key)
+                line = json.dumps({
+                    "custom_id": key,
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": {
+                        "model": model,
+                        "messages": [{"role": "user", "content": prompt_text}],
+                        "temperature": 0.0,
+                    },
+                }, ensure_ascii=False) + "\n"
+                size = len(line.encode("utf-8"))
+
+                chunk = chunks[-1] if chunks else None
+                if chunk is None or chunk["requests"] >= BATCH_MAX_REQUESTS or chunk["bytes"] + size > BATCH_MAX_BYTES:
+                    if writer:
+                        writer.close()
+                    path = os.path.join(folder, f"input-{len(chunks) + 1:03d}.jsonl")
+                    chunk = {"input": path, "requests": 0, "bytes": 0}
+                    chunks.append(chunk)
+                    writer = open(path, "w", encoding="utf-8")
+                writer.write(line)
+                chunk["requests"] += 1
+                chunk["bytes"] += size
+                manifest.write({"custom_id": key, "submission_id": sub.get("id"), "persona": persona})
+    finally:
+        if writer:
+            writer.close()
+        manifest.close()
+
+    requests = sum(chunk["requests"] for chunk in chunks)
+    print(f"Prepared {requests} requests in {len(chunks)} file(s) under {folder} "
+          f"({skipped} already cached or repeated)")
+    if left_out:
+        print(f"Left out {len(left_out)} oversized submission(s) that need condensing calls first "
+              f"({', '.join(str(sub_id) for sub_id in left_out[:10])}{', ...' if len(left_out) > 10 else ''}); "
+              f"they are sent interactively when the script runs")
+    return {"model": model, "input": input_path, "chunks": chunks}
+
+def submit(client, state, state_path):
+    """
+    Upload each input file and create its batch, skipping the steps a
+    previous (interrupted) run already did.
+    """
+    for chunk in state["chunks"]:
+        if not chunk.get("file_id"):
+            chunk["file_id"] = client.upload_file(chunk["input"])
+            save_state(state_path, state)
+        if not chunk.get("batch_id"):
+            batch = client.create_batch(chunk["file_id"], BATCH_ENDPOINT)
+            chunk["batch_id"] = batch["id"]
+            chunk["status"] = batch.get("status")
+            save_state(state_path, state)
+            print(f"Submitted {chunk['input']} ({chunk['requests']} requests) as batch {chunk['batch_id']}")
+
+def poll(client, state, state_path, wait=True, interval=BATCH_POLL_INTERVAL):
+    """
+    Refresh every batch's status, and with `wait` keep polling until all of
+    them have finished. Returns True once they have.
+    """
+    while True:
+        for chunk in state["chunks"]:
+            if chunk.get("status") in TERMINAL_STATUSES:
+                continue
+            batch = client.get_batch(chunk["batch_id"])
+            chunk["status"] = batch.get("status")
+            chunk["output_file_id"] = batch.get("output_file_id")
+            chunk["error_file_id"] = batch.get("error_file_id")
+            counts = batch.get("request_counts") or {}
+            print(f"Batch {chunk['batch_id']}: {chunk['status']}, "
+                  f"{counts.get('completed', 0)}/{counts.get('total', chunk['requests'])} done, "
+                  f"{counts.get('failed', 0)} failed")
+        save_state(state_path, state)
+        if all(chunk.get("status") in TERMINAL_STATUSES for chunk in state["chunks"]):
+            return True
+        if not wait:
+            return False
+        time.sleep(interval)
+
+def import_results(client, state, state_path, folder):
+    """
+    Download the finished batches and put every successful reply into the
+    response cache under its request's key, and print what they cost at the
+    batch price. The scoring run's telemetry shows them as cache hits only.
+    Failed requests are left out, so the scoring run sends them interactively.
+    """
+    cache = get_cache()
+    model = state["model"]
+    imported = failed = 0
+    prompt_tokens = completion_tokens = 0
+
+    for number, chunk in enumerate(state["chunks"], start=1):
+        if chunk.get("imported"):
+            continue
+        if chunk.get("error_file_id"):
+            with open(os.path.join(folder, f"errors-{number:03d}.jsonl"), "w", encoding="utf-8") as out:
+                out.write(client.file_content(chunk["error_file_id"]))
+        if not chunk.get("output_file_id"):
+            print(f"Batch {chunk['batch_id']} ended '{chunk['status']}' without output; "
+                  f"its {chunk['requests']} requests will be sent interactively")
+            failed += chunk["requests"]
+            chunk["imported"] = True
+            continue
+
+        output_path = os.path.join(folder, f"output-{number:03d}.jsonl")
+        with open(output_path, "w", encoding="utf-8") as out:
+            out.write(client.file_content(chunk["output_file_id"]))
+
+        for line in iter_records(output_path):
+            response = line.get("response") or {}
+            if line.get("error") or response.get("status_code") != 200:
+                failed += 1
+                continue
+            body = response["body"]
+            text = (body["choices"][0]["message"].get("content") or "").strip()
+            cache.put(line["custom_id"], text)
+            usage = body.get("usage") or {}
+            prompt_tokens += usage.get("prompt_tokens") or 0
+            completion_tokens += usage.get("completion_tokens") or 0
+            imported += 1
+        chunk["imported"] = True
+        save_state(state_path, state)
+
+    cost = call_cost(model, prompt_tokens, completion_tokens) * BATCH_DISCOUNT
+    print(f"Imported {imported} batch replies into the response cache, {failed} failed "
+          f"(sent interactively during scoring); {prompt_tokens} prompt + {completion_tokens} completion "
+          f"tokens, ${cost:.4f} at the batch price")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run an evaluation through the Batch API: prepare, submit, wait, import, then score.",
+        epilog="Any other arguments are passed on to the evaluation script.",
+    )
+    parser.add_argument("target", choices=sorted(TARGETS), help="which evaluation to run")
+    parser.add_argument("--input", help="submissions file (defaults to the script's own)")
+    parser.add_argument("--prepare-only", action="store_true",
+                        help="only write the batch input files, without any API call (submissions "
+                             "that need condensing calls first are left out)")
+    parser.add_argument("--no-wait", action="store_true",
+                        help="submit (or check on) the batches and exit instead of waiting")
+    parser.add_argument("--restart", action="store_true",
+                        help="discard the saved batch state and prepare from scratch")
+    args, script_args = parser.parse_known_args(argv)
+
+    if get_cache().mode != "on":
+        parser.error("Batch mode replays the replies from the response cache; it needs EVAL_CACHE=on")
+
+    module_name, default_input = TARGETS[args.target]
+    module = importlib.import_module(module_name)
+    input_path = args.input or default_input
+    folder = os.path.join(BATCH_DIR, args.target)
+    os.makedirs(folder, exist_ok=True)
+    state_path = os.path.join(folder, "state.json")
+
+    state = None if args.restart else load_state(state_path)
+    if state and (state["input"] != input_path or state["model"] != module.MODEL_NAME):
+        parser.error(f"{state_path} belongs to a batch for {state['input']} on {state['model']}; "
+                     f"finish it first or pass --restart")
+    if state is None or args.prepare_only:
+        state = prepare(module, input_path, folder, offline=args.prepare_only)
+        save_state(state_path, state)
+    if args.prepare_only:
+        return
+
+    if state["chunks"]:
+        submit(module.client, state, state_path)
+        if not poll(module.client, state, state_path, wait=not args.no_wait):
+            print("Batches still running; run the same command again to check on them")
+            return
+        import_results(module.client, state, state_path, folder)
+
+    print(f"Scoring {input_path} from the response cache")
+    module.main(["--input", input_path] + script_args)
+    os.replace(state_path, os.path.join(folder, "state.done.json"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import json
+
+# Campaign configs: one YAML or TOML file per cohort or event that overrides
+# the scripts' built-in settings (model, weights, agents, prompts, input)
+# without editing code. Used by scripts/cli.py:
+#
+#   python scripts/cli.py --config campaigns/cohort7.toml aquarium
+#
+# Top-level keys apply to every subcommand; a section named after a
+# subcommand ([aquarium], [pitch], [panel], [code-review]) overrides them for
+# that subcommand only. [env] sets EVAL_* variables (the shell wins):
+#
+#   model = "gpt-4o"
+#   [env]
+#   EVAL_CONCURRENCY = "16"
+#   [aquarium]
+#   input = "aquariumdatain/cohort7.jsonl"
+#   weights = { alignment_with_cohort_focus = 0.3, ... }
+
+# Config key -> module attribute it replaces
+SETTINGS = {
+    "model": "MODEL_NAME",
+    "weights": "WEIGHTS",
+    "agents": "AGENTS",
+    "question_contexts": "QUESTION_CONTEXTS",
+    "background_info": "BACKGROUND_INFO",
+    "roles": "ROLES",
+    "role_descriptions": "ROLE_DESCRIPTIONS",
+    "screen_context": "SCREEN_CONTEXT",
+    "adaptive_order": "ADAPTIVE_ORDER",
+}
+# Config keys handled by the CLI rather than set on the module
+ARGUMENTS = {"input": "--input"}
+SECTIONS = ("aquarium", "pitch", "panel", "code-review")
+
+def load_config(path):
+    """
+    Read a .toml, .yaml/.yml or .json campaign file into a dict.
+    PyYAML is only needed (and imported) for YAML files.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    elif extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("YAML campaign configs need PyYAML: pip install pyyaml")
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+    elif extension == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        raise ValueError(f"Unknown campaign config format '{extension}', expected .toml, .yaml or .json")
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: a campaign config must be a mapping of settings")
+    return config
+
+def section_settings(config, section):
+    """
+    The settings for one subcommand: the top-level keys, overridden by the
+    subcommand's own section. Unknown keys are an error, not silently ignored.
+    """
+    settings = {key: value for key, value in config.items() if key not in SECTIONS and key != "env"}
+    settings.update(config.get(section) or {})
+    unknown = set(settings) - set(SETTINGS) - set(ARGUMENTS)
+    if unknown:
+        raise ValueError(f"Unknown campaign settings {sorted(unknown)}, expected some of "
+                         f"{sorted(SETTINGS) + sorted(ARGUMENTS)}")
+    return settings
+
+def apply_env(config):
+    """
+    Export the [env] table before the scripts are imported (they read their
+    EVAL_* settings at import). Variables already set in the shell win.
+    """
+    for name, value in (config.get("env") or {}).items():
+        os.environ.setdefault(name, str(value))
+
+def apply_settings(module, settings):
+    """
+    Replace the module-level settings of an evaluation script; settings the
+    script does not have (e.g. agents for the pitch scorer) are skipped.
+    Weights may only re-weight the script's existing criteria, since its
+    prompts ask for them.
+    """
+    for key, value in settings.items():
+        attribute = SETTINGS.get(key)
+        if attribute is None or not hasattr(module, attribute):
+            continue
+        if key == "weights":
+            unknown = set(value) - set(module.WEIGHTS)
+            if unknown:
+                raise ValueError(f"Unknown weights {sorted(unknown)} for {module.__name__}, "
+                                 f"expected some of {sorted(module.WEIGHTS)}")
+            value = {criterion: float(value.get(criterion, 0.0)) for criterion in module.WEIGHTS}
+        setattr(module, attribute, value)
+
+def script_arguments(settings, argv):
+    """
+    Command-line arguments from the config (e.g. input -> --input), placed
+    before `argv` so anything given on the command line wins.
+    """
+    extra = []
+    for key, flag in ARGUMENTS.items():
+        if key in settings:
+            extra += [flag, str(settings[key])]
+    return extra + list(argv)
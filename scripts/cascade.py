@@ -0,0 +1,171 @@
+import os
+import math
+
+from eval_engine import run_jobs, iter_batches
+from jsonl_io import JsonlWriter
+from structured_output import structured_completion
+from telemetry import get_telemetry
+from token_count import truncate_to_tokens
+
+# Screening cascade: a cheap model scores every submission with a slim
+# prompt first, and only the finalists go on to the full panel.
+# Enable with --cascade on the scripts, or: export EVAL_CASCADE=1
+CASCADE_MODE = os.environ.get("EVAL_CASCADE", "0") == "1"
+SCREEN_MODEL = os.environ.get("EVAL_SCREEN_MODEL", "gpt-4o-mini")
+# Finalists: the top fraction of submissions by screening score, and/or every
+# submission scoring at least the minimum (1-5). Either one is enough to pass.
+SCREEN_TOP_FRACTION = float(os.environ.get("EVAL_SCREEN_TOP_FRACTION", "0.3"))
+# Unset means no minimum; any value that is set, 0 included, is one
+SCREEN_MIN_SCORE = float(os.environ["EVAL_SCREEN_MIN_SCORE"]) if os.environ.get("EVAL_SCREEN_MIN_SCORE") else None
+# The screening prompt only sees the first SCREEN_INPUT_TOKENS of a submission
+SCREEN_INPUT_TOKENS = int(os.environ.get("EVAL_SCREEN_INPUT_TOKENS", "1500"))
+SCREEN_MAX_TOKENS = 120
+# Telemetry personas of the screening calls (and their repair follow-ups)
+SCREEN_PERSONAS = ("screening", "screening-repair")
+
+def build_screen_prompt(context, submission_text, model=SCREEN_MODEL):
+    """
+    Slim first-tier prompt: the call context, the (truncated) submission and
+    a single 1-5 score.
+    """
+    submission_text = truncate_to_tokens(submission_text, SCREEN_INPUT_TOKENS, model)
+    prompt_template = f"""
+You are screening submissions before a full expert review panel.
+
+**CONTEXT**:
+{context}
+
+**SUBMISSION**:
+{submission_text}
+
+Rate how relevant, complete and promising this submission is on a 1–5 scale
+(1 = off-topic or empty, 5 = clearly strong). Respond ONLY with valid JSON:
+
+{{
+  "score": <number>,
+  "reason": "..."
+}}
+"""
+    return prompt_template.strip()
+
+def screen_submission(client, model, context, submission_id, submission_text):
+    """
+    Returns {"id", "score", "reason"}; "score" is None if the call or the
+    reply failed, and such submissions always go on to the panel.
+    """
+    prompt_text = build_screen_prompt(context, submission_text, model)
+    try:
+        reply = structured_completion(client, model, prompt_text, ["score"], text_keys=(),
+                                      max_tokens=SCREEN_MAX_TOKENS, persona="screening",
+                                      submission_id=submission_id)
+        return {"id": submission_id, "score": float(reply["score"]), "reason": reply.get("reason", "")}
+    except Exception as e:
+        print(f"Screening failed for {submission_id}, sending it to the panel: {e}")
+        return {"id": submission_id, "score": None, "reason": ""}
+
+def select_finalists(screened, top_fraction=SCREEN_TOP_FRACTION, min_score=SCREEN_MIN_SCORE):
+    """
+    Ids (as strings) that go on to the panel: the top `top_fraction` by
+    score (ties kept in input order), every score >= `min_score`, and every
+    submission whose screening failed.
+    """
+    finalists = {key for key, result in screened.items() if result["score"] is None}
+    scored = [(result["score"], key) for key, result in screened.items() if result["score"] is not None]
+    if top_fraction:
+        keep = math.ceil(top_fraction * len(scored))
+        finalists.update(key for _, key in sorted(scored, key=lambda entry: entry[0], reverse=True)[:keep])
+    if min_score is not None:
+        finalists.update(key for score, key in scored if score >= min_score)
+    return finalists
+
+def add_cascade_arguments(parser, noun="submission"):
+    parser.add_argument("--cascade", action="store_true", default=CASCADE_MODE,
+                        help=f"screen every {noun} with a cheap model first; only finalists meet the panel")
+    parser.add_argument("--screen-model", default=SCREEN_MODEL,
+                        help=f"first-tier model (default {SCREEN_MODEL})")
+    parser.add_argument("--screen-top-fraction", type=float, default=SCREEN_TOP_FRACTION,
+                        help=f"share of screened {noun}s that go on to the panel (0 to disable)")
+    parser.add_argument("--screen-min-score", type=float, default=SCREEN_MIN_SCORE,
+                        help="screening score (1-5) that always goes on to the panel")
+
+class Cascade:
+    """
+    First tier of the evaluation: screens every submission up front (once,
+    streaming, journaled to `screening_file`), then tells the scripts which
+    submissions are finalists and reports what the cascade saved.
+    """
+
+    def __init__(self, client, context, text_of, screening_file, model=SCREEN_MODEL,
+                 top_fraction=SCREEN_TOP_FRACTION, min_score=SCREEN_MIN_SCORE):
+        self.client = client
+        self.context = context
+        self.text_of = text_of
+        self.screening_file = screening_file
+        self.model = model
+        self.top_fraction = top_fraction
+        self.min_score = min_score
+        self.screened = {}
+        self.finalists = set()
+
+    def screen(self, submissions, skip=()):
+        """
+        Screen every submission (except ids in `skip`, e.g. near-duplicates)
+        and pick the finalists. Only {id: score, reason} is kept per submission.
+        """
+        def jobs(batch):
+            return [
+                (self.client, self.model, self.context, sub.get("id"), self.text_of(sub))
+                for sub in batch if str(sub.get("id")) not in skip
+            ]
+
+        with JsonlWriter(self.screening_file) as writer:
+            for batch in iter_batches(submissions):
+                for result in run_jobs(jobs(batch), screen_submission):
+                    writer.write(result)
+                    self.screened[str(result["id"])] = result
+        self.finalists = select_finalists(self.screened, self.top_fraction, self.min_score)
+        print(f"Screening with {self.model}: {len(self.finalists)} of {len(self.screened)} submissions "
+              f"go on to the full panel (results in {self.screening_file})")
+
+    def passes(self, sub):
+        return str(sub.get("id")) in self.finalists
+
+    def screening(self, sub):
+        result = self.screened.get(str(sub.get("id")), {})
+        return {"model": self.model, "score": result.get("score"), "reason": result.get("reason", "")}
+
+    def report(self, panel_model, panel_personas):
+        """
+        Calls, tokens and cost per tier, and an estimate of what the
+        screened-out submissions would have cost on the full panel (at the
+        finalists' average). Tier 2 is the calls of `panel_personas` (agent
+        names or roles), their multi-persona "panel" calls and the repair
+        follow-ups of both, so later stages on the same model (a tournament,
+        condensing) are not billed to the panel.
+        """
+        telemetry = get_telemetry()
+        personas = set(panel_personas) | {"panel"}
+        personas |= {f"{persona}-repair" for persona in personas}
+        calls_per_submission = len(panel_personas)
+        tier1 = telemetry.totals(lambda model, persona: persona in SCREEN_PERSONAS)
+        tier2 = telemetry.totals(lambda model, persona: model == panel_model and persona in personas)
+        finalists = len(self.finalists)
+        skipped = len(self.screened) - finalists
+
+        def tokens(totals):
+            return totals["prompt_tokens"] + totals["completion_tokens"]
+
+        per_finalist_tokens = tokens(tier2) / finalists if finalists else 0
+        per_finalist_cost = tier2["cost_usd"] / finalists if finalists else 0.0
+        saved_cost = skipped * per_finalist_cost
+        lines = [
+            "Screening cascade:",
+            f"  tier 1 ({self.model}): {len(self.screened)} submissions, {tier1['calls']} calls, "
+            f"{tokens(tier1)} tokens, ${tier1['cost_usd']:.4f}",
+            f"  tier 2 ({panel_model}): {finalists} finalists, {tier2['calls']} calls, "
+            f"{tokens(tier2)} tokens, ${tier2['cost_usd']:.4f}",
+            f"  skipped by screening: {skipped} submissions, ~{skipped * calls_per_submission} calls, "
+            f"~{int(skipped * per_finalist_tokens)} tokens, ~${saved_cost:.4f} "
+            f"(net of screening: ~${saved_cost - tier1['cost_usd']:.4f})",
+        ]
+        return "\n".join(lines)
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import threading
+
+class Journal:
+    """
+    Append-only JSON Lines journal of finished (applicant id, agent name) results.
+
+    Every result is written, flushed and fsync'ed as soon as its call returns,
+    so a crash or Ctrl-C loses at most the calls that were still in flight.
+    A failed call is journaled with "error": true so it can be retried later.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def reset(self):
+        """
+        Start a fresh journal, discarding whatever a previous run left behind.
+        """
+        with self._lock:
+            open(self.path, "w", encoding="utf-8").close()
+
+    def load(self):
+        """
+        Returns {(applicant_id, agent_name): result} for every journaled pair,
+        where result is the raw evaluation dict or None if the call failed.
+        Later lines win, so a successful retry replaces an earlier error.
+        A torn last line (crash mid-write) is ignored and cut off the file, so
+        the next record() starts on a line of its own.
+        """
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        self._drop_torn_line()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = (str(record["id"]), record["agent_name"])
+                entries[key] = None if record.get("error") else record.get("result")
+        return entries
+
+    def _drop_torn_line(self):
+        with self._lock:
+            with open(self.path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if not size:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                # Walk back to the end of the last complete line
+                end = size
+                while end > 0:
+                    start = max(0, end - 65536)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b"\n")
+                    if newline >= 0:
+                        end = start + newline + 1
+                        break
+                    end = start
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record(self, applicant_id, agent_name, result):
+        """
+        Append one finished pair. `result` is None when the call failed.
+        """
+        line = json.dumps({
+            "id": applicant_id,
+            "agent_name": agent_name,
+            "error": result is None,
+            "result": result,
+            "ts": round(time.time(), 3),
+        }, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
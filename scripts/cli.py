@@ -0,0 +1,98 @@
+import os
+import sys
+import argparse
+import importlib
+
+# One entry point for every evaluation script:
+#
+#   python scripts/cli.py aquarium --dedup
+#   python scripts/cli.py --config campaigns/cohort7.toml panel --cascade
+#   python scripts/cli.py rescore aquarium --weights weights.json
+#   python scripts/cli.py batch aquarium --no-wait
+#   python scripts/cli.py queue work aquarium --processes 4
+#   python scripts/cli.py export --script code_review
+#
+# A subcommand's module is only imported once the subcommand is chosen, so the
+# offline commands never load the LLM client, and NumPy is only loaded by
+# the commands that compute with it.
+CONFIG_PATH = os.environ.get("EVAL_CONFIG")
+
+# Subcommand -> (module, campaign config section, description)
+COMMANDS = {
+    "pitch": ("sub_evaluation", "pitch", "score hackathon pitches with one evaluator (optionally packed)"),
+    "panel": ("evaluation_test", "panel", "evaluate hackathon pitches with six evaluator roles"),
+    "aquarium": ("aquarium_evaluation", "aquarium", "evaluate Aquarium applicants with a panel of agents"),
+    "code-review": ("code_review", "code-review", "review hackathon code submissions with four agents"),
+    "rescore": ("rescore", None, "rescore a finished run with new weights, without API calls"),
+    "batch": ("batch_mode", None, "run an evaluation through the Batch API at half the price"),
+    "queue": ("job_queue", None, "run an evaluation over a shared job queue with many workers"),
+    "export": ("result_store", None, "export a run from the result store to the usual file layout"),
+}
+# Commands that act on another command's script, and the targets they take;
+# the config section and module come from the target's own command
+TARGET_COMMANDS = {
+    "rescore": ("aquarium", "pitch"),
+    "batch": ("aquarium", "pitch", "panel", "code-review"),
+    "queue": ("aquarium", "pitch", "panel", "code-review"),
+}
+
+def build_parser():
+    commands = "\n".join(f"  {name:<12} {description}" for name, (_, _, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Hackathon and Aquarium evaluation.",
+        epilog=f"commands:\n{commands}\n\nRun '<command> --help' for a command's own options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--config", default=CONFIG_PATH,
+                        help="campaign config (.toml, .yaml or .json) overriding the scripts' settings")
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="one of the commands below")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="arguments for the command")
+    return parser
+
+def apply_config(path, command, module_name, section, command_args):
+    """
+    Load a campaign config and apply it to the subcommand's script.
+    Returns the command's arguments with the config's (e.g. --input) added.
+    """
+    import campaign
+
+    config = campaign.load_config(path)
+    # EVAL_* settings are read at import, so they go in before any script is loaded
+    campaign.apply_env(config)
+    # Worker processes started by the command load the same campaign (see job_queue.py)
+    os.environ["EVAL_CONFIG"] = path
+    if command in TARGET_COMMANDS:
+        target = next((arg for arg in command_args if arg in TARGET_COMMANDS[command]), None)
+        if target is not None:
+            target_module, target_section, _ = COMMANDS[target]
+            settings = campaign.section_settings(config, target_section)
+            campaign.apply_settings(importlib.import_module(target_module), settings)
+            # rescore reads the run's results, and a queue only reads its input when enqueueing
+            if command == "batch":
+                command_args = campaign.script_arguments(settings, command_args)
+            elif command == "queue" and command_args[:1] == ["enqueue"]:
+                command_args = command_args[:1] + campaign.script_arguments(settings, command_args[1:])
+    elif section is not None:
+        settings = campaign.section_settings(config, section)
+        campaign.apply_settings(importlib.import_module(module_name), settings)
+        command_args = campaign.script_arguments(settings, command_args)
+    return command_args
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    module_name, section, _ = COMMANDS[args.command]
+    command_args = list(args.args)
+
+    if args.config:
+        try:
+            command_args = apply_config(args.config, args.command, module_name, section, command_args)
+        except (OSError, ValueError, ImportError) as e:
+            parser.error(f"--config {args.config}: {e}")
+
+    if args.command == "export":
+        command_args = ["export"] + command_args
+    return importlib.import_module(module_name).main(command_args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,52 @@
 import os
 import json
-from openai import OpenAI
+import argparse
+
+from eval_engine import run_jobs
+from jsonl_io import iter_records
+from llm_cache import get_cache
+from llm_backend import get_backend
+from multi_persona import get_multi_persona_evaluation, MULTI_PERSONA_MODE
+from profiling import add_profile_arguments, finish_profiling, profiled, stage, start_profiling
+from condense import allocate_budget, condense_text
+from repo_index import REPO_CONTEXT_TOKENS, get_repo_index, render_chunks
+from result_store import add_store_arguments, open_store
+from structured_output import StructuredOutputError, structured_completion
+from telemetry import report_run
+from token_count import estimate_tokens
 
 # 1) Provide your API key here, or let it come from an environment variable
 API_KEY = os.environ.get("OPENAI_API_KEY")
 # Alternatively, you could inline your key:
 # API_KEY = "sk-..."
 
-# 2) Create the OpenAI client
-client = OpenAI(api_key=API_KEY)
+# 2) Create the LLM client: the shared OpenAI backend by default
+# (set EVAL_BACKEND / EVAL_BASE_URL to use another one, see llm_backend.py)
+client = get_backend(api_key=API_KEY)
 
 # 3) Choose your model name here
 MODEL_NAME = "gpt-4"  
 # Or "gpt-3.5-turbo", or any other valid name you have access to.
 
-def build_prompt(submission, role):
-    """
-    Construct the prompt for a specific code-review-focused role.
-    We'll pull from the five data elements in the submission:
-     1) README
-     2) High-Level Explanation
-     3) Hackathon Requirements
-     4) Key Code Snippet
-     5) Tech Stack
-    """
-    # Extract the data from submission
-    readme_content = submission.get("readme", "")
-    high_level_explanation = submission.get("high_level_explanation", "")
-    hackathon_requirements = submission.get("hackathon_requirements", "")
-    code_snippet = submission.get("code_snippet", "")
-    tech_stack = submission.get("tech_stack", "")
+# 4) Token budget for each role prompt. Submissions whose inputs don't fit are
+# condensed once with map-reduce summaries (see condense.py) that every role reuses.
+# Submissions with a "repo_path" (a local checkout) also get up to
+# REPO_CONTEXT_TOKENS of repository excerpts per role (see repo_index.py),
+# which come out of this budget.
+ROLE_TOKEN_BUDGET = int(os.environ.get("EVAL_ROLE_TOKEN_BUDGET", "6000"))
+
+# The five submission inputs, with the labels used when condensing them
+INPUT_FIELDS = [
+    ("readme", "README.md"),
+    ("high_level_explanation", "High-Level Explanation"),
+    ("hackathon_requirements", "Hackathon Requirements Compliance"),
+    ("code_snippet", "Key Code Snippet"),
+    ("tech_stack", "Tech Stack Description"),
+]
 
-    # Define specialized role descriptions
-    role_descriptions = {
-        "cto": """
+# Define specialized role descriptions
+ROLE_DESCRIPTIONS = {
+    "cto": """
 You are a CTO Agent focusing on the project's Architecture, Scalability, and Security.
 
 Key points to evaluate:
@@ -43,7 +56,7 @@ Key points to evaluate:
 4. Code Efficiency & Performance
 5. Overall Feasibility for Production
 """,
-        "fullstack": """
+    "fullstack": """
 You are a Fullstack Developer Agent focusing on Readability, Maintainability, and Code Quality.
 
 Key points to evaluate:
@@ -53,7 +66,7 @@ Key points to evaluate:
 4. Overall Code Quality (linting, style, best practices)
 5. Maintainability & Future Expansion
 """,
-        "crypto": """
+    "crypto": """
 You are a Crypto Engineer Agent focusing on Smart Contracts, Blockchain Security, and Gas Optimization.
 
 Key points to evaluate:
@@ -63,7 +76,7 @@ Key points to evaluate:
 4. Auditing or Testing Approach (if mentioned)
 5. Alignment with Best Practices (e.g., OpenZeppelin standards)
 """,
-        "ai_engineer": """
+    "ai_engineer": """
 You are an AI Engineer Agent focusing on ML Model Performance, Data Handling, and AI Accuracy.
 
 Key points to evaluate:
@@ -73,16 +86,39 @@ Key points to evaluate:
 4. Performance Optimization (inference speed, resource usage)
 5. Overall Feasibility & Scalability of the AI Solution
 """
-    }
+}
 
-    # Grab the matching role description or a generic fallback
-    role_text = role_descriptions.get(role, "You are an AI assistant evaluating a code submission.")
+# Code vocabulary added to each role's focus points when retrieving repository excerpts
+ROLE_QUERIES = {
+    "cto": "architecture config server api route middleware auth security secret env database cache "
+           "queue docker deploy infrastructure scale performance",
+    "fullstack": "component module handler error exception try catch validate test logging util "
+                 "interface fetch state render docs",
+    "crypto": "contract solidity pragma modifier require revert msg sender payable transfer gas storage "
+              "web3 ethers abi wallet signature token erc20 erc721 openzeppelin reentrancy",
+    "ai_engineer": "model train predict inference embedding dataset preprocess tokenizer torch tensorflow "
+                   "sklearn transformers openai prompt llm loss accuracy evaluate",
+}
 
-    # Build the prompt
-    prompt_template = f"""
-{role_text}
+def build_inputs_text(submission):
+    """
+    Render the five data elements of a submission, shared by every role
+    (byte for byte the block the single-role prompt always had, so cached
+    replies still match):
+     1) README
+     2) High-Level Explanation
+     3) Hackathon Requirements
+     4) Key Code Snippet
+     5) Tech Stack
+    """
+    # Extract the data from submission
+    readme_content = submission.get("readme", "")
+    high_level_explanation = submission.get("high_level_explanation", "")
+    hackathon_requirements = submission.get("hackathon_requirements", "")
+    code_snippet = submission.get("code_snippet", "")
+    tech_stack = submission.get("tech_stack", "")
 
-Below are 5 key inputs from the hackathon team:
+    inputs_text = f"""Below are 5 key inputs from the hackathon team:
 
 1) README.md Submission:
 {readme_content}
@@ -97,7 +133,27 @@ Below are 5 key inputs from the hackathon team:
 {code_snippet}
 
 5) Tech Stack Description:
-{tech_stack}
+{tech_stack}"""
+    if submission.get("repo_context"):
+        inputs_text += f"""
+
+6) Repository Excerpts (the files most relevant to your focus, from the team's repository):
+{submission["repo_context"]}"""
+    return inputs_text
+
+def build_prompt(submission, role):
+    """
+    Construct the prompt for a specific code-review-focused role.
+    We'll pull from the five data elements in the submission.
+    """
+    # Grab the matching role description or a generic fallback
+    role_text = ROLE_DESCRIPTIONS.get(role, "You are an AI assistant evaluating a code submission.")
+
+    # Build the prompt
+    prompt_template = f"""
+{role_text}
+
+{build_inputs_text(submission)}
 
 Please score this submission on a scale of 1–5 for each of your 5 focus points, then provide:
 - A concise 2–3 sentence summary of your overall code review.
@@ -117,57 +173,238 @@ For example:
 """
     return prompt_template.strip()
 
-def get_code_review_evaluation(submission):
+def build_multi_role_prompt(submission, roles):
+    """
+    Single-call variant of build_prompt: the submission is sent once and every
+    role in `roles` is asked for its review, keyed by role name.
+    """
+    panel_text = "\n".join(
+        f"[{role}]{ROLE_DESCRIPTIONS.get(role, 'You are an AI assistant evaluating a code submission.')}"
+        for role in roles
+    )
+    example_json = ",\n".join(
+        f'  "{role}": {{\n'
+        + "".join(f'    "{role}_score_{n}": <number>,\n' for n in range(1, 6))
+        + '    "summary": "...",\n'
+        + '    "open_questions": ["...", "..."]\n'
+        + "  }"
+        for role in roles
+    )
+
+    prompt_template = f"""
+You are a code review panel of {len(roles)} independent agents. Each agent reviews the
+submission separately, strictly from their own focus:
+
+{panel_text}
+
+{build_inputs_text(submission)}
+
+For EACH agent, score this submission on a scale of 1–5 for each of that agent's 5 focus
+points (named <agent>_score_1 to <agent>_score_5), then provide:
+- A concise 2–3 sentence summary of that agent's overall code review.
+- 2–3 open questions for the team if any ambiguities remain.
+
+**Return your answer as one valid JSON object keyed by agent** with no additional commentary or text.
+For example:
+{{
+{example_json}
+}}
+"""
+    return prompt_template.strip()
+
+# The four code-review roles we want to evaluate
+ROLES = ["cto", "fullstack", "crypto", "ai_engineer"]
+
+def _input_sizes(submission):
+    """
+    Tokens of each input field, and the budget they have to fit in next to
+    the role instructions (and the repository excerpts, if any).
+    """
+    empty = {field: "" for field, _ in INPUT_FIELDS}
+    overhead = max(estimate_tokens(build_prompt(empty, role), MODEL_NAME) for role in ROLES)
+    if repo_checkout(submission):
+        overhead += REPO_CONTEXT_TOKENS
+    budget = max(0, ROLE_TOKEN_BUDGET - overhead)
+    sizes = {field: estimate_tokens(str(submission.get(field, "")), MODEL_NAME) for field, _ in INPUT_FIELDS}
+    return sizes, budget
+
+def needs_condensing(submission):
+    """
+    True if fit_submission_to_budget would have to condense the submission,
+    which takes API calls.
+    """
+    sizes, budget = _input_sizes(submission)
+    return sum(sizes.values()) > budget
+
+def fit_submission_to_budget(submission):
+    """
+    Count the submission's tokens locally and, if the inputs don't fit in
+    ROLE_TOKEN_BUDGET next to the role instructions, condense the oversized
+    fields with map-reduce summaries. Returns the submission unchanged when it
+    fits, otherwise a copy with the condensed fields.
+
+    Upper bound on what each role prompt costs: ROLE_TOKEN_BUDGET input tokens.
+    """
+    sizes, budget = _input_sizes(submission)
+    if sum(sizes.values()) <= budget:
+        return submission
+
+    allowances = allocate_budget(sizes, budget)
+    fitted = dict(submission)
+    for field, label in INPUT_FIELDS:
+        if sizes[field] > allowances[field]:
+            fitted[field] = condense_text(
+                client, MODEL_NAME, label, str(submission.get(field, "")), allowances[field],
+                submission.get("id"),
+            )
+
+    condensed_size = sum(estimate_tokens(str(fitted.get(field, "")), MODEL_NAME) for field, _ in INPUT_FIELDS)
+    print(f"Submission {submission.get('id')}: inputs of ~{sum(sizes.values())} tokens condensed "
+          f"to ~{condensed_size} to fit the {ROLE_TOKEN_BUDGET}-token role budget")
+    return fitted
+
+_missing_repos = set()
+
+def repo_checkout(submission):
+    """
+    The submission's "repo_path" if it is an existing folder, else None
+    (warning once about a path that does not exist).
+    """
+    repo_path = submission.get("repo_path")
+    if not repo_path:
+        return None
+    if not os.path.isdir(repo_path):
+        if repo_path not in _missing_repos:
+            _missing_repos.add(repo_path)
+            print(f"Submission {submission.get('id')}: repository {repo_path} not found, reviewing without it")
+        return None
+    return repo_path
+
+def add_repo_context(submission, roles):
+    """
+    For a submission with a "repo_path", a copy with the repository chunks
+    most relevant to the focus of `roles`, within REPO_CONTEXT_TOKENS.
+    Submissions without one are returned unchanged.
+    """
+    repo_path = repo_checkout(submission)
+    if not repo_path:
+        return submission
+    query = " ".join(f"{ROLE_DESCRIPTIONS.get(role, '')} {ROLE_QUERIES.get(role, '')}" for role in roles)
+    chunks = get_repo_index(repo_path).select(query, REPO_CONTEXT_TOKENS)
+    return dict(submission, repo_context=render_chunks(chunks))
+
+def get_role_review(submission, role):
+    """
+    Runs a single code-review role and parses its JSON reply.
+    Returns an empty dictionary if the call or the parsing fails.
+    """
+    with stage("render_prompt"):
+        prompt_text = build_prompt(add_repo_context(submission, [role]), role)
+    try:
+        # Attempt to parse JSON from the AI response
+        return structured_completion(client, MODEL_NAME, prompt_text,
+                                     [f"{role}_score_{n}" for n in range(1, 6)], ("open_questions",),
+                                     persona=role, submission_id=submission.get("id"))
+    except StructuredOutputError as e:
+        print(f"Invalid JSON from OpenAI API for role '{role}': {e}")
+        return {}
+    except Exception as e:
+        print(f"Error calling OpenAI API for role '{role}': {e}")
+        return {}  # Return an empty dictionary if there's a failure
+
+def get_code_review_evaluation(submission, multi_persona=None):
     """
     Runs 4 AI evaluations based on different code-review roles.
+    The roles are sent concurrently through the shared evaluation engine, or,
+    in multi-persona mode, together in one request with per-role fallback calls
+    for any role missing from the reply.
     Returns a dictionary with 4 separate JSON responses.
     """
-    # Define the four roles we want to evaluate
-    roles = ["cto", "fullstack", "crypto", "ai_engineer"]
-    results = {}
-
-    for role in roles:
-        prompt_text = build_prompt(submission, role)
-        try:
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt_text}],
-                model=MODEL_NAME,
-                temperature=0.0
-            )
-            ai_text = response.choices[0].message.content.strip()
-            # Attempt to parse JSON from the AI response
-            results[role] = json.loads(ai_text)
-        except Exception as e:
-            print(f"Error calling OpenAI API for role '{role}': {e}")
-            results[role] = {}  # Return an empty dictionary if there's a failure
+    if multi_persona is None:
+        multi_persona = MULTI_PERSONA_MODE
+
+    # Oversized inputs are summarised once here and shared by all roles
+    with stage("fit_budget"):
+        submission = fit_submission_to_budget(submission)
+
+    combined = {}
+    if multi_persona:
+        with stage("render_prompt"):
+            prompt_text = build_multi_role_prompt(add_repo_context(submission, ROLES), ROLES)
+        combined = get_multi_persona_evaluation(
+            client, MODEL_NAME, prompt_text,
+            {role: [f"{role}_score_{n}" for n in range(1, 6)] for role in ROLES},
+            submission_id=submission.get("id"),
+        )
+
+    missing = [role for role in ROLES if role not in combined]
+    jobs = [(submission, role) for role in missing]
+    combined.update(zip(missing, run_jobs(jobs, get_role_review)))
+    return {role: combined[role] for role in ROLES}
 
-    return results
+def batch_prompts(sub):
+    """
+    The per-role requests a run makes for one submission, as (persona, prompt)
+    pairs, for Batch API mode (see batch_mode.py). Oversized inputs are
+    condensed first, as in a normal run, which calls the API (see
+    needs_condensing).
+    """
+    submission = fit_submission_to_budget(sub)
+    return [(role, build_prompt(add_repo_context(submission, [role]), role)) for role in ROLES]
+
+def evaluate_persona(sub, persona):
+    """
+    One role's review of one submission, for job-queue workers (see
+    job_queue.py). Returns an empty dictionary if the call failed.
+    """
+    return get_role_review(fit_submission_to_budget(sub), persona)
 
-def main():
+def main(argv=None):
     """
     Reads a list of code submissions from datain/code_submissions.json, 
     uses 4 AI agents to evaluate each submission, 
     and saves each agent's review in dataout/codereview/<submission_id>_<role>.json.
     """
-    # Read input from datain/code_submissions.json
-    with open("datain/code_submissions.json", "r", encoding="utf-8") as f:
-        submissions = json.load(f)
+    parser = argparse.ArgumentParser(description="Review hackathon code submissions with four AI agents.")
+    parser.add_argument("--input", default="datain/code_submissions.json",
+                        help="code submissions as a JSON array or a .jsonl file")
+    parser.add_argument("--multi-persona", action="store_true", default=MULTI_PERSONA_MODE,
+                        help="ask all four roles in one request per submission")
+    add_store_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    start_profiling(args)
+    store = open_store(args, "code_review", MODEL_NAME, args.input)
 
     # Ensure the output directory exists
     output_dir = "dataout/codereview"
-    os.makedirs(output_dir, exist_ok=True)
+    if not store:
+        os.makedirs(output_dir, exist_ok=True)
 
-    # Process each submission
-    for sub in submissions:
-        eval_results = get_code_review_evaluation(sub)
+    # Stream and process each submission
+    for sub in profiled("load", iter_records(args.input)):
+        with stage("evaluate"):
+            eval_results = get_code_review_evaluation(sub, args.multi_persona)
 
         # Save each role-based evaluation separately into dataout/codereview
-        for role, evaluation in eval_results.items():
-            filename = f"{output_dir}/{sub.get('id')}_{role}.json"
-            with open(filename, "w", encoding="utf-8") as out:
-                json.dump(evaluation, out, indent=2, ensure_ascii=False)
+        with stage("write_results"):
+            for role, evaluation in eval_results.items():
+                if store:
+                    store.add(sub.get("id"), role, evaluation)
+                    continue
+                filename = f"{output_dir}/{sub.get('id')}_{role}.json"
+                with open(filename, "w", encoding="utf-8") as out:
+                    json.dump(evaluation, out, indent=2, ensure_ascii=False)
 
-    print(f"Code reviews complete. Results saved in {output_dir}/")
+    if store:
+        store.finish_run()
+        store.close()
+        print(f"Code reviews complete. Results saved in the result store {args.store_path}")
+    else:
+        print(f"Code reviews complete. Results saved in {output_dir}/")
+    print(get_cache().summary())
+    report_run()
+    finish_profiling()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,122 @@
+import os
+
+from eval_engine import run_jobs
+from llm_client import chat_completion
+from token_count import estimate_tokens, split_into_chunks, truncate_to_tokens
+
+# Map-reduce settings for inputs that do not fit a prompt's token budget.
+# Each chunk summary is capped at SUMMARY_MAX_TOKENS, and at most MAX_CHUNKS
+# chunks per field are summarised (the rest is dropped with a note), which
+# gives every condensed field a known upper bound on cost:
+#   MAX_CHUNKS map calls of <= CHUNK_TOKENS + overhead tokens in,
+#   plus the reduce calls over the (much smaller) summaries.
+CHUNK_TOKENS = int(os.environ.get("EVAL_CHUNK_TOKENS", "2000"))
+SUMMARY_MAX_TOKENS = int(os.environ.get("EVAL_SUMMARY_MAX_TOKENS", "300"))
+MAX_CHUNKS = int(os.environ.get("EVAL_MAX_CHUNKS", "24"))
+
+def build_summary_prompt(label, text, part, parts):
+    """
+    Map step: summarise one chunk of a long submission field.
+    """
+    prompt_template = f"""
+You are condensing part of a hackathon submission so that code reviewers can assess it
+without reading the full text.
+
+Field: {label} (part {part} of {parts})
+
+Summarise this part in plain text, in at most {SUMMARY_MAX_TOKENS * 3 // 4} words. Keep the
+architecture, components, key functions and what they do, smart contract logic, security-relevant
+details, AI/ML details, dependencies, and anything that looks incomplete or risky.
+Do not add commentary or judgements of your own.
+
+---
+{text}
+---
+"""
+    return prompt_template.strip()
+
+def build_merge_prompt(label, summaries):
+    """
+    Reduce step: merge several chunk summaries of one field into one.
+    """
+    joined = "\n\n".join(f"Part {n}:\n{summary}" for n, summary in enumerate(summaries, start=1))
+    prompt_template = f"""
+You are condensing a long hackathon submission field for code reviewers.
+Below are summaries of consecutive parts of the field "{label}".
+
+Merge them into a single plain-text summary of at most {SUMMARY_MAX_TOKENS * 3 // 4} words,
+keeping the most important technical facts and anything incomplete or risky.
+Do not add commentary or judgements of your own.
+
+{joined}
+"""
+    return prompt_template.strip()
+
+def _summarise(client, model, prompt_text, fallback_text, submission_id=None):
+    """
+    Run one map or reduce call. If it fails, keep a truncated copy of the
+    input instead so the review can still go ahead.
+    """
+    try:
+        return chat_completion(client, model, prompt_text, temperature=0.0, max_tokens=SUMMARY_MAX_TOKENS,
+                               persona="condense", submission_id=submission_id)
+    except Exception as e:
+        print(f"Error summarising input, keeping a truncated copy: {e}")
+        return truncate_to_tokens(fallback_text, SUMMARY_MAX_TOKENS, model)
+
+def condense_text(client, model, label, text, max_tokens, submission_id=None):
+    """
+    Bring `text` under `max_tokens` tokens with map-reduce summarisation:
+    split into CHUNK_TOKENS chunks, summarise the chunks concurrently, then
+    merge the summaries (repeatedly, if needed) until they fit.
+    Every summary goes through the shared LLM cache, so a rerun, or any
+    other role reusing this field, costs nothing.
+    """
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+
+    chunks = split_into_chunks(text, CHUNK_TOKENS, model)
+    note = ""
+    if len(chunks) > MAX_CHUNKS:
+        note = f"\n[{len(chunks) - MAX_CHUNKS} further parts were omitted to stay within budget]"
+        chunks = chunks[:MAX_CHUNKS]
+
+    jobs = [
+        (client, model, build_summary_prompt(label, chunk, n, len(chunks)), chunk, submission_id)
+        for n, chunk in enumerate(chunks, start=1)
+    ]
+    summaries = run_jobs(jobs, _summarise)
+
+    # Reduce: merge groups of summaries until the result fits the budget
+    while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries), model) > max_tokens:
+        group_size = max(2, CHUNK_TOKENS // SUMMARY_MAX_TOKENS)
+        groups = [summaries[i:i + group_size] for i in range(0, len(summaries), group_size)]
+        summaries = run_jobs(
+            [(client, model, build_merge_prompt(label, group), "\n".join(group), submission_id) for group in groups],
+            _summarise,
+        )
+
+    condensed = f"[Condensed summary of {len(chunks)} parts]\n" + "\n\n".join(summaries) + note
+    # Last resort so the budget is a hard guarantee
+    return truncate_to_tokens(condensed, max_tokens, model)
+
+def allocate_budget(sizes, budget):
+    """
+    Split `budget` tokens across fields of the given `sizes` ({name: tokens}).
+    Fields that fit their fair share keep their full size; the leftover is
+    shared equally by the larger ones ("water filling").
+    """
+    allowances = {}
+    remaining = dict(sizes)
+    while remaining:
+        share = budget // len(remaining)
+        small = {name: size for name, size in remaining.items() if size <= share}
+        if not small:
+            for name in remaining:
+                allowances[name] = share
+            break
+        for name, size in small.items():
+            allowances[name] = size
+            budget -= size
+            del remaining[name]
+    return allowances
@@ -0,0 +1,242 @@
+import os
+import time
+
+# Near-duplicate pre-pass: templated or copy-pasted submissions are found with
+# MinHash signatures and LSH banding, one representative per cluster is
+# evaluated, and the others are linked to its result with "duplicate_of".
+# Enable with --dedup on the scripts, or: export EVAL_DEDUP=1
+# Needs numpy (pip install numpy).
+DEDUP_MODE = os.environ.get("EVAL_DEDUP", "0") == "1"
+DEDUP_THRESHOLD = float(os.environ.get("EVAL_DEDUP_THRESHOLD", "0.9"))
+# Signature length; a power of two
+NUM_PERM = int(os.environ.get("EVAL_DEDUP_NUM_PERM", "128"))
+SHINGLE_WORDS = 3
+SIGNATURE_CHUNK = 1000
+
+EMPTY = 0xFFFFFFFF
+
+def _mix(x, np):
+    # splitmix64 finalizer: spreads every input bit over the whole word
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _word_hashes(data, np):
+    """
+    Hash every word of a UTF-8 byte string at once. A word is a run of ASCII
+    letters, digits, "_" or non-ASCII bytes, summarised by its length, the
+    sum of its bytes and their first moment about the word start (from
+    running sums over the whole string), then mixed.
+    Returns (hashes, start offsets).
+    """
+    table = np.zeros(256, dtype=np.uint32)
+    for low, high in ((48, 57), (65, 90), (97, 122), (95, 95), (128, 255)):
+        table[low:high + 1] = np.arange(low + 1, high + 2, dtype=np.uint32)
+    values = table[data]
+    edges = np.flatnonzero(np.diff((values != 0).view(np.int8), prepend=0, append=0))
+    starts, ends = edges[::2], edges[1::2]
+    if not len(starts):
+        return np.zeros(0, dtype=np.uint64), starts
+
+    # Running sums wrap around in uint32, but their differences stay exact
+    sums = np.concatenate([[0], np.cumsum(values, dtype=np.uint32)])
+    moments = np.concatenate([[0], np.cumsum(values * np.arange(len(data), dtype=np.uint32), dtype=np.uint32)])
+    s0 = (sums[ends] - sums[starts]).astype(np.uint64)
+    s1 = (moments[ends] - moments[starts]).astype(np.uint64)
+    origin = starts.astype(np.uint64)
+    m1 = (s1 - origin * s0) & np.uint64(0xFFFFFFFF)
+    length = (ends - starts).astype(np.uint64)
+    return _mix(_mix((length << np.uint64(32)) | s0, np) + m1, np), starts
+
+def minhash_signatures(texts, num_perm=NUM_PERM):
+    """
+    One-permutation MinHash over word SHINGLE_WORDS-grams: each shingle is
+    hashed once, the high bits pick one of `num_perm` bins and each bin keeps
+    its minimum; empty bins borrow from the next filled bin (densification).
+    Documents are tokenised and hashed SIGNATURE_CHUNK at a time as flat
+    NumPy arrays, with no per-word Python work.
+    Returns a (documents x num_perm) uint32 array and a mask of the documents
+    that have at least SHINGLE_WORDS words (shorter ones are never matched).
+    """
+    import numpy as np
+
+    bin_bits = num_perm.bit_length() - 1
+    if 1 << bin_bits != num_perm:
+        raise ValueError(f"EVAL_DEDUP_NUM_PERM must be a power of two, got {num_perm}")
+
+    multipliers = _mix(np.arange(101, 101 + SHINGLE_WORDS, dtype=np.uint64), np)
+    signatures = []
+    valid = []
+    chunk = []
+
+    def flush(chunk):
+        # One byte string per chunk; "\0" separators are never part of a word
+        parts = [text.lower().encode("utf-8") for text in chunk]
+        data = np.frombuffer(b"\0".join(parts), dtype=np.uint8)
+        doc_ends = np.cumsum([len(part) + 1 for part in parts])
+        words, starts = _word_hashes(data, np)
+        docs = np.searchsorted(doc_ends, starts, side="right")
+
+        n = max(len(words) - SHINGLE_WORDS + 1, 0)
+        shingles = np.zeros(n, dtype=np.uint64)
+        for k in range(SHINGLE_WORDS):
+            shingles += words[k:k + n] * multipliers[k]
+        # Shingles that run into the next document are dropped
+        same_doc = docs[:n] == docs[SHINGLE_WORDS - 1:SHINGLE_WORDS - 1 + n]
+        hashed, owner = _mix(shingles[same_doc], np), docs[:n][same_doc]
+
+        sig = np.full((len(chunk), num_perm), EMPTY, dtype=np.uint32)
+        bins = (hashed >> np.uint64(64 - bin_bits)).astype(np.int64) if bin_bits else np.zeros(len(hashed), dtype=np.int64)
+        values = (hashed & np.uint64(0xFFFFFFFE)).astype(np.uint32)
+        np.minimum.at(sig.reshape(-1), owner * num_perm + bins, values)
+
+        # Densify: an empty bin takes the next filled bin's value (circularly), offset by the distance
+        filled = sig != EMPTY
+        columns = np.arange(num_perm)
+        candidates = np.where(filled, columns, 2 * num_perm)
+        doubled = np.concatenate([candidates, np.where(filled, columns + num_perm, 2 * num_perm)], axis=1)
+        next_filled = np.minimum.accumulate(doubled[:, ::-1], axis=1)[:, ::-1][:, :num_perm]
+        has_words = filled.any(axis=1)
+        next_filled = np.where(has_words[:, None], next_filled, columns)
+        distance = (next_filled - columns).astype(np.uint32)
+        dense = np.take_along_axis(sig, next_filled % num_perm, axis=1) + distance * np.uint32(0x9E3779B1)
+        signatures.append(np.where(has_words[:, None], dense, EMPTY).astype(np.uint32))
+        valid.append(has_words)
+
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= SIGNATURE_CHUNK:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    if not signatures:
+        return np.zeros((0, num_perm), dtype=np.uint32), np.zeros(0, dtype=bool)
+    return np.concatenate(signatures), np.concatenate(valid)
+
+def lsh_bands(num_perm, threshold):
+    """
+    Pick (bands, rows) with bands * rows == num_perm and an LSH threshold
+    (1/bands) ** (1/rows) comfortably below `threshold`, so near-duplicates
+    are almost never missed; the candidates are verified afterwards.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold - 0.1:
+            best = (bands, rows)
+    return best
+
+def cluster_signatures(signatures, valid, threshold=DEDUP_THRESHOLD):
+    """
+    Group documents whose estimated Jaccard similarity is >= `threshold`.
+    Each band sorts the documents by band hash and only neighbours with equal
+    keys become candidate pairs, so the work is O(n log n) instead of O(n^2)
+    even when thousands of copies share a bucket.
+    Returns {duplicate index: representative index}; the representative is
+    the earliest document of its cluster.
+    """
+    import numpy as np
+
+    count, num_perm = signatures.shape
+    index = np.flatnonzero(valid)
+    if len(index) < 2:
+        return {}
+    sig = signatures[index]
+    bands, rows = lsh_bands(num_perm, threshold)
+    weights = _mix(np.arange(1, rows + 1, dtype=np.uint64), np)
+
+    pairs = []
+    for band in range(bands):
+        keys = (sig[:, band * rows:(band + 1) * rows].astype(np.uint64) * weights).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        same = keys[order[1:]] == keys[order[:-1]]
+        pairs.append(np.stack([order[:-1][same], order[1:][same]], axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    if not len(pairs):
+        return {}
+    similarity = (sig[pairs[:, 0]] == sig[pairs[:, 1]]).mean(axis=1)
+    pairs = pairs[similarity >= threshold]
+
+    # Union-find, keeping the smallest (earliest) index as each root
+    parent = list(range(len(index)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    members = np.array([i for i in range(len(index)) if find(i) != i], dtype=np.int64)
+    if not len(members):
+        return {}
+    roots = np.array([find(i) for i in members.tolist()], dtype=np.int64)
+    # Chains can drift: only link documents that are close to the representative itself
+    close = (sig[members] == sig[roots]).mean(axis=1) >= threshold
+    return {int(index[m]): int(index[r]) for m, r in zip(members[close], roots[close])}
+
+def find_duplicates(records, text_of, threshold=DEDUP_THRESHOLD):
+    """
+    Pre-pass over `records` (streamed once): returns {duplicate id: representative id},
+    comparing the text `text_of(record)` of every submission.
+    """
+    started = time.perf_counter()
+    ids = []
+
+    def texts():
+        for record in records:
+            ids.append(str(record.get("id")))
+            yield text_of(record)
+
+    signatures, valid = minhash_signatures(texts())
+    links = cluster_signatures(signatures, valid, threshold)
+    duplicates = {ids[dup]: ids[rep] for dup, rep in links.items()}
+    print(f"Near-duplicate pre-pass: {len(duplicates)} of {len(ids)} submissions link to "
+          f"{len(set(duplicates.values()))} representatives (similarity >= {threshold}, "
+          f"{time.perf_counter() - started:.1f}s)")
+    return duplicates
+
+class DuplicateLinker:
+    """
+    Applies a {duplicate id: representative id} map to a stream of batches:
+    originals() drops the duplicates before evaluation, and link() yields the
+    evaluated records followed by a copy of the representative's record for
+    each duplicate, with its own id and "duplicate_of". A representative is
+    always earlier in the input than its duplicates, so its result is known
+    by the time they are reached; only representatives' records are kept.
+    """
+
+    def __init__(self, duplicates):
+        self.duplicates = duplicates
+        self.representatives = set(duplicates.values())
+        self._results = {}
+
+    def originals(self, batch):
+        return [sub for sub in batch if str(sub.get("id")) not in self.duplicates]
+
+    def link(self, batch, records):
+        for record in records:
+            if str(record.get("id")) in self.representatives:
+                self._results[str(record.get("id"))] = record
+            yield record
+        for sub in batch:
+            rep_id = self.duplicates.get(str(sub.get("id")))
+            if rep_id is None:
+                continue
+            representative = self._results[rep_id]
+            linked = dict(representative)
+            linked["id"] = sub.get("id")
+            if "name" in linked:
+                linked["name"] = sub.get("name")
+            linked["duplicate_of"] = representative.get("id")
+            yield linked
@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# How many LLM calls may be in flight at once.
+# Override with: export EVAL_CONCURRENCY=16
+MAX_CONCURRENCY = int(os.environ.get("EVAL_CONCURRENCY", "8"))
+
+async def _run_all(jobs, worker, concurrency):
+    """
+    Fan the jobs out over a thread pool, never more than `concurrency` at a time.
+    The OpenAI calls are blocking, so each job runs in its own worker thread while
+    the event loop only does the scheduling.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        async def run_one(job):
+            async with semaphore:
+                return await loop.run_in_executor(pool, worker, *job)
+
+        # gather() keeps results in the same order as the jobs were given
+        return await asyncio.gather(*(run_one(job) for job in jobs))
+
+def run_jobs(jobs, worker, concurrency=None):
+    """
+    Runs worker(*job) for every job tuple and returns the results as a list
+    in the same order as `jobs`, so output stays deterministic no matter
+    which call finishes first.
+    """
+    jobs = [tuple(job) for job in jobs]
+    if not jobs:
+        return []
+
+    concurrency = max(1, concurrency or MAX_CONCURRENCY)
+    if concurrency == 1:
+        # Plain serial loop, handy for debugging
+        return [worker(*job) for job in jobs]
+
+    # asyncio is imported here, on the first concurrent batch, to keep startup fast
+    import asyncio
+
+    return asyncio.run(_run_all(jobs, worker, min(concurrency, len(jobs))))
+
+# How many submissions are read and evaluated per window when streaming input.
+# A few times the concurrency keeps every slot busy while memory stays flat.
+STREAM_BATCH_SIZE = MAX_CONCURRENCY * 4
+
+def iter_batches(iterable, size=None):
+    """
+    Group any iterable (e.g. a streamed submissions file) into lists of `size`.
+    """
+    size = size or STREAM_BATCH_SIZE
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,14 +1,26 @@
 import os
 import json
-from openai import OpenAI
+import argparse
+
+from cascade import Cascade, add_cascade_arguments
+from eval_engine import run_jobs
+from jsonl_io import iter_records
+from llm_cache import get_cache
+from llm_backend import get_backend
+from multi_persona import get_multi_persona_evaluation, MULTI_PERSONA_MODE
+from profiling import add_profile_arguments, finish_profiling, profiled, stage, start_profiling
+from result_store import add_store_arguments, open_store
+from structured_output import StructuredOutputError, structured_completion
+from telemetry import report_run
 
 # 1) Provide your API key here, or let it come from an environment variable
 API_KEY = os.environ.get("OPENAI_API_KEY")
 # Alternatively, you could inline your key:
 # API_KEY = "sk-..."
 
-# 2) Create the OpenAI client
-client = OpenAI(api_key=API_KEY)
+# 2) Create the LLM client: the shared OpenAI backend by default
+# (set EVAL_BACKEND / EVAL_BASE_URL to use another one, see llm_backend.py)
+client = get_backend(api_key=API_KEY)
 
 # 3) Choose your model name here
 MODEL_NAME = "gpt-4"  
@@ -23,32 +35,38 @@ WEIGHTS = {
     "theme_alignment": 0.15,
 }
 
-def build_prompt(high_level_pitch, project_pitch, role):
-    """
-    Construct the prompt for a specific evaluator role.
-    """
-    role_descriptions = {
-        "entrepreneur": """
+# What the first-tier screening model is told about the call (see cascade.py)
+SCREEN_CONTEXT = (
+    "Hackathon project pitches. The finalists are reviewed by an entrepreneur, a financial "
+    "expert, a marketing expert, a legal expert, a CTO and a developer."
+)
+
+ROLE_DESCRIPTIONS = {
+    "entrepreneur": """
 You are an experienced entrepreneur evaluating hackathon projects. Focus on scalability, market potential, and the business opportunity this project represents. Consider whether this idea can attract investors, sustain growth, and differentiate itself in a competitive space.
 """,
-        "financial": """
+    "financial": """
 You are a financial expert evaluating hackathon projects. Focus on the revenue model, investment potential, and financial sustainability of the project. Assess how well the business can scale profitably, attract funding, and manage operational costs.
 """,
-        "marketing": """
+    "marketing": """
 You are a marketing expert evaluating hackathon projects. Focus on the go-to-market strategy, branding, and customer acquisition potential. Assess the effectiveness of the project’s outreach strategy, its ability to generate interest, and its alignment with market needs.
 """,
-        "legal": """
+    "legal": """
 You are a legal expert evaluating hackathon projects. Focus on regulatory compliance, intellectual property, and legal risks. Assess whether the project has considered legal frameworks, data privacy, and protection of proprietary information.
 """,
-        "cto": """
+    "cto": """
 You are a CTO evaluating hackathon projects. Focus on the technical feasibility, infrastructure, and engineering decisions behind the project. Assess how scalable, secure, and efficient the technology is, as well as its potential for real-world implementation.
 """,
-        "developer": """
+    "developer": """
 You are a software engineer evaluating hackathon projects. Focus on the code quality, implementation complexity, and maintainability. Assess whether the project follows best coding practices, is well-documented, and is efficient in execution.
 """
-    }
+}
 
-    role_prompt = role_descriptions.get(role, "You are an AI assistant evaluating a hackathon project.")
+def build_prompt(high_level_pitch, project_pitch, role):
+    """
+    Construct the prompt for a specific evaluator role.
+    """
+    role_prompt = ROLE_DESCRIPTIONS.get(role, "You are an AI assistant evaluating a hackathon project.")
 
     prompt_template = f"""
 {role_prompt}
@@ -86,31 +104,102 @@ Return your answer in JSON format without extra commentary, for example:
 
     return prompt_template.strip()
 
-def get_ai_evaluation(high_level_pitch, project_pitch):
+def build_multi_role_prompt(high_level_pitch, project_pitch, roles):
     """
-    Runs six AI evaluations based on different evaluator backgrounds.
-    Returns six separate JSON responses.
+    Single-call variant of build_prompt: the pitch is sent once and every role
+    in `roles` is asked for its evaluation, keyed by role name.
     """
-    roles = ["entrepreneur", "financial", "marketing", "legal", "cto", "developer"]
-    results = {}
+    panel_text = "\n".join(
+        f"[{role}]{ROLE_DESCRIPTIONS.get(role, 'You are an AI assistant evaluating a hackathon project.')}"
+        for role in roles
+    )
+    example_json = ",\n".join(
+        f'  "{role}": {{\n'
+        + "".join(f'    "{role}_score_{n}": <number>,\n' for n in range(1, 6))
+        + '    "summary": "...",\n'
+        + '    "open_questions": ["...", "..."]\n'
+        + "  }"
+        for role in roles
+    )
 
-    for role in roles:
+    prompt_template = f"""
+You are a panel of {len(roles)} independent evaluators. Each panelist evaluates the project
+separately, strictly from their own background:
+
+{panel_text}
+
+**HIGH-LEVEL PITCH**:
+{high_level_pitch}
+
+**DETAILED PROJECT PITCH**:
+{project_pitch}
+
+For EACH panelist, evaluate the project according to that panelist's focus on five
+criteria (each on a 1–5 scale), named <panelist>_score_1 to <panelist>_score_5.
+
+Then, for each panelist:
+- Provide a concise 2–3 sentence summary of the project.
+- List 2–3 open questions if there's any ambiguity.
+
+Return your answer as one JSON object keyed by panelist, without extra commentary, for example:
+
+{{
+{example_json}
+}}
+    """
+
+    return prompt_template.strip()
+
+ROLES = ["entrepreneur", "financial", "marketing", "legal", "cto", "developer"]
+
+def get_role_evaluation(high_level_pitch, project_pitch, role, submission_id=None):
+    """
+    Runs a single evaluator role and parses its JSON reply.
+    Returns an empty dictionary if the call or the parsing fails.
+    """
+    with stage("render_prompt"):
         prompt_text = build_prompt(high_level_pitch, project_pitch, role)
 
-        try:
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt_text}],
-                model=MODEL_NAME,
-                temperature=0.0
-            )
-            ai_text = response.choices[0].message.content.strip()
-            results[role] = json.loads(ai_text)  # Store each role's result separately
-        
-        except Exception as e:
-            print(f"Error calling OpenAI API for {role}: {e}")
-            results[role] = {}  # Return an empty dictionary for the failed role
-
-    return results  # Returns a dictionary containing all six evaluations
+    try:
+        return structured_completion(client, MODEL_NAME, prompt_text,
+                                     [f"{role}_score_{n}" for n in range(1, 6)], ("open_questions",),
+                                     persona=role, submission_id=submission_id)
+
+    except StructuredOutputError as e:
+        print(f"Invalid JSON from OpenAI API for {role}: {e}")
+        return {}
+
+    except Exception as e:
+        print(f"Error calling OpenAI API for {role}: {e}")
+        return {}  # Return an empty dictionary for the failed role
+
+def get_ai_evaluation(high_level_pitch, project_pitch, multi_persona=None, submission_id=None):
+    """
+    Runs six AI evaluations based on different evaluator backgrounds.
+    The roles are sent concurrently through the shared evaluation engine, or,
+    in multi-persona mode, together in one request with per-role fallback calls
+    for any role missing from the reply.
+    Returns six separate JSON responses.
+    """
+    if multi_persona is None:
+        multi_persona = MULTI_PERSONA_MODE
+
+    combined = {}
+    if multi_persona:
+        with stage("render_prompt"):
+            prompt_text = build_multi_role_prompt(high_level_pitch, project_pitch, ROLES)
+        combined = get_multi_persona_evaluation(
+            client, MODEL_NAME, prompt_text,
+            {role: [f"{role}_score_{n}" for n in range(1, 6)] for role in ROLES},
+            submission_id=submission_id,
+        )
+
+    missing = [role for role in ROLES if role not in combined]
+    jobs = [(high_level_pitch, project_pitch, role, submission_id) for role in missing]
+    combined.update(zip(missing, run_jobs(jobs, get_role_evaluation)))
+
+    # Store each role's result separately, in the fixed ROLES order
+    return {role: combined[role] for role in ROLES}
 
 def calculate_weighted_score(ai_result):
     """
@@ -137,24 +226,75 @@ def calculate_weighted_score(ai_result):
 
     return round(total, 3)
 
-def main():
-    # Read input from datain/submissions.json
-    with open("datain/submissions.json", "r", encoding="utf-8") as f:
-        submissions = json.load(f)
+def batch_prompts(sub):
+    """
+    The per-role requests a run makes for one submission, as (persona, prompt)
+    pairs, for Batch API mode (see batch_mode.py).
+    """
+    return [(role, build_prompt(sub.get("high_level_pitch", ""), sub.get("project_pitch", ""), role))
+            for role in ROLES]
 
-    for sub in submissions:
+def evaluate_persona(sub, persona):
+    """
+    One role's evaluation of one submission, for job-queue workers (see
+    job_queue.py). Returns an empty dictionary if the call failed.
+    """
+    return get_role_evaluation(sub.get("high_level_pitch", ""), sub.get("project_pitch", ""), persona, sub.get("id"))
+
+def pitch_text(sub):
+    return f"{sub.get('high_level_pitch', '')}\n\n{sub.get('project_pitch', '')}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate hackathon pitches with six evaluator roles.")
+    parser.add_argument("--input", default="datain/submissions.json",
+                        help="submissions as a JSON array or a .jsonl file")
+    parser.add_argument("--multi-persona", action="store_true", default=MULTI_PERSONA_MODE,
+                        help="ask all six roles in one request per submission")
+    add_cascade_arguments(parser)
+    add_store_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    start_profiling(args)
+    store = open_store(args, "evaluation_test", MODEL_NAME, args.input)
+
+    cascade = None
+    if args.cascade:
+        cascade = Cascade(client, SCREEN_CONTEXT, pitch_text, "dataout/screening.jsonl",
+                          args.screen_model, args.screen_top_fraction, args.screen_min_score)
+        with stage("screening"):
+            cascade.screen(iter_records(args.input))
+
+    # Stream input from datain/submissions.json one submission at a time
+    for sub in profiled("load", iter_records(args.input)):
+        if cascade and not cascade.passes(sub):
+            continue
         high_pitch = sub.get("high_level_pitch", "")
         proj_pitch = sub.get("project_pitch", "")
 
-        ai_evaluations = get_ai_evaluation(high_pitch, proj_pitch)
+        with stage("evaluate"):
+            ai_evaluations = get_ai_evaluation(high_pitch, proj_pitch, args.multi_persona, sub.get("id"))
 
         # Save each evaluation separately
-        for role, evaluation in ai_evaluations.items():
-            filename = f"dataout/{sub.get('id')}_{role}.json"
-            with open(filename, "w", encoding="utf-8") as out:
-                json.dump(evaluation, out, indent=2, ensure_ascii=False)
-
-    print("Evaluations complete. Individual role-based results saved in dataout/")
+        with stage("write_results"):
+            for role, evaluation in ai_evaluations.items():
+                if store:
+                    store.add(sub.get("id"), role, evaluation)
+                    continue
+                filename = f"dataout/{sub.get('id')}_{role}.json"
+                with open(filename, "w", encoding="utf-8") as out:
+                    json.dump(evaluation, out, indent=2, ensure_ascii=False)
+
+    if store:
+        store.finish_run()
+        store.close()
+        print(f"Evaluations complete. Role-based results saved in the result store {args.store_path}")
+    else:
+        print("Evaluations complete. Individual role-based results saved in dataout/")
+    print(get_cache().summary())
+    report_run()
+    if cascade:
+        print(cascade.report(MODEL_NAME, ROLES))
+    finish_profiling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import importlib
+import threading
+import multiprocessing
+
+from eval_engine import run_jobs, MAX_CONCURRENCY
+from jsonl_io import iter_records
+
+# Job-queue mode: spread one evaluation over several worker processes, on one
+# or more hosts sharing a volume. Every (submission, persona) pair becomes a
+# job in a SQLite queue; workers claim jobs under a lease that a heartbeat
+# keeps extending, so the jobs of a worker that dies are picked up again once
+# its lease runs out. The merge step feeds the results to the script, which
+# writes its usual sorted outputs without calling the API again.
+#
+#   python scripts/job_queue.py enqueue aquarium --input aquariumdatain/cohort7.jsonl
+#   python scripts/job_queue.py work aquarium --processes 4     # on every host
+#   python scripts/job_queue.py status aquarium
+#   python scripts/job_queue.py merge aquarium
+#
+# The queue must live on a volume with working file locks (SQLite's WAL mode
+# needs them), e.g. export EVAL_QUEUE_DIR=/mnt/shared/jobqueue
+QUEUE_DIR = os.environ.get("EVAL_QUEUE_DIR", "jobqueue")
+# Seconds a claimed job stays leased without a heartbeat
+LEASE_SECONDS = float(os.environ.get("EVAL_QUEUE_LEASE", "120"))
+# A job that failed (or whose worker died) this many times is given up
+MAX_ATTEMPTS = int(os.environ.get("EVAL_QUEUE_MAX_ATTEMPTS", "3"))
+# How often an idle worker checks for jobs left by workers that died
+IDLE_POLL_SECONDS = float(os.environ.get("EVAL_QUEUE_POLL", "5"))
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id INTEGER PRIMARY KEY,"
+    " submission_id TEXT NOT NULL,"
+    " persona TEXT NOT NULL,"
+    " record TEXT NOT NULL,"
+    " status TEXT NOT NULL DEFAULT 'queued',"  # queued, leased, done, failed
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " worker TEXT,"
+    " lease_expires REAL,"
+    " result TEXT,"
+    " updated_at REAL NOT NULL)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS jobs_pair ON jobs (submission_id, persona)",
+    "CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, lease_expires)",
+]
+
+# Target -> (module, default input, the personas each submission is evaluated by)
+TARGETS = {
+    "aquarium": ("aquarium_evaluation", "aquariumdatain/submissions.json",
+                 lambda module: [agent["agent_name"] for agent in module.AGENTS]),
+    "pitch": ("sub_evaluation", "datain/submissions.json", lambda module: ["pitch"]),
+    "panel": ("evaluation_test", "datain/submissions.json", lambda module: list(module.ROLES)),
+    "code-review": ("code_review", "datain/code_submissions.json", lambda module: list(module.ROLES)),
+}
+
+class JobQueue:
+    """
+    Lease-based job queue in SQLite, shared by any number of processes.
+    Claims run in an IMMEDIATE transaction, so two workers never lease the
+    same job. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=60000")
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+        return self._conn
+
+    def _transaction(self, work):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def meta(self):
+        with self._lock:
+            return dict(self._connect().execute("SELECT key, value FROM meta").fetchall())
+
+    def enqueue(self, meta, jobs):
+        """
+        Add (submission_id, persona, record) jobs; pairs already in the queue
+        are kept as they are, so enqueueing again only adds what is new.
+        Returns how many jobs were added.
+        """
+        def work(conn):
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", list(meta.items()))
+            before = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (submission_id, persona, record, updated_at) VALUES (?, ?, ?, ?)",
+                ((str(submission_id), persona, json.dumps(record, ensure_ascii=False), now)
+                 for submission_id, persona, record in jobs),
+            )
+            return conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - before
+        return self._transaction(work)
+
+    def claim(self, worker, limit):
+        """
+        Lease up to `limit` jobs to `worker`: queued ones first, then ones
+        whose lease expired. Jobs out of attempts are marked failed instead.
+        Returns [(job id, submission record, persona)].
+        """
+        def work(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', worker = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, MAX_ATTEMPTS),
+            )
+            rows = conn.execute(
+                "SELECT id, record, persona FROM jobs "
+                "WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                [(worker, now + LEASE_SECONDS, now, job_id) for job_id, _, _ in rows],
+            )
+            return [(job_id, json.loads(record), persona) for job_id, record, persona in rows]
+        return self._transaction(work)
+
+    def heartbeat(self, worker, job_ids):
+        """
+        Extend the leases `worker` still holds on `job_ids`.
+        """
+        if not job_ids:
+            return
+        def work(conn):
+            now = time.time()
+            conn.executemany(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                [(now + LEASE_SECONDS, now, job_id, worker) for job_id in job_ids],
+            )
+        self._transaction(work)
+
+    def complete(self, worker, job_id, result):
+        """
+        Store a finished job's result. A failed job (result None) goes back
+        to the queue until it is out of attempts. Does nothing if the lease
+        was lost to another worker in the meantime.
+        """
+        def work(conn):
+            now = time.time()
+            if result is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL, updated_at = ? "
+                    "WHERE id = ? AND worker = ? AND status = 'leased'",
+                    (json.dumps(result, ensure_ascii=False), now, job_id, worker),
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                    "worker = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE id = ? AND worker = ? AND status = 'leased'",
+                    (MAX_ATTEMPTS, now, job_id, worker),
+                )
+        self._transaction(work)
+
+    def counts(self):
+        """
+        {status: jobs}, with leased jobs whose lease ran out counted as "expired".
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END, COUNT(*) "
+                "FROM jobs GROUP BY 1",
+                (time.time(),),
+            ).fetchall()
+        return dict(rows)
+
+    def results(self):
+        """
+        {(submission_id, persona): result} for every finished job.
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT submission_id, persona, result FROM jobs WHERE status = 'done'"
+            ).fetchall()
+        return {(submission_id, persona): json.loads(result) for submission_id, persona, result in rows}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def queue_path(target):
+    return os.path.join(QUEUE_DIR, f"{target}.sqlite")
+
+def enqueue(target, input_path):
+    module_name, _, personas_of = TARGETS[target]
+    module = importlib.import_module(module_name)
+    personas = personas_of(module)
+    queue = JobQueue(queue_path(target))
+    meta = {"input": input_path, "model": module.MODEL_NAME}
+    previous = queue.meta()
+    if previous and previous.get("input") != input_path:
+        raise ValueError(f"{queue.path} holds jobs for {previous['input']}; merge or delete it first")
+    jobs = ((sub.get("id"), persona, sub) for sub in iter_records(input_path) for persona in personas)
+    added = queue.enqueue(meta, jobs)
+    print(f"Enqueued {added} new (submission, persona) jobs for {input_path} in {queue.path}")
+    queue.close()
+
+def _heartbeat(queue, worker, held, held_lock, stop):
+    while not stop.wait(LEASE_SECONDS / 3):
+        with held_lock:
+            job_ids = list(held)
+        queue.heartbeat(worker, job_ids)
+
+def work(target, worker=None, concurrency=None):
+    """
+    One worker process: claim jobs, run them through the script's own
+    per-persona evaluation (cached, rate limited and repaired as usual) with
+    `concurrency` calls in flight, and store the results. Stops once no job
+    is left to claim or waiting on another worker's lease.
+    """
+    from telemetry import report_run
+
+    module_name, _, _ = TARGETS[target]
+    module = importlib.import_module(module_name)
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    concurrency = concurrency or MAX_CONCURRENCY
+    queue = JobQueue(queue_path(target))
+
+    held = set()
+    held_lock = threading.Lock()
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(queue, worker, held, held_lock, stop), daemon=True).start()
+
+    def run_one(job_id, sub, persona):
+        try:
+            result = module.evaluate_persona(sub, persona) or None
+        except Exception as e:
+            print(f"[{worker}] {sub.get('id')}/{persona} failed: {e}")
+            result = None
+        queue.complete(worker, job_id, result)
+        with held_lock:
+            held.discard(job_id)
+        return result is not None
+
+    finished = 0
+    try:
+        while True:
+            jobs = queue.claim(worker, concurrency)
+            if not jobs:
+                counts = queue.counts()
+                if not counts.get("leased"):
+                    break
+                # Others are still working; their jobs come back if they die
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            with held_lock:
+                held.update(job_id for job_id, _, _ in jobs)
+            finished += sum(run_jobs(jobs, run_one, concurrency))
+    finally:
+        stop.set()
+        queue.close()
+    print(f"[{worker}] finished {finished} jobs")
+    report_run()
+
+def _worker_process(target, concurrency):
+    # A spawned worker starts from the scripts' built-in settings; re-apply
+    # the campaign the parent was started with (scripts/cli.py --config)
+    config_path = os.environ.get("EVAL_CONFIG")
+    if config_path:
+        import campaign
+
+        module = importlib.import_module(TARGETS[target][0])
+        campaign.apply_settings(module, campaign.section_settings(campaign.load_config(config_path), target))
+    work(target, concurrency=concurrency)
+
+def merge(target, script_args):
+    """
+    Put every finished job's result in the response cache under the
+    request the script would send, then run the script, which writes its
+    usual sorted outputs from the cache. Failed jobs are sent interactively.
+    """
+    from llm_cache import get_cache
+    from llm_client import remember
+
+    if get_cache().mode != "on":
+        raise ValueError("The merge replays the results from the response cache; it needs EVAL_CACHE=on")
+    module_name, _, _ = TARGETS[target]
+    module = importlib.import_module(module_name)
+    queue = JobQueue(queue_path(target))
+    meta = queue.meta()
+    if not meta:
+        raise ValueError(f"{queue.path} has no jobs; enqueue them first")
+    counts = queue.counts()
+    results = queue.results()
+    queue.close()
+    if counts.get("queued") or counts.get("leased") or counts.get("expired"):
+        print(f"Warning: {counts} - unfinished jobs will be sent from this process")
+
+    stored = 0
+    for sub in iter_records(meta["input"]):
+        for persona, prompt_text in module.batch_prompts(sub):
+            result = results.get((str(sub.get("id")), persona))
+            if result is not None:
+                remember(meta["model"], prompt_text, json.dumps(result, ensure_ascii=False))
+                stored += 1
+    print(f"Merging {stored} job results from {queue_path(target)}")
+    module.main(["--input", meta["input"]] + list(script_args))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an evaluation over a shared job queue with many worker processes.")
+    subparsers = parser.add_subparsers(dest="step", required=True)
+    enqueue_parser = subparsers.add_parser("enqueue", help="add every (submission, persona) job for an input")
+    enqueue_parser.add_argument("target", choices=sorted(TARGETS))
+    enqueue_parser.add_argument("--input", help="submissions file (defaults to the script's own)")
+    work_parser = subparsers.add_parser("work", help="run worker processes until the queue is empty")
+    work_parser.add_argument("target", choices=sorted(TARGETS))
+    work_parser.add_argument("--processes", type=int, default=1, help="worker processes on this host")
+    work_parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                             help="calls in flight per worker process")
+    status_parser = subparsers.add_parser("status", help="count the jobs by status")
+    status_parser.add_argument("target", choices=sorted(TARGETS))
+    merge_parser = subparsers.add_parser("merge", help="write the script's usual outputs from the results",
+                                         epilog="Any other arguments are passed on to the evaluation script.")
+    merge_parser.add_argument("target", choices=sorted(TARGETS))
+    args, script_args = parser.parse_known_args(argv)
+    if script_args and args.step != "merge":
+        parser.error(f"unrecognized arguments: {' '.join(script_args)}")
+
+    try:
+        if args.step == "enqueue":
+            enqueue(args.target, args.input or TARGETS[args.target][1])
+        elif args.step == "work":
+            if args.processes <= 1:
+                work(args.target, concurrency=args.concurrency)
+                return
+            # Spawned, not forked: every worker gets its own API client and connections
+            context = multiprocessing.get_context("spawn")
+            workers = [context.Process(target=_worker_process, args=(args.target, args.concurrency))
+                       for _ in range(args.processes)]
+            for process in workers:
+                process.start()
+            for process in workers:
+                process.join()
+        elif args.step == "status":
+            queue = JobQueue(queue_path(args.target))
+            print(f"{queue.path}: {queue.counts() or 'empty'}")
+        else:
+            merge(args.target, script_args)
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
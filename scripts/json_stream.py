@@ -0,0 +1,99 @@
+import os
+
+# Incremental check of a streamed reply (see llm_client.py, EVAL_STREAM=on).
+# The text is scanned once as it arrives, tracking nesting and strings, so the
+# stream can be closed as soon as the first complete JSON value validates, or
+# given up on once the reply is clearly not going to contain one: more than
+# EVAL_STREAM_MAX_PROSE characters of prose before the first { or [, or after
+# a value that did not validate. The window is wide, since a given-up reply is
+# sent again without streaming (see llm_client.py): a few paragraphs of
+# preamble before the JSON are cheaper to read than a second request.
+STREAM_MAX_PROSE = int(os.environ.get("EVAL_STREAM_MAX_PROSE", "4000"))
+
+# What may follow a complete value without closing the stream: a reply that
+# simply ends there (or with its closing code fence) is read to the end, so
+# the connection is kept alive and the API's usage is reported
+TRAILING_CHARS = " \t\r\n`"
+
+def validator_for(parse):
+    """
+    A text -> bool check for `parse`: the side-effect-free `parse.is_valid`
+    when it has one (see structured_output.schema_parser), else whether
+    `parse` accepts the text.
+    """
+    is_valid = getattr(parse, "is_valid", None)
+    if is_valid is not None:
+        return is_valid
+
+    def check(text):
+        try:
+            parse(text)
+        except Exception:
+            return False
+        return True
+
+    return check
+
+class JsonStreamWatcher:
+    """
+    Feed it a reply piece by piece. `feed(piece)` returns "more" while the
+    reply should go on, "complete" once a top-level JSON value has closed and
+    `is_valid(text so far)` accepts it and anything but whitespace or a code
+    fence follows, and "abort" once more than `max_prose` characters have
+    arrived outside any JSON value. `value_end` is set once a value validated.
+    """
+
+    def __init__(self, is_valid, max_prose=STREAM_MAX_PROSE):
+        self.is_valid = is_valid
+        self.max_prose = max_prose
+        self.text = ""
+        self.state = "more"
+        self.value_end = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Where the current stretch of text outside any JSON value began
+        self._prose_start = 0
+
+    def feed(self, piece):
+        if self.state != "more":
+            return self.state
+        self.text += piece
+        text = self.text
+        if self.value_end is not None:
+            return self._check_trailing()
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._depth == 0:
+                # Outside a value only an opening bracket matters (quotes in prose don't)
+                if ch in "{[":
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self.is_valid(text[:i + 1]):
+                        self.value_end = i + 1
+                        return self._check_trailing()
+                    self._prose_start = i + 1
+        self._pos = len(text)
+        if self._depth == 0 and len(text) - self._prose_start > self.max_prose:
+            self.state = "abort"
+        return self.state
+
+    def _check_trailing(self):
+        if self.text[self.value_end:].strip(TRAILING_CHARS):
+            self.state = "complete"
+        return self.state
@@ -0,0 +1,153 @@
+import os
+import json
+import threading
+
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+CHUNK_SIZE = 1 << 16
+
+def is_jsonl(path):
+    return path.lower().endswith(JSONL_SUFFIXES)
+
+def iter_records(path):
+    """
+    Yield the submissions in `path` one at a time, without loading the file.
+    Accepts JSON Lines (.jsonl / .ndjson, one object per line) as well as the
+    classic JSON array files in datain/ and aquariumdatain/.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if is_jsonl(path):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+def _iter_json_array(f):
+    """
+    Incrementally decode the elements of a top-level JSON array, keeping only
+    a window of the file in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill(buf, pos):
+        # Drop what has been consumed and append the next chunk
+        chunk = f.read(CHUNK_SIZE)
+        return buf[pos:] + chunk, 0, not chunk
+
+    # Find the opening bracket
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos < len(buf) or eof:
+            break
+        buf, pos, eof = fill(buf, pos)
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError(f"{f.name}: expected a JSON array or a .jsonl file")
+    pos += 1
+
+    while True:
+        # Skip separators between elements
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos, eof = fill(buf, pos)
+        if pos >= len(buf):
+            raise ValueError(f"{f.name}: unterminated JSON array")
+        if buf[pos] == "]":
+            return
+
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buf, pos, eof = fill(buf, pos)
+            continue
+        if end == len(buf) and not eof:
+            # A value touching the end of the window may be cut short
+            buf, pos, eof = fill(buf, pos)
+            continue
+
+        yield record
+        pos = end
+
+class JsonlWriter:
+    """
+    Append records to a JSON Lines file as they complete. Each record is
+    flushed straight away, so nothing accumulates in memory and a crashed run
+    still leaves every finished record on disk. Safe to share between threads.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def rank_jsonl(path, score_key="overall_score"):
+    """
+    Separate ranking pass over a streamed results file.
+    Returns [(score, id, byte_offset)] sorted by score descending, with ties
+    kept in file order. Only these small tuples are held in memory; the full
+    records are read back from disk by offset when they are needed.
+    """
+    ranking = []
+    with open(path, "rb") as f:
+        offset = f.tell()
+        line = f.readline()
+        while line:
+            if line.strip():
+                record = json.loads(line)
+                ranking.append((record.get(score_key, 0), record.get("id"), offset))
+            offset = f.tell()
+            line = f.readline()
+    ranking.sort(key=lambda entry: entry[0], reverse=True)
+    return ranking
+
+def read_at(f, offset):
+    """
+    Read back the record starting at `offset` in an open (binary) JSONL file.
+    """
+    f.seek(offset)
+    return json.loads(f.readline())
+
+def write_ranked_json(jsonl_path, ranking, output_path, indent=2):
+    """
+    Write the records of `jsonl_path` as a JSON array in `ranking` order,
+    one record at a time, producing the same file json.dump(results) would.
+    """
+    with open(jsonl_path, "rb") as src, open(output_path, "w", encoding="utf-8") as out:
+        if not ranking:
+            out.write("[]")
+            return
+        out.write("[\n")
+        for index, (_, _, offset) in enumerate(ranking):
+            text = json.dumps(read_at(src, offset), indent=indent, ensure_ascii=False)
+            out.write(" " * indent + text.replace("\n", "\n" + " " * indent))
+            out.write(",\n" if index < len(ranking) - 1 else "\n")
+        out.write("]")
@@ -0,0 +1,77 @@
+import os
+import csv
+import time
+import heapq
+import threading
+
+# Live leaderboard while a run is in progress: the best LEADERBOARD_SIZE
+# records so far, written out at most every LEADERBOARD_INTERVAL seconds.
+LEADERBOARD_SIZE = int(os.environ.get("EVAL_LEADERBOARD_SIZE", "20"))
+LEADERBOARD_INTERVAL = float(os.environ.get("EVAL_LEADERBOARD_INTERVAL", "30"))
+
+def write_csv_atomic(path, rows):
+    """
+    Write CSV rows to a temporary file and rename it over `path`, so a
+    reader never sees a half-written file.
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as csvfile:
+        csv.writer(csvfile).writerows(rows)
+    os.replace(tmp_path, path)
+
+class Leaderboard:
+    """
+    Bounded min-heap of the `size` best records seen so far, so ranking
+    memory stays O(size) however many records stream past. Ties keep the
+    earlier record, like the final stable sort does.
+
+    `on_flush(records)` receives the current top records, best first; it is
+    called by maybe_flush() when the top changed and `interval` seconds have
+    passed since the last write, and by flush().
+    """
+
+    def __init__(self, on_flush, size=LEADERBOARD_SIZE, interval=LEADERBOARD_INTERVAL, score_key="overall_score"):
+        self.on_flush = on_flush
+        self.size = size
+        self.interval = interval
+        self.score_key = score_key
+        self._heap = []
+        self._seen = 0
+        self._dirty = False
+        self._last_flush = None
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        score = record.get(self.score_key, 0) or 0
+        with self._lock:
+            # Later records sort lower on equal scores, so they are evicted first
+            entry = (score, -self._seen, record)
+            self._seen += 1
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+                self._dirty = True
+            elif entry[:2] > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, entry)
+                self._dirty = True
+
+    def maybe_flush(self):
+        with self._lock:
+            due = self._dirty and (
+                self._last_flush is None or time.monotonic() - self._last_flush >= self.interval
+            )
+        if due:
+            self.flush()
+
+    def top(self):
+        with self._lock:
+            return [record for _, _, record in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+    def flush(self):
+        records = self.top()
+        with self._lock:
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        self.on_flush(records)
@@ -0,0 +1,383 @@
+import os
+import abc
+import json
+import uuid
+import queue
+import threading
+from urllib.parse import urlparse
+
+# Which backend to use:
+#   "openai" -> the official OpenAI SDK on a pooled httpx client (default)
+#   "http"   -> a dependency-free OpenAI-compatible client on http.client
+# Point either one at another server (e.g. the local stand-in, standin_server.py) with
+#   export EVAL_BASE_URL=http://127.0.0.1:8900/v1
+BACKEND = os.environ.get("EVAL_BACKEND", "openai")
+BASE_URL = os.environ.get("EVAL_BASE_URL")
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# Shared HTTP connection pool: keep-alive connections reused across threads
+HTTP_POOL_SIZE = int(os.environ.get("EVAL_HTTP_POOL_SIZE", "16"))
+HTTP_TIMEOUT = float(os.environ.get("EVAL_HTTP_TIMEOUT", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("EVAL_HTTP_CONNECT_TIMEOUT", "10"))
+
+class ChatResult:
+    """
+    What every backend returns for one chat completion.
+    """
+
+    def __init__(self, text, prompt_tokens=None, completion_tokens=None, finish_reason=None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.finish_reason = finish_reason
+
+class ChatBackend(abc.ABC):
+    """
+    Interface for an LLM backend. Implementations send one chat-completion
+    request and return a ChatResult; errors are raised as exceptions that
+    rate_limiter.is_retryable() can classify (status_code / response.headers).
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    def complete(self, model, messages, **params):
+        """
+        Send one chat completion and return its ChatResult.
+        """
+
+    def complete_stream(self, model, messages, on_text, **params):
+        """
+        Stream one chat completion, passing each piece of text to
+        `on_text(piece)` as it arrives. When that returns True the stream is
+        closed, and the ChatResult holds the text so far, no usage and
+        finish_reason "closed". Backends without streaming send the request
+        as usual and pass the whole reply at once.
+        """
+        result = self.complete(model, messages, **params)
+        on_text(result.text)
+        return result
+
+    # Batch API (see batch_mode.py): batches are plain dicts in the API's
+    # JSON shape ("id", "status", "output_file_id", "request_counts", ...)
+
+    def upload_file(self, path, purpose="batch"):
+        """
+        Upload a file and return its file id.
+        """
+        raise NotImplementedError(f"The {self.name} backend does not support the Batch API")
+
+    def create_batch(self, input_file_id, endpoint, completion_window="24h"):
+        raise NotImplementedError(f"The {self.name} backend does not support the Batch API")
+
+    def get_batch(self, batch_id):
+        raise NotImplementedError(f"The {self.name} backend does not support the Batch API")
+
+    def file_content(self, file_id):
+        """
+        A file's content as text, e.g. a batch's JSONL output.
+        """
+        raise NotImplementedError(f"The {self.name} backend does not support the Batch API")
+
+    def close(self):
+        pass
+
+class OpenAIBackend(ChatBackend):
+    """
+    The official OpenAI SDK, on one shared httpx client with a bounded
+    keep-alive pool. The SDK's own retries are off: rate_limiter retries.
+    The SDK is imported on first use only.
+    """
+    name = "openai"
+
+    def __init__(self, api_key=None, base_url=None, pool_size=HTTP_POOL_SIZE,
+                 timeout=HTTP_TIMEOUT, connect_timeout=HTTP_CONNECT_TIMEOUT):
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                import httpx
+                from openai import OpenAI
+
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                    ),
+                    timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                )
+                self._client = OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    http_client=http_client,
+                    max_retries=0,
+                )
+            return self._client
+
+    def complete(self, model, messages, **params):
+        response = self._get_client().chat.completions.create(model=model, messages=messages, **params)
+        choice = response.choices[0]
+        usage = getattr(response, "usage", None)
+        return ChatResult(
+            choice.message.content or "",
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None),
+            choice.finish_reason,
+        )
+
+    def complete_stream(self, model, messages, on_text, **params):
+        stream = self._get_client().chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **params,
+        )
+        parts = []
+        usage = None
+        finish_reason = None
+        try:
+            for chunk in stream:
+                usage = chunk.usage or usage
+                for choice in chunk.choices:
+                    finish_reason = choice.finish_reason or finish_reason
+                    piece = choice.delta.content if choice.delta else None
+                    if piece:
+                        parts.append(piece)
+                        if on_text(piece):
+                            return ChatResult("".join(parts), finish_reason="closed")
+        finally:
+            stream.close()
+        return ChatResult(
+            "".join(parts),
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None),
+            finish_reason,
+        )
+
+    def upload_file(self, path, purpose="batch"):
+        with open(path, "rb") as f:
+            return self._get_client().files.create(file=f, purpose=purpose).id
+
+    def create_batch(self, input_file_id, endpoint, completion_window="24h"):
+        return self._get_client().batches.create(
+            input_file_id=input_file_id, endpoint=endpoint, completion_window=completion_window,
+        ).model_dump()
+
+    def get_batch(self, batch_id):
+        return self._get_client().batches.retrieve(batch_id).model_dump()
+
+    def file_content(self, file_id):
+        return self._get_client().files.content(file_id).text
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+class _ErrorResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+class HTTPStatusError(Exception):
+    """
+    Non-2xx reply from an OpenAI-compatible server. Carries status_code and
+    response.headers like the SDK's errors, so Retry-After is honoured.
+    """
+
+    def __init__(self, status_code, headers, body):
+        super().__init__(f"HTTP {status_code}: {body[:200]}")
+        self.status_code = status_code
+        self.response = _ErrorResponse(status_code, headers)
+        self.body = body
+
+class HTTPBackend(ChatBackend):
+    """
+    Minimal OpenAI-compatible client on the standard library, with a pool of
+    at most `pool_size` keep-alive connections shared by all threads.
+    Useful offline, for load tests against the stand-in server, or wherever
+    the SDK is not installed.
+    """
+    name = "http"
+
+    def __init__(self, api_key=None, base_url=None, pool_size=HTTP_POOL_SIZE,
+                 timeout=HTTP_TIMEOUT, connect_timeout=HTTP_CONNECT_TIMEOUT):
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY") or "none"
+        parsed = urlparse(base_url or DEFAULT_BASE_URL)
+        self.https = parsed.scheme == "https"
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if self.https else 80)
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        # http.client (and ssl) load on the first request, not at import
+        import http.client
+
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.timeout)
+        return conn
+
+    def request_json(self, method, path, payload=None):
+        """
+        Send one request over a pooled connection and return the decoded JSON body.
+        """
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        return json.loads(self.request(method, path, body))
+
+    def request(self, method, path, body=None, content_type="application/json", read=None):
+        """
+        Send one request over a pooled connection and return the raw body,
+        or for a successful reply whatever `read(response)` returns, e.g. a
+        streamed reply read as it arrives. A connection whose reply was not
+        read to the end is closed instead of going back to the pool.
+        """
+        import http.client
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": content_type,
+            "Connection": "keep-alive",
+        }
+
+        self._slots.acquire()
+        conn = None
+        reuse = False
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = read(response) if read is not None and response.status < 400 else response.read()
+            except http.client.HTTPException as e:
+                # Broken or stale keep-alive connection: a transport error, retryable
+                raise ConnectionError(f"{type(e).__name__}: {e}") from e
+            reuse = not response.will_close and response.isclosed()
+            if response.status >= 400:
+                raise HTTPStatusError(
+                    response.status,
+                    {k.lower(): v for k, v in response.getheaders()},
+                    data.decode("utf-8", "replace"),
+                )
+            return data
+        finally:
+            if conn is not None:
+                if reuse:
+                    self._idle.put(conn)
+                else:
+                    conn.close()
+            self._slots.release()
+
+    def complete(self, model, messages, **params):
+        payload = dict(params, model=model, messages=messages)
+        data = self.request_json("POST", "/chat/completions", payload)
+        choice = data["choices"][0]
+        usage = data.get("usage") or {}
+        return ChatResult(
+            choice["message"].get("content") or "",
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+            choice.get("finish_reason"),
+        )
+
+    def complete_stream(self, model, messages, on_text, **params):
+        payload = dict(params, model=model, messages=messages, stream=True, stream_options={"include_usage": True})
+
+        def read(response):
+            # Server-sent events: "data: {chunk}" lines, ending with "data: [DONE]"
+            parts = []
+            usage = {}
+            finish_reason = None
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                event = json.loads(data)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices") or []:
+                    finish_reason = choice.get("finish_reason") or finish_reason
+                    piece = (choice.get("delta") or {}).get("content")
+                    if piece:
+                        parts.append(piece)
+                        if on_text(piece):
+                            return ChatResult("".join(parts), finish_reason="closed")
+            # Read the end of the body, so the connection can be reused
+            response.read()
+            return ChatResult("".join(parts), usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                              finish_reason)
+
+        return self.request("POST", "/chat/completions", json.dumps(payload).encode("utf-8"), read=read)
+
+    def upload_file(self, path, purpose="batch"):
+        # multipart/form-data by hand: a "purpose" field and the file itself
+        boundary = uuid.uuid4().hex
+        with open(path, "rb") as f:
+            content = f.read()
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"purpose\"\r\n\r\n{purpose}\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+            f"filename=\"{os.path.basename(path)}\"\r\nContent-Type: application/jsonl\r\n\r\n"
+        ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        data = self.request("POST", "/files", body, f"multipart/form-data; boundary={boundary}")
+        return json.loads(data)["id"]
+
+    def create_batch(self, input_file_id, endpoint, completion_window="24h"):
+        return self.request_json("POST", "/batches", {
+            "input_file_id": input_file_id,
+            "endpoint": endpoint,
+            "completion_window": completion_window,
+        })
+
+    def get_batch(self, batch_id):
+        return self.request_json("GET", f"/batches/{batch_id}")
+
+    def file_content(self, file_id):
+        return self.request("GET", f"/files/{file_id}/content").decode("utf-8")
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "http": HTTPBackend,
+}
+
+def register_backend(name, factory):
+    """
+    Plug in another backend: `factory(api_key=..., base_url=...)` must
+    return a ChatBackend. Select it with EVAL_BACKEND=<name>.
+    """
+    BACKENDS[name] = factory
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend(api_key=None):
+    """
+    The process-wide backend, built on first use from EVAL_BACKEND and
+    EVAL_BASE_URL, so every script and thread shares one connection pool.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown EVAL_BACKEND '{BACKEND}', expected one of {sorted(BACKENDS)}")
+            _backend = BACKENDS[BACKEND](api_key=api_key, base_url=BASE_URL)
+        return _backend
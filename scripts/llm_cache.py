@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Where the cache lives and how big it may grow before the least recently
+# used entries are evicted.
+# Override with: export EVAL_CACHE_PATH=... / export EVAL_CACHE_MAX_MB=500
+CACHE_PATH = os.environ.get("EVAL_CACHE_PATH", ".cache/llm_cache.sqlite")
+CACHE_MAX_BYTES = int(float(os.environ.get("EVAL_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+# "on"      -> read and write the cache (default)
+# "refresh" -> ignore cached entries but store the fresh replies
+# "off"     -> bypass the cache completely
+CACHE_MODE = os.environ.get("EVAL_CACHE", "on").lower()
+
+def make_key(model, prompt_text, params=None):
+    """
+    Content-addressed key: a SHA-256 over the model, the fully rendered prompt
+    and the sampling parameters. Any change to one of them is a cache miss.
+    """
+    payload = json.dumps(
+        {"model": model, "prompt": prompt_text, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    Small on-disk key/value store for LLM replies, backed by SQLite so that
+    concurrent threads (and processes) can share it safely.
+    Entries are evicted least-recently-used first once the total size of the
+    stored replies goes above `max_bytes`.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, mode=CACHE_MODE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """
+        Returns the cached reply for `key`, or None on a miss.
+        Always a miss in "refresh" and "off" mode.
+        """
+        if self.mode != "on":
+            self.misses += 1
+            return None
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def contains(self, key):
+        """
+        Whether `key` is cached, without counting a hit or miss or touching
+        its last access (e.g. to plan a batch of requests ahead of a run).
+        """
+        if self.mode != "on":
+            return False
+        with self._lock:
+            conn = self._connect()
+            return conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, value):
+        """
+        Stores a reply and evicts the least recently used entries if needed.
+        """
+        if self.mode == "off":
+            return
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self.writes += 1
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Hit/miss counters for the current run.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"LLM cache ({s['mode']}): {s['hits']} hits, {s['misses']} misses, "
+                f"{s['writes']} writes, {s['evictions']} evictions, hit rate {s['hit_rate']:.0%}")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """
+    Process-wide cache instance shared by every script and thread.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
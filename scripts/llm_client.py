@@ -0,0 +1,155 @@
+import os
+import time
+
+from json_stream import JsonStreamWatcher, validator_for
+from llm_cache import get_cache, make_key
+from profiling import stage
+from rate_limiter import call_with_retries
+from telemetry import get_telemetry
+from token_count import estimate_tokens
+
+# Streaming: replies that are parsed are streamed, and the stream is closed as
+# soon as it holds a complete, valid JSON value (so trailing prose is never
+# generated or billed), or given up on once it clearly won't hold one, in
+# which case the request is sent again without streaming.
+# Enable with: export EVAL_STREAM=on
+STREAM_ENABLED = os.environ.get("EVAL_STREAM", "off").lower() == "on"
+
+def _request_params(temperature, max_tokens):
+    params = {"temperature": temperature}
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    return params
+
+def _cache_key(model, prompt_text, params, history):
+    # Follow-up turns are keyed on the whole conversation, not just the last message
+    return make_key(model, prompt_text, dict(params, history=history) if history else params)
+
+def chat_completion(client, model, prompt_text, temperature=0.0, parse=None, max_tokens=None,
+                    persona=None, submission_id=None, history=None, stream=None, stream_max_tokens=None):
+    """
+    Single entry point for every chat-completion call in the scripts.
+    `client` is an llm_backend.ChatBackend (see get_backend()).
+
+    The reply is looked up in the on-disk cache first (keyed by model, prompt
+    and sampling parameters) and only sent to the API on a miss, under the
+    shared per-model rate limiter which retries rate limits and transport errors.
+    If `parse` is given (e.g. json.loads) the parsed reply is returned, and a
+    reply is only cached once it parses, so a bad reply is never replayed.
+    `max_tokens` caps the length of the reply when given.
+    `history` is an optional list of earlier {"role", "content"} messages sent
+    before `prompt_text`, for follow-up turns (see structured_output.py).
+    With `parse` and streaming on (`stream`, default EVAL_STREAM) the reply
+    is streamed and checked as it arrives (see json_stream.py), and
+    `stream_max_tokens` caps it when `max_tokens` isn't given. A stream given
+    up on is sent again as a normal request, without the cap. Neither is
+    part of the cache key: only replies that parse are cached either way.
+    Exceptions from the API or from `parse` propagate to the caller.
+
+    Every call is recorded by telemetry (tokens, latency, retries, outcome,
+    cost), tagged with `persona` and `submission_id`.
+    """
+    params = _request_params(temperature, max_tokens)
+    messages = list(history or []) + [{"role": "user", "content": prompt_text}]
+    request_text = "\n".join(message["content"] for message in messages)
+
+    cache = get_cache()
+    key = _cache_key(model, prompt_text, params, history)
+
+    telemetry = get_telemetry()
+    started = time.perf_counter()
+
+    with stage("cache"):
+        ai_text = cache.get(key)
+    if ai_text is not None:
+        try:
+            with stage("parse_reply"):
+                result = parse(ai_text) if parse else ai_text
+        except Exception:
+            telemetry.record(model, persona, submission_id, 0, 0, time.perf_counter() - started, 0, "parse_error")
+            raise
+        telemetry.record(model, persona, submission_id, 0, 0, time.perf_counter() - started, 0, "cache_hit")
+        return result
+
+    streaming = parse is not None and (STREAM_ENABLED if stream is None else stream)
+    send_params = params
+    if streaming and max_tokens is None and stream_max_tokens is not None:
+        send_params = dict(params, max_tokens=stream_max_tokens)
+    watchers = []
+
+    def send():
+        if not streaming:
+            return client.complete(model, messages, **send_params)
+        # A fresh watcher for every attempt, retries included
+        watchers.append(JsonStreamWatcher(validator_for(parse)))
+        return client.complete_stream(model, messages, lambda piece: watchers[-1].feed(piece) != "more",
+                                      **send_params)
+
+    stats = {"retries": 0}
+    try:
+        with stage("api_call"):
+            response = call_with_retries(
+                send,
+                model,
+                request_text,
+                stats,
+                send_params.get("max_tokens"),
+            )
+            latency = time.perf_counter() - started
+            if streaming:
+                telemetry.count("stream_replies")
+                if response.finish_reason == "closed":
+                    telemetry.count("stream_completed_early" if watchers[-1].state == "complete" else "stream_aborted")
+                elif response.finish_reason == "length":
+                    telemetry.count("stream_capped")
+            if streaming and response.finish_reason == "closed" and watchers[-1].state == "abort":
+                # Given up on: bill what arrived, then send the request again the
+                # normal way, so a long preamble costs a second call, not the result
+                telemetry.record(model, persona, submission_id, estimate_tokens(request_text, model),
+                                 estimate_tokens(response.text, model), latency, stats["retries"], "stream_aborted")
+                streaming = False
+                send_params = params
+                started = time.perf_counter()
+                stats = {"retries": 0}
+                response = call_with_retries(send, model, request_text, stats, send_params.get("max_tokens"))
+                latency = time.perf_counter() - started
+    except Exception:
+        telemetry.record(model, persona, submission_id, estimate_tokens(request_text, model), 0,
+                         time.perf_counter() - started, stats["retries"], "api_error")
+        raise
+
+    ai_text = response.text.strip()
+    # Backends that do not report usage get an estimate
+    prompt_tokens = response.prompt_tokens
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(request_text, model)
+    completion_tokens = response.completion_tokens
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(ai_text, model)
+
+    try:
+        with stage("parse_reply"):
+            result = parse(ai_text) if parse else ai_text
+    except Exception:
+        telemetry.record(model, persona, submission_id, prompt_tokens, completion_tokens,
+                         latency, stats["retries"], "parse_error")
+        raise
+    telemetry.record(model, persona, submission_id, prompt_tokens, completion_tokens,
+                     latency, stats["retries"], "ok")
+    with stage("cache"):
+        cache.put(key, ai_text)
+    return result
+
+def request_key(model, prompt_text, temperature=0.0, max_tokens=None):
+    """
+    The cache key chat_completion uses for a single-turn request, e.g. to
+    fill the cache ahead of a run (see batch_mode.py).
+    """
+    return _cache_key(model, prompt_text, _request_params(temperature, max_tokens), None)
+
+def remember(model, prompt_text, text, temperature=0.0, max_tokens=None):
+    """
+    Cache `text` as the reply to `prompt_text`, e.g. a reply completed by a
+    follow-up turn, so the next run replays it without any call.
+    """
+    get_cache().put(request_key(model, prompt_text, temperature, max_tokens), text)
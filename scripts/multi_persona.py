@@ -0,0 +1,48 @@
+import os
+
+from llm_client import chat_completion
+from structured_output import extract_json, normalize, schema_max_tokens, schema_problems
+
+# Ask for every persona in one request instead of one request per persona.
+# Enable with --multi-persona on the scripts, or: export EVAL_MULTI_PERSONA=1
+MULTI_PERSONA_MODE = os.environ.get("EVAL_MULTI_PERSONA", "0") == "1"
+
+def is_valid_evaluation(evaluation, score_keys, list_keys=("open_questions",)):
+    """
+    Per-persona validation: every score key present as a number in 1-5,
+    a text summary, and the list fields (if present) actually lists.
+    """
+    return isinstance(evaluation, dict) and not schema_problems(evaluation, score_keys, list_keys)
+
+def get_multi_persona_evaluation(client, model, prompt_text, score_keys_by_persona, list_keys=("open_questions",),
+                                 submission_id=None):
+    """
+    Send one prompt that carries the shared submission content once and asks
+    for every persona's evaluation as a JSON object keyed by persona.
+
+    Returns {persona: evaluation} for the personas whose evaluation validated.
+    Personas that are missing or invalid are left out so the caller can fall
+    back to a per-persona call for just those.
+    """
+    try:
+        reply = chat_completion(client, model, prompt_text, temperature=0.0, parse=extract_json,
+                                persona="panel", submission_id=submission_id,
+                                stream_max_tokens=sum(schema_max_tokens(score_keys, list_keys)
+                                                      for score_keys in score_keys_by_persona.values()))
+    except Exception as e:
+        print(f"Error in multi-persona call, falling back to per-persona calls: {e}")
+        return {}
+
+    if not isinstance(reply, dict):
+        return {}
+
+    valid = {}
+    for persona, score_keys in score_keys_by_persona.items():
+        evaluation = normalize(reply.get(persona), score_keys, list_keys)
+        if is_valid_evaluation(evaluation, score_keys, list_keys):
+            valid[persona] = evaluation
+
+    missing = [persona for persona in score_keys_by_persona if persona not in valid]
+    if missing:
+        print(f"Multi-persona reply missing or invalid for {', '.join(missing)}; calling them separately")
+    return valid
@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+# Stage-level profiling of the local pipeline, i.e. everything around the API
+# calls: loading the input, rendering prompts, cache lookups, parsing replies,
+# ranking and writing the outputs. With --profile each stage is timed, stages
+# on the main thread get tracemalloc figures, and the stacks of every thread
+# inside a stage are sampled into a collapsed-stack file for flame graphs.
+#
+#   python scripts/aquarium_evaluation.py --profile
+#   python scripts/aquarium_evaluation.py --profile --profile-cprofile
+#   flamegraph.pl profile/stacks.collapsed > profile/flamegraph.svg   # or load it in speedscope
+#
+# Written to EVAL_PROFILE_DIR (default profile/):
+#   stages.txt, stages.json  per stage: calls, wall time, memory allocated and peak
+#   stacks.collapsed         "stage;stage;file:function;... samples" per line
+#   cprofile.pstats/.txt     with --profile-cprofile (main thread only)
+PROFILE_MODE = os.environ.get("EVAL_PROFILE", "0") == "1"
+PROFILE_DIR = os.environ.get("EVAL_PROFILE_DIR", "profile")
+PROFILE_CPROFILE = os.environ.get("EVAL_PROFILE_CPROFILE", "0") == "1"
+# tracemalloc slows every allocation down; turn it off for timings closer to a normal run
+PROFILE_MEMORY = os.environ.get("EVAL_PROFILE_MEMORY", "1") == "1"
+PROFILE_INTERVAL_MS = float(os.environ.get("EVAL_PROFILE_INTERVAL_MS", "5"))
+
+MIB = 1024 * 1024
+
+class Profiler:
+    """
+    Per-stage timings for one run. Stages may nest (an inner stage's time is
+    also counted in the outer one) and may be opened from worker threads,
+    where they run concurrently: their times add up across threads and they
+    get no memory figures. Memory figures are process-wide, so they include
+    what worker threads allocate while a main-thread stage runs.
+    """
+
+    def __init__(self, folder=PROFILE_DIR, memory=PROFILE_MEMORY, cprofile=False, interval_ms=PROFILE_INTERVAL_MS):
+        self.folder = folder
+        self.memory = memory
+        self.interval = interval_ms / 1000.0
+        self.stages = {}
+        self.stacks = {}
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Thread id -> that thread's open stages, read by the sampler
+        self._open = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self._cprofile = None
+        self._started = None
+        if cprofile:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+
+    def start(self):
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._sampler.start()
+        if self._cprofile:
+            self._cprofile.enable()
+
+    def _frames(self):
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = self._local.frames = []
+            self._open[threading.get_ident()] = frames
+        return frames
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        frames = self._frames()
+        on_main = threading.current_thread() is threading.main_thread()
+        frame = {"name": name, "child_peak": 0}
+        if on_main and self.memory:
+            import tracemalloc
+            frame["start"], frame["peak_before"] = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        frames.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            frames.pop()
+            allocated = peak = None
+            if "start" in frame:
+                import tracemalloc
+                current, stage_peak = tracemalloc.get_traced_memory()
+                stage_peak = max(stage_peak, frame["child_peak"])
+                allocated = current - frame["start"]
+                peak = stage_peak - frame["start"]
+                # reset_peak() above forgot the outer stage's peak so far; hand it back
+                if frames:
+                    frames[-1]["child_peak"] = max(frames[-1]["child_peak"], frame["peak_before"], stage_peak)
+            self._add(name, elapsed, on_main, allocated, peak)
+
+    def iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def _add(self, name, elapsed, on_main, allocated, peak):
+        thread = "main" if on_main else "workers"
+        with self._lock:
+            entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "thread": thread,
+                                                  "allocated_bytes": None, "peak_bytes": None})
+            entry["calls"] += 1
+            entry["seconds"] += elapsed
+            if entry["thread"] != thread:
+                entry["thread"] = "both"
+            if allocated is not None:
+                entry["allocated_bytes"] = (entry["allocated_bytes"] or 0) + allocated
+                entry["peak_bytes"] = max(entry["peak_bytes"] or 0, peak)
+
+    def _sample(self):
+        # The main thread is always sampled; worker threads only inside a stage, so
+        # idle pool threads don't drown the profile. Worker stacks hang under the
+        # main thread's current stages, which is what they are working for.
+        me = threading.get_ident()
+        main = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            main_stages = [frame["name"] for frame in list(self._open.get(main, ()))]
+            counts = {}
+            for ident, top in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stages = [frame["name"] for frame in list(self._open.get(ident, ()))]
+                if ident != main:
+                    if not stages:
+                        continue
+                    stages = main_stages + stages
+                calls = []
+                while top is not None:
+                    code = top.f_code
+                    calls.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    top = top.f_back
+                key = ";".join(stages + calls[::-1]) if stages else ";".join(["(no stage)"] + calls[::-1])
+                counts[key] = counts.get(key, 0) + 1
+            with self._lock:
+                self.samples += 1
+                for key, n in counts.items():
+                    self.stacks[key] = self.stacks.get(key, 0) + n
+
+    def stop(self):
+        if self._cprofile:
+            self._cprofile.disable()
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        wall = time.perf_counter() - self._started
+        if self.memory:
+            import tracemalloc
+            tracemalloc.stop()
+        return wall
+
+    def breakdown(self, wall):
+        """
+        The stage table: calls, total and mean time, share of the run's wall
+        time, and memory allocated and peak for main-thread stages.
+        """
+        lines = [f"{'stage':<18} {'thread':<8} {'calls':>8} {'total s':>9} {'% wall':>7} {'mean ms':>9} "
+                 f"{'alloc MiB':>9} {'peak MiB':>9}"]
+        for name, entry in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"]):
+            allocated = f"{entry['allocated_bytes'] / MIB:>9.1f}" if entry["allocated_bytes"] is not None else f"{'-':>9}"
+            peak = f"{entry['peak_bytes'] / MIB:>9.1f}" if entry["peak_bytes"] is not None else f"{'-':>9}"
+            lines.append(f"{name[:18]:<18} {entry['thread']:<8} {entry['calls']:>8} {entry['seconds']:>9.3f} "
+                         f"{100.0 * entry['seconds'] / wall if wall else 0.0:>7.1f} "
+                         f"{1000.0 * entry['seconds'] / entry['calls']:>9.3f} {allocated} {peak}")
+        lines.append(f"Run: {wall:.2f}s wall, {self.samples} stack samples every {self.interval * 1000:.0f}ms "
+                     f"(worker stages overlap, so their totals can exceed the wall time)")
+        return "\n".join(lines)
+
+    def write(self, wall):
+        """
+        Write stages.txt, stages.json, stacks.collapsed and the cProfile
+        output into the profile folder, and return the stage table.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        table = self.breakdown(wall)
+        with open(os.path.join(self.folder, "stages.txt"), "w", encoding="utf-8") as out:
+            out.write(table + "\n")
+        with open(os.path.join(self.folder, "stages.json"), "w", encoding="utf-8") as out:
+            json.dump({"wall_seconds": round(wall, 3), "samples": self.samples,
+                       "interval_ms": self.interval * 1000, "stages": self.stages}, out, indent=2)
+        with open(os.path.join(self.folder, "stacks.collapsed"), "w", encoding="utf-8") as out:
+            for key, count in sorted(self.stacks.items()):
+                out.write(f"{key} {count}\n")
+        if self._cprofile:
+            import pstats
+            self._cprofile.dump_stats(os.path.join(self.folder, "cprofile.pstats"))
+            with open(os.path.join(self.folder, "cprofile.txt"), "w", encoding="utf-8") as out:
+                pstats.Stats(self._cprofile, stream=out).sort_stats("cumulative").print_stats(40)
+        return table
+
+_profiler = None
+_NO_STAGE = contextlib.nullcontext()
+
+def stage(name):
+    """
+    Context manager timing one pipeline stage while profiling; a shared
+    no-op otherwise, so the hooks cost nothing in a normal run.
+    """
+    profiler = _profiler
+    if profiler is None:
+        return _NO_STAGE
+    return profiler.stage(name)
+
+def profiled(name, iterable):
+    """
+    `iterable`, with the time spent producing each item counted as stage
+    `name` (e.g. reading and decoding a streamed input file).
+    """
+    if _profiler is None:
+        return iterable
+    return _profiler.iterate(name, iterable)
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", action="store_true", default=PROFILE_MODE,
+                        help=f"time each pipeline stage and sample stacks into {PROFILE_DIR}/")
+    parser.add_argument("--profile-cprofile", action="store_true", default=PROFILE_CPROFILE,
+                        help="with --profile, also run cProfile on the main thread")
+
+def start_profiling(args):
+    """
+    Start the process-wide profiler when --profile is on. Returns it, or None.
+    """
+    global _profiler
+    if not args.profile:
+        return None
+    _profiler = Profiler(cprofile=args.profile_cprofile)
+    _profiler.start()
+    return _profiler
+
+def finish_profiling():
+    """
+    Stop the profiler, write its files and print the stage breakdown.
+    """
+    global _profiler
+    profiler = _profiler
+    if profiler is None:
+        return
+    _profiler = None
+    wall = profiler.stop()
+    print(profiler.write(wall))
+    print(f"Profile written to {profiler.folder}/ (stages.txt, stages.json, stacks.collapsed"
+          + (", cprofile.pstats)" if profiler._cprofile else ")"))
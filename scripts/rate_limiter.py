@@ -0,0 +1,182 @@
+import os
+import time
+import random
+import threading
+
+from token_count import estimate_tokens
+
+# Requests-per-minute and tokens-per-minute budgets per model.
+# Set these to your account's limits, or override every model at once with:
+#   export EVAL_RPM=500  /  export EVAL_TPM=40000
+RATE_LIMITS = {
+    "gpt-4": {"rpm": 5000, "tpm": 40000},
+    "gpt-4o": {"rpm": 5000, "tpm": 450000},
+    "gpt-4o-mini": {"rpm": 5000, "tpm": 2000000},
+    "gpt-3.5-turbo": {"rpm": 3500, "tpm": 2000000},
+}
+DEFAULT_LIMITS = {"rpm": 3500, "tpm": 40000}
+
+# Tokens we reserve for the reply on top of the prompt estimate, when the
+# request sets no max_tokens of its own
+COMPLETION_TOKENS_ESTIMATE = 400
+
+# Retry policy for rate-limit and transport errors
+MAX_RETRIES = int(os.environ.get("EVAL_MAX_RETRIES", "6"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+# Transport errors raised by the OpenAI SDK (matched by name so the SDK stays optional here)
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` units and refills at
+    `capacity` units per minute. acquire() blocks until enough units are free.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        # A single request bigger than the whole budget still has to go through
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = max(self.paused_until - now, (amount - self.available) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Stop handing out units for `seconds` (e.g. after a 429 with Retry-After).
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class ModelLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets for one model.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, token_count):
+        self.requests.acquire(1)
+        self.tokens.acquire(token_count)
+
+    def pause(self, seconds):
+        self.requests.pause(seconds)
+        self.tokens.pause(seconds)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(model):
+    """
+    One shared limiter per model for the whole process.
+    """
+    with _limiters_lock:
+        if model not in _limiters:
+            limits = dict(RATE_LIMITS.get(model, DEFAULT_LIMITS))
+            if os.environ.get("EVAL_RPM"):
+                limits["rpm"] = int(os.environ["EVAL_RPM"])
+            if os.environ.get("EVAL_TPM"):
+                limits["tpm"] = int(os.environ["EVAL_TPM"])
+            _limiters[model] = ModelLimiter(limits["rpm"], limits["tpm"])
+        return _limiters[model]
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+def is_retryable(error):
+    """
+    True for rate limits, timeouts, dropped connections and 5xx responses.
+    Anything else (bad request, auth, a reply that is not valid JSON) is a
+    genuine failure and retrying it would only burn money.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+def retry_after_seconds(error):
+    """
+    Read the server's Retry-After hint (seconds or milliseconds), if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue
+    return None
+
+def backoff_seconds(attempt):
+    """
+    Exponential backoff with full jitter: uniform(0, base * 2^attempt), capped.
+    """
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def call_with_retries(call, model, prompt_text, stats=None, max_tokens=None):
+    """
+    Run `call()` under the model's rate limits, reserving the prompt's tokens
+    plus `max_tokens` for the reply (COMPLETION_TOKENS_ESTIMATE when the
+    request has no cap). Retryable errors are retried
+    up to MAX_RETRIES times, honouring Retry-After and otherwise backing off
+    exponentially with jitter. Non-retryable errors are raised immediately,
+    and the last error is raised once the retries are used up.
+    If `stats` (a dict) is given, stats["retries"] is set to the number of retries made.
+    """
+    limiter = get_limiter(model)
+    completion_tokens = COMPLETION_TOKENS_ESTIMATE if max_tokens is None else max_tokens
+    token_count = estimate_tokens(prompt_text, model) + completion_tokens
+
+    attempt = 0
+    while True:
+        if stats is not None:
+            stats["retries"] = attempt
+        limiter.acquire(token_count)
+        try:
+            return call()
+        except Exception as e:
+            if not is_retryable(e) or attempt >= MAX_RETRIES:
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = backoff_seconds(attempt)
+            if _status_code(e) == 429 or type(e).__name__ == "RateLimitError":
+                # Slow every thread on this model down, not just this one
+                limiter.pause(delay)
+            print(f"Retryable error from {model} ({type(e).__name__}), "
+                  f"retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
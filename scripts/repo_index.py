@@ -0,0 +1,259 @@
+import os
+import re
+import json
+import math
+import hashlib
+import argparse
+import threading
+import subprocess
+
+from token_count import estimate_tokens
+
+# Code review context from a team's repository: the source files of a local
+# checkout are split into chunks of a few dozen lines and indexed with BM25
+# once, and each review role gets the chunks most relevant to its focus
+# points, up to a token budget. The index is saved per commit, so reruns
+# (and every role) reuse it without reading the repository again.
+#
+#   python scripts/repo_index.py path/to/checkout --query "smart contract gas reentrancy"
+REPO_INDEX_DIR = os.environ.get("EVAL_REPO_INDEX_DIR", ".cache/repo_index")
+# Tokens per indexed chunk, and per role for the retrieved chunks
+REPO_CHUNK_TOKENS = int(os.environ.get("EVAL_REPO_CHUNK_TOKENS", "300"))
+REPO_CONTEXT_TOKENS = int(os.environ.get("EVAL_REPO_CONTEXT_TOKENS", "2500"))
+REPO_MAX_FILE_BYTES = int(os.environ.get("EVAL_REPO_MAX_FILE_KB", "512")) * 1024
+
+# Bump when the chunking or tokenization changes, so old indexes are rebuilt
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SOURCE_EXTENSIONS = {
+    ".py", ".ipynb", ".js", ".jsx", ".ts", ".tsx", ".mjs", ".vue", ".svelte", ".sol", ".vy", ".rs",
+    ".go", ".java", ".kt", ".swift", ".c", ".h", ".cpp", ".hpp", ".cs", ".rb", ".php", ".move",
+    ".cairo", ".sh", ".sql", ".toml", ".yaml", ".yml", ".json", ".md", ".html", ".css", ".scss",
+}
+SKIP_DIRS = {
+    ".git", "node_modules", "vendor", "dist", "build", "out", "target", "coverage", "__pycache__",
+    ".venv", "venv", "env", ".next", ".cache", "artifacts", "cache", "typechain-types",
+}
+SKIP_FILES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "Cargo.lock", "poetry.lock"}
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+def tokenize(text):
+    """
+    Lowercased terms for BM25: words and identifiers, with camelCase and
+    snake_case identifiers also split into their parts ("safeTransferFrom"
+    -> safetransferfrom, safe, transfer, from).
+    """
+    terms = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        if len(lower) > 1:
+            terms.append(lower)
+        parts = _CAMEL_RE.findall(word)
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts if len(part) > 1)
+    return terms
+
+def iter_source_files(root):
+    """
+    Relative paths of the files worth indexing under `root`, in a stable
+    order: source and config files, skipping dependency and build folders,
+    lock files, large files and binaries.
+    """
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+        for name in sorted(files):
+            if name in SKIP_FILES or os.path.splitext(name)[1].lower() not in SOURCE_EXTENSIONS:
+                continue
+            path = os.path.join(folder, name)
+            try:
+                if os.path.getsize(path) > REPO_MAX_FILE_BYTES:
+                    continue
+            except OSError:
+                continue
+            yield os.path.relpath(path, root)
+
+def _read_text(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+def chunk_lines(text, max_tokens=REPO_CHUNK_TOKENS):
+    """
+    Split a file into (first line, last line, text) chunks of at most about
+    `max_tokens` tokens, on line boundaries (line numbers start at 1).
+    """
+    chunks = []
+    current, current_tokens, start = [], 0, 1
+    for number, line in enumerate(text.splitlines(keepends=True), start=1):
+        line_tokens = estimate_tokens(line)
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append((start, number - 1, "".join(current)))
+            current, current_tokens, start = [], 0, number
+        current.append(line)
+        current_tokens += line_tokens
+    if current and "".join(current).strip():
+        chunks.append((start, start + len(current) - 1, "".join(current)))
+    return chunks
+
+def _git(root, *args):
+    try:
+        result = subprocess.run(["git", "-C", root] + list(args), capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def repo_revision(root):
+    """
+    What the index is saved under: the checkout's commit hash, or, for a
+    working tree with local changes or no git at all, a fingerprint of the
+    files' paths, sizes and modification times.
+    """
+    commit = _git(root, "rev-parse", "HEAD")
+    if commit and _git(root, "status", "--porcelain") == "":
+        return commit
+    fingerprint = hashlib.sha256()
+    for rel_path in iter_source_files(root):
+        stat = os.stat(os.path.join(root, rel_path))
+        fingerprint.update(f"{rel_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return f"{commit or 'nogit'}-{fingerprint.hexdigest()[:16]}"
+
+class RepoIndex:
+    """
+    BM25 index over the chunks of one repository checkout.
+    `chunks` holds {"path", "start", "end", "text", "tokens"} dicts, and
+    `terms` each chunk's {term: count}.
+    """
+
+    def __init__(self, chunks, terms):
+        self.chunks = chunks
+        self.terms = terms
+        self.lengths = [sum(counts.values()) for counts in terms]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.postings = {}
+        for i, counts in enumerate(terms):
+            for term, count in counts.items():
+                self.postings.setdefault(term, []).append((i, count))
+
+    @classmethod
+    def build(cls, root):
+        chunks, terms = [], []
+        for rel_path in iter_source_files(root):
+            text = _read_text(os.path.join(root, rel_path))
+            if not text:
+                continue
+            for start, end, chunk_text in chunk_lines(text):
+                counts = {}
+                # The file path is part of every chunk, so "contracts/Vault.sol" matches "vault"
+                for term in tokenize(rel_path) + tokenize(chunk_text):
+                    counts[term] = counts.get(term, 0) + 1
+                chunks.append({"path": rel_path.replace(os.sep, "/"), "start": start, "end": end,
+                               "text": chunk_text, "tokens": estimate_tokens(chunk_text)})
+                terms.append(counts)
+        return cls(chunks, terms)
+
+    def save(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            json.dump({"version": INDEX_VERSION, "chunks": self.chunks, "terms": self.terms}, out)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["chunks"], data["terms"])
+
+    def search(self, query, k=None):
+        """
+        The chunks ranked by BM25 score for `query`, best first, as
+        (score, chunk index) pairs; chunks sharing no term are left out.
+        """
+        n = len(self.chunks)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, count in postings:
+                norm = count + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / self.average_length)
+                scores[i] = scores.get(i, 0.0) + idf * count * (BM25_K1 + 1) / norm
+        ranked = sorted(((score, i) for i, score in scores.items()), key=lambda item: (-item[0], item[1]))
+        return ranked[:k] if k else ranked
+
+    def select(self, query, token_budget=REPO_CONTEXT_TOKENS):
+        """
+        The best-matching chunks for `query` that fit in `token_budget`
+        tokens together, in ranking order.
+        """
+        selected = []
+        used = 0
+        for _, i in self.search(query):
+            chunk = self.chunks[i]
+            if used + chunk["tokens"] > token_budget:
+                continue
+            selected.append(chunk)
+            used += chunk["tokens"]
+            if token_budget - used < 50:
+                break
+        return selected
+
+def render_chunks(chunks):
+    """
+    Retrieved chunks as prompt text, each headed by its file and lines.
+    """
+    return "\n\n".join(
+        f"--- {chunk['path']} (lines {chunk['start']}-{chunk['end']}) ---\n{chunk['text'].rstrip()}"
+        for chunk in chunks
+    )
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_repo_index(root):
+    """
+    The index for a checkout, built on first use and saved under
+    REPO_INDEX_DIR keyed by its revision; later runs load it instead.
+    Shared by all threads of a run, and looked up once per run.
+    """
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            revision = repo_revision(root)
+            key = hashlib.sha256(f"{root}\0{revision}\0{INDEX_VERSION}\0{REPO_CHUNK_TOKENS}".encode("utf-8"))
+            path = os.path.join(REPO_INDEX_DIR, f"{key.hexdigest()}.json")
+            if os.path.exists(path):
+                _indexes[root] = RepoIndex.load(path)
+            else:
+                index = RepoIndex.build(root)
+                index.save(path)
+                print(f"Indexed {len(index.chunks)} chunks of {root} at {revision[:12]}")
+                _indexes[root] = index
+        return _indexes[root]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index a repository checkout and show what a query retrieves.")
+    parser.add_argument("repo", help="path to a local checkout")
+    parser.add_argument("--query", help="show the chunks retrieved for this query")
+    parser.add_argument("--budget", type=int, default=REPO_CONTEXT_TOKENS, help="token budget for --query")
+    args = parser.parse_args(argv)
+
+    index = get_repo_index(args.repo)
+    files = len({chunk["path"] for chunk in index.chunks})
+    print(f"{args.repo}: {len(index.chunks)} chunks from {files} files, revision {repo_revision(os.path.abspath(args.repo))}")
+    if args.query:
+        chunks = index.select(args.query, args.budget)
+        print(f"{len(chunks)} chunks, {sum(chunk['tokens'] for chunk in chunks)} tokens:\n")
+        print(render_chunks(chunks))
+
+if __name__ == "__main__":
+    main()
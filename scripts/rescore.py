@@ -0,0 +1,234 @@
+import os
+import csv
+import json
+import argparse
+
+import numpy as np
+
+from jsonl_io import JsonlWriter, iter_records, rank_jsonl, write_ranked_json
+
+# Offline rescoring: recompute every weighted score from the raw criterion
+# scores already stored in a run's results file, with new weights and no API
+# calls. Several weight schemes can be compared side by side, and one of them
+# applied to rewrite the run's outputs.
+#
+#   python scripts/rescore.py aquarium --weights weights.json
+#   python scripts/rescore.py aquarium --weights weights.json --apply tech_heavy
+#
+# weights.json maps scheme names to weights, e.g.
+#   {"tech_heavy": {"feasibility_and_technical_strength": 0.4, "innovative_potential": 0.3, ...}}
+# The weights the script currently uses are always compared as "current".
+
+def _aquarium_target():
+    from aquarium_evaluation import AGENTS, WEIGHTS
+
+    criteria = list(WEIGHTS)
+    return {
+        "results": "aquariumdataout/questions1_7/results.jsonl",
+        "agents": [agent["agent_name"] for agent in AGENTS],
+        "criteria": criteria,
+        # Weight keys are the criterion keys themselves
+        "weight_keys": criteria,
+        "weights": dict(WEIGHTS),
+    }
+
+def _pitch_target():
+    from sub_evaluation import SCORE_KEYS, WEIGHTS
+
+    return {
+        "results": "dataout/evaluate_submissions.jsonl",
+        "agents": ["ai_evaluation"],
+        "criteria": list(SCORE_KEYS),
+        # "short_pitch" weighs "short_pitch_score", and so on
+        "weight_keys": [key[:-len("_score")] for key in SCORE_KEYS],
+        "weights": dict(WEIGHTS),
+    }
+
+TARGETS = {
+    "aquarium": _aquarium_target,
+    "pitch": _pitch_target,
+}
+
+def agent_evaluations(record, target):
+    """
+    {agent name: raw evaluation or None} for one results record.
+    """
+    if "agent_evaluations" in record:
+        return {
+            ae.get("agent_name"): (None if ae.get("error") or ae.get("skipped") else ae)
+            for ae in record["agent_evaluations"]
+        }
+    return {target["agents"][0]: record.get("ai_evaluation") or None}
+
+def load_score_tensor(results_file, target):
+    """
+    Read the raw criterion scores of a run into a (submission x agent x
+    criterion) array. `valid` marks the (submission, agent) pairs that have an
+    evaluation; missing criteria count as 0, as in calculate_weighted_score.
+    Returns (ids, scores, valid).
+    """
+    agents = target["agents"]
+    criteria = target["criteria"]
+    ids = []
+    rows = []
+    valid_rows = []
+    for record in iter_records(results_file):
+        evaluations = agent_evaluations(record, target)
+        ids.append(record.get("id"))
+        rows.append([
+            [float((evaluations.get(agent) or {}).get(key, 0) or 0) for key in criteria]
+            for agent in agents
+        ])
+        valid_rows.append([evaluations.get(agent) is not None for agent in agents])
+
+    scores = np.array(rows, dtype=np.float64).reshape(len(ids), len(agents), len(criteria))
+    valid = np.array(valid_rows, dtype=bool).reshape(len(ids), len(agents))
+    return ids, scores, valid
+
+def weight_matrix(schemes, target):
+    """
+    (scheme x criterion) matrix of weights; criteria a scheme leaves out weigh 0.
+    """
+    unknown = {key for weights in schemes.values() for key in weights} - set(target["weight_keys"])
+    if unknown:
+        raise ValueError(f"Unknown weight keys {sorted(unknown)}, expected some of {target['weight_keys']}")
+    return np.array(
+        [[float(weights.get(key, 0.0)) for key in target["weight_keys"]] for weights in schemes.values()],
+        dtype=np.float64,
+    )
+
+def rescore(scores, valid, weights):
+    """
+    Apply every weight scheme at once.
+    scores (S x A x C), valid (S x A), weights (W x C) ->
+    agent_scores (W x S x A) and overall (W x S), rounded like the scripts do:
+    each agent's weighted score to 3 decimals, then the mean over the agents
+    with a valid evaluation (0 when there is none) to 3 decimals.
+    """
+    agent_scores = np.round(np.einsum("sac,wc->wsa", scores, weights), 3)
+    agent_scores = np.where(valid[np.newaxis], agent_scores, 0.0)
+    counts = valid.sum(axis=1)
+    overall = np.divide(
+        agent_scores.sum(axis=2), counts,
+        out=np.zeros(agent_scores.shape[:2]), where=counts > 0,
+    )
+    return agent_scores, np.round(overall, 3)
+
+def rank_correlation(a, b):
+    """
+    Spearman correlation between two score vectors (ties ranked by position).
+    """
+    if len(a) < 2:
+        return 1.0
+    rank_a = np.argsort(np.argsort(-a, kind="stable"), kind="stable").astype(np.float64)
+    rank_b = np.argsort(np.argsort(-b, kind="stable"), kind="stable").astype(np.float64)
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return 1.0
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+def print_comparison(ids, names, overall, top_n):
+    """
+    Side-by-side top N per scheme, plus how far each scheme moves the ranking
+    compared with the first one.
+    """
+    order = np.argsort(-overall, axis=1, kind="stable")
+    width = 28
+    print("  ".join(f"{'#':>3} " + f"{name[:width - 5]:<{width - 5}}" for name in names))
+    for rank in range(min(top_n, len(ids))):
+        cells = []
+        for w in range(len(names)):
+            s = order[w, rank]
+            cells.append(f"{rank + 1:>3} " + f"{str(ids[s])[:width - 13]:<{width - 13}} {overall[w, s]:>7.3f}")
+        print("  ".join(cells))
+
+    baseline_top = set(order[0, :top_n].tolist())
+    for w in range(1, len(names)):
+        changed = len(set(order[w, :top_n].tolist()) - baseline_top)
+        print(f"{names[w]} vs {names[0]}: rank correlation {rank_correlation(overall[0], overall[w]):.3f}, "
+              f"{changed} of the top {top_n} differ")
+
+def write_comparison_csv(path, ids, names, overall):
+    with open(path, "w", encoding="utf-8", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["id"] + list(names))
+        for s, submission_id in enumerate(ids):
+            writer.writerow([submission_id] + [overall[w, s] for w in range(len(names))])
+
+def rewrite_results(results_file, target, valid, agent_scores, overall):
+    """
+    Rewrite the results file with one scheme's scores (same order, same
+    schema) by writing a new file next to it and renaming it into place.
+    """
+    agent_index = {agent: a for a, agent in enumerate(target["agents"])}
+    tmp_path = results_file + ".tmp"
+    with JsonlWriter(tmp_path) as writer:
+        for s, record in enumerate(iter_records(results_file)):
+            for ae in record.get("agent_evaluations", []):
+                if not ae.get("error") and not ae.get("skipped"):
+                    ae["weighted_score"] = float(agent_scores[s, agent_index[ae["agent_name"]]])
+            # Submissions without any evaluation keep the scripts' plain 0
+            record["overall_score"] = float(overall[s]) if valid[s].any() else 0
+            writer.write(record)
+    os.replace(tmp_path, results_file)
+
+def write_target_outputs(name, results_file):
+    """
+    Regenerate the ranked outputs exactly as the evaluation scripts write them.
+    """
+    if name == "aquarium":
+        from aquarium_evaluation import write_outputs
+        write_outputs(results_file, os.path.dirname(results_file))
+    else:
+        output_path = os.path.splitext(results_file)[0] + ".json"
+        write_ranked_json(results_file, rank_jsonl(results_file), output_path)
+        print(f"Ranked results written to {output_path}")
+
+def load_schemes(path, target):
+    """
+    "current" (the script's WEIGHTS) followed by the schemes in `path`: a JSON
+    object of {scheme name: {weight key: weight}}, or a single weights object.
+    """
+    schemes = {"current": target["weights"]}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        if all(isinstance(value, (int, float)) for value in loaded.values()):
+            loaded = {os.path.splitext(os.path.basename(path))[0]: loaded}
+        schemes.update(loaded)
+    return schemes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rescore a finished run with new weights, without calling the API.")
+    parser.add_argument("target", choices=sorted(TARGETS), help="which script's results to rescore")
+    parser.add_argument("--weights", help="JSON file of weight schemes to compare")
+    parser.add_argument("--apply", help="scheme to write back into the run's outputs")
+    parser.add_argument("--results", help="results .jsonl file (defaults to the script's own)")
+    parser.add_argument("--top", type=int, default=10, help="candidates shown per scheme")
+    args = parser.parse_args(argv)
+
+    target = TARGETS[args.target]()
+    results_file = args.results or target["results"]
+    schemes = load_schemes(args.weights, target)
+    if args.apply and args.apply not in schemes:
+        parser.error(f"--apply {args.apply}: no such scheme, expected one of {sorted(schemes)}")
+
+    ids, scores, valid = load_score_tensor(results_file, target)
+    print(f"Loaded {len(ids)} submissions x {len(target['agents'])} agents x "
+          f"{len(target['criteria'])} criteria from {results_file}")
+    names = list(schemes)
+    agent_scores, overall = rescore(scores, valid, weight_matrix(schemes, target))
+
+    print_comparison(ids, names, overall, args.top)
+    if len(names) > 1:
+        comparison_file = os.path.join(os.path.dirname(results_file), "rescore_comparison.csv")
+        write_comparison_csv(comparison_file, ids, names, overall)
+        print(f"Scores under every scheme written to {comparison_file}")
+
+    if args.apply:
+        w = names.index(args.apply)
+        print(f"\nApplying '{args.apply}': {schemes[args.apply]}")
+        rewrite_results(results_file, target, valid, agent_scores[w], overall[w])
+        write_target_outputs(args.target, results_file)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+# Result store: every run's evaluations in one indexed SQLite database
+# instead of one JSON file per submission and role.
+# Enable with --store on the scripts, or: export EVAL_RESULT_STORE=1
+# The per-file layouts are regenerated from it with:
+#   python scripts/result_store.py export --script evaluation_test
+STORE_MODE = os.environ.get("EVAL_RESULT_STORE", "0") == "1"
+STORE_PATH = os.environ.get("EVAL_RESULT_STORE_PATH", "dataout/results.sqlite")
+# Rows buffered before they are written in one transaction
+STORE_BATCH_SIZE = int(os.environ.get("EVAL_RESULT_STORE_BATCH", "500"))
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " run_id INTEGER PRIMARY KEY,"
+    " script TEXT NOT NULL,"
+    " model TEXT,"
+    " input TEXT,"
+    " started_at REAL NOT NULL,"
+    " finished_at REAL)",
+    # `record` holds the script's per-submission fields (e.g. overall_score), if any
+    "CREATE TABLE IF NOT EXISTS submissions ("
+    " run_id INTEGER NOT NULL REFERENCES runs (run_id),"
+    " submission_id TEXT NOT NULL,"
+    " position INTEGER NOT NULL,"
+    " record TEXT,"
+    " PRIMARY KEY (run_id, submission_id))",
+    "CREATE TABLE IF NOT EXISTS evaluations ("
+    " id INTEGER PRIMARY KEY,"
+    " run_id INTEGER NOT NULL REFERENCES runs (run_id),"
+    " submission_id TEXT NOT NULL,"
+    " role TEXT NOT NULL,"
+    " evaluation TEXT NOT NULL,"
+    " error INTEGER NOT NULL DEFAULT 0)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS evaluations_run ON evaluations (run_id, submission_id, role)",
+    "CREATE INDEX IF NOT EXISTS evaluations_submission ON evaluations (submission_id, role, run_id)",
+    "CREATE INDEX IF NOT EXISTS evaluations_role ON evaluations (role, run_id)",
+    "CREATE TABLE IF NOT EXISTS scores ("
+    " run_id INTEGER NOT NULL REFERENCES runs (run_id),"
+    " submission_id TEXT NOT NULL,"
+    " role TEXT NOT NULL,"
+    " criterion TEXT NOT NULL,"
+    " score REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS scores_run ON scores (run_id, role, criterion)",
+    "CREATE INDEX IF NOT EXISTS scores_submission ON scores (submission_id, role, run_id)",
+]
+
+def criterion_scores(evaluation):
+    """
+    The numeric fields of one evaluation, e.g. {"cto_score_1": 4, ...}.
+    """
+    if not isinstance(evaluation, dict):
+        return {}
+    return {
+        key: value for key, value in evaluation.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+class ResultStore:
+    """
+    Runs, submissions, per-role evaluations and criterion scores in SQLite.
+    Rows are buffered and written STORE_BATCH_SIZE at a time in a single
+    transaction; WAL mode and a busy timeout let several processes write to
+    the same database. Safe to share between threads.
+    """
+
+    def __init__(self, path=STORE_PATH, batch_size=STORE_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._conn = None
+        self._positions = {}
+        self._submissions = []
+        self._evaluations = []
+        self._scores = []
+
+    def _connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+        return self._conn
+
+    def start_run(self, script, model=None, input_path=None):
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "INSERT INTO runs (script, model, input, started_at) VALUES (?, ?, ?, ?)",
+                (script, model, input_path, time.time()),
+            )
+            conn.commit()
+            self.run_id = cursor.lastrowid
+            self._positions = {}
+        return self.run_id
+
+    def add_submission(self, submission_id, record=None):
+        """
+        Register a submission (in input order) with optional per-submission
+        fields; add() registers unseen submissions by itself.
+        """
+        with self._lock:
+            self._add_submission(str(submission_id), record)
+        self._maybe_flush()
+
+    def _add_submission(self, key, record):
+        if key in self._positions and record is None:
+            return
+        position = self._positions.setdefault(key, len(self._positions))
+        self._submissions.append((
+            self.run_id, key, position,
+            None if record is None else json.dumps(record, ensure_ascii=False),
+        ))
+
+    def add(self, submission_id, role, evaluation):
+        """
+        Buffer one role's evaluation; an empty or missing evaluation is kept
+        (as the scripts' files keep it) and flagged as an error.
+        """
+        key = str(submission_id)
+        with self._lock:
+            self._add_submission(key, None)
+            self._evaluations.append((
+                self.run_id, key, role,
+                json.dumps(evaluation, ensure_ascii=False),
+                int(not evaluation or (isinstance(evaluation, dict) and bool(evaluation.get("error")))),
+            ))
+            self._scores.extend(
+                (self.run_id, key, role, criterion, float(score))
+                for criterion, score in criterion_scores(evaluation).items()
+            )
+        self._maybe_flush()
+
+    def add_record(self, record, evaluations_key="agent_evaluations", role_key="agent_name"):
+        """
+        Store a whole results record (aquarium style): its list of evaluations
+        goes to the evaluations table, the other fields to the submission.
+        """
+        evaluations = record.get(evaluations_key) or []
+        # The list is kept as a placeholder so export restores the key order
+        self.add_submission(record.get("id"), dict(record, **{evaluations_key: None}))
+        for evaluation in evaluations:
+            self.add(record.get("id"), evaluation.get(role_key), evaluation)
+
+    def _maybe_flush(self):
+        if len(self._evaluations) + len(self._submissions) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            submissions, self._submissions = self._submissions, []
+            evaluations, self._evaluations = self._evaluations, []
+            scores, self._scores = self._scores, []
+            if not (submissions or evaluations):
+                return
+            conn = self._connect()
+            with conn:
+                # A submission seen again without a record keeps the one it has
+                conn.executemany(
+                    "INSERT INTO submissions (run_id, submission_id, position, record) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (run_id, submission_id) DO UPDATE SET record = COALESCE(excluded.record, record)",
+                    submissions,
+                )
+                conn.executemany(
+                    "DELETE FROM scores WHERE submission_id = ? AND role = ? AND run_id = ?",
+                    {(key, role, run_id) for run_id, key, role, _, _ in evaluations},
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO evaluations (run_id, submission_id, role, evaluation, error) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    evaluations,
+                )
+                conn.executemany(
+                    "INSERT INTO scores (run_id, submission_id, role, criterion, score) VALUES (?, ?, ?, ?, ?)",
+                    scores,
+                )
+
+    def finish_run(self):
+        self.flush()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+            conn.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Reading back
+
+    def runs(self, script=None):
+        query = "SELECT run_id, script, model, input, started_at, finished_at FROM runs"
+        params = ()
+        if script:
+            query += " WHERE script = ?"
+            params = (script,)
+        with self._lock:
+            return self._connect().execute(query + " ORDER BY run_id", params).fetchall()
+
+    def latest_run(self, script=None):
+        runs = self.runs(script)
+        return runs[-1][0] if runs else None
+
+    def run_script(self, run_id):
+        with self._lock:
+            row = self._connect().execute("SELECT script FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def iter_submissions(self, run_id):
+        """
+        Yields (submission id, record or None, [(role, evaluation)]) in input
+        order, with each submission's roles in the order they were stored.
+        """
+        with self._lock:
+            conn = self._connect()
+            submissions = conn.execute(
+                "SELECT submission_id, record FROM submissions WHERE run_id = ? ORDER BY position",
+                (run_id,),
+            ).fetchall()
+        for submission_id, record in submissions:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT role, evaluation FROM evaluations WHERE run_id = ? AND submission_id = ? ORDER BY id",
+                    (run_id, submission_id),
+                ).fetchall()
+            yield (
+                submission_id,
+                None if record is None else json.loads(record),
+                [(role, json.loads(evaluation)) for role, evaluation in rows],
+            )
+
+    def iter_scores(self, run_id):
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT submission_id, role, criterion, score FROM scores WHERE run_id = ? "
+                "ORDER BY submission_id, role, criterion",
+                (run_id,),
+            ).fetchall()
+        return iter(rows)
+
+def add_store_arguments(parser):
+    parser.add_argument("--store", action="store_true", default=STORE_MODE,
+                        help="write results to the SQLite result store instead of one file per submission and role")
+    parser.add_argument("--store-path", default=STORE_PATH,
+                        help=f"result store database (default {STORE_PATH})")
+
+def open_store(args, script, model, input_path):
+    """
+    The run's ResultStore when --store is on, else None.
+    """
+    if not args.store:
+        return None
+    store = ResultStore(args.store_path)
+    run_id = store.start_run(script, model, input_path)
+    print(f"Recording run {run_id} in the result store {args.store_path}")
+    return store
+
+# Export: the layouts the scripts write without the store
+
+def export_role_files(store, run_id, output_dir):
+    """
+    evaluation_test / code_review layout: <output_dir>/<id>_<role>.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    count = 0
+    for submission_id, _, evaluations in store.iter_submissions(run_id):
+        for role, evaluation in evaluations:
+            filename = f"{output_dir}/{submission_id}_{role}.json"
+            with open(filename, "w", encoding="utf-8") as out:
+                json.dump(evaluation, out, indent=2, ensure_ascii=False)
+            count += 1
+    return count
+
+def export_aquarium(store, run_id, output_dir):
+    """
+    aquarium layout: results.jsonl, then evaluations.json and the CSVs from it.
+    """
+    from aquarium_evaluation import write_outputs
+    from jsonl_io import JsonlWriter
+
+    results_file = os.path.join(output_dir, "results.jsonl")
+    with JsonlWriter(results_file) as writer:
+        for _, record, evaluations in store.iter_submissions(run_id):
+            record["agent_evaluations"] = [evaluation for _, evaluation in evaluations]
+            writer.write(record)
+    write_outputs(results_file, output_dir)
+    return writer.count
+
+def export_scores_csv(store, run_id, path):
+    """
+    Every criterion score of a run as one flat CSV: submission, role, criterion, score.
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["submission_id", "role", "criterion", "score"])
+        writer.writerows(store.iter_scores(run_id))
+
+EXPORTS = {
+    "evaluation_test": (export_role_files, "dataout"),
+    "code_review": (export_role_files, "dataout/codereview"),
+    "aquarium": (export_aquarium, "aquariumdataout/questions1_7"),
+}
+
+def export_run(store, run_id, output_dir=None):
+    script = store.run_script(run_id)
+    if script is None:
+        raise ValueError(f"No run {run_id} in {store.path}")
+    export, default_dir = EXPORTS[script]
+    return export(store, run_id, output_dir or default_dir)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List and export the runs in the SQLite result store.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--store-path", default=STORE_PATH, help=f"result store database (default {STORE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("runs", parents=[common], help="list the stored runs")
+    export = commands.add_parser("export", parents=[common], help="write a run out in the script's usual file layout")
+    export.add_argument("--run", type=int, help="run id (default: the latest run of --script, or the latest run)")
+    export.add_argument("--script", choices=sorted(EXPORTS), help="pick the latest run of this script")
+    export.add_argument("--out", help="output folder (default: the script's own)")
+    export.add_argument("--scores-csv", help="also write every criterion score of the run to this CSV")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store_path)
+    if args.command == "runs":
+        for run_id, script, model, input_path, started_at, finished_at in store.runs():
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at))
+            status = "finished" if finished_at else "unfinished"
+            print(f"{run_id:>5}  {script:<16} {model or '-':<14} {started}  {status:<10}  {input_path or '-'}")
+        store.close()
+        return
+
+    run_id = args.run or store.latest_run(args.script)
+    if run_id is None:
+        parser.error(f"no runs in {args.store_path}")
+    count = export_run(store, run_id, args.out)
+    print(f"Exported run {run_id} ({store.run_script(run_id)}): {count} records")
+    if args.scores_csv:
+        export_scores_csv(store, run_id, args.scores_csv)
+        print(f"Criterion scores written to {args.scores_csv}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
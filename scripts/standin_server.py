@@ -0,0 +1,457 @@
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI chat-completions API, for offline runs and
+# load tests. It answers POST /v1/chat/completions with schema-valid fake
+# evaluations built from the JSON example at the end of each prompt, with
+# configurable latency, error rate, 429 injection and malformed replies.
+# Requests with "stream": true are answered with server-sent events, a few
+# tokens per chunk, at --token-latency seconds per generated token.
+# It also stands in for the Batch API (POST /v1/files, POST /v1/batches,
+# GET /v1/batches/<id>, GET /v1/files/<id>/content), completing each batch
+# after --batch-delay seconds.
+#
+#   python scripts/standin_server.py --port 8900 --latency 0.8 --rate-limit-rate 0.05
+#   EVAL_BACKEND=http EVAL_BASE_URL=http://127.0.0.1:8900/v1 python scripts/aquarium_evaluation.py
+
+FAKE_SENTENCES = [
+    "The project combines a clear use case with a credible technical plan.",
+    "The team shows relevant experience but the scope may be ambitious for the timeline.",
+    "Integration with the XRP Ledger is plausible but not yet detailed.",
+    "The idea addresses a real problem, though the go-to-market path is vague.",
+]
+FAKE_QUESTIONS = [
+    "How will you validate demand before launch?",
+    "Which parts of the system run on-chain and which off-chain?",
+    "What is the plan for security audits?",
+    "How will the model be evaluated and monitored?",
+]
+# Characters of the reply per streamed chunk (about four tokens)
+STREAM_CHUNK_CHARS = 16
+
+def _rng_for(prompt):
+    # Same prompt -> same fake reply, like a temperature-0 model
+    return random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+
+def _extract_template(prompt):
+    """
+    Find the JSON example the prompt asks for: the last unindented line that
+    opens a JSON object/array on its own, through the end of the prompt.
+    """
+    lines = prompt.splitlines()
+    for index in range(len(lines) - 1, -1, -1):
+        if lines[index].rstrip() in ("{", "["):
+            return "\n".join(lines[index:])
+    return None
+
+def _fill(value, rng):
+    if isinstance(value, dict):
+        return {key: _fill(item, rng) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(item == "..." for item in value):
+            return rng.sample(FAKE_QUESTIONS, min(len(FAKE_QUESTIONS), rng.randint(2, 3)))
+        return [_fill(item, rng) for item in value]
+    if value == "...":
+        return rng.choice(FAKE_SENTENCES)
+    if isinstance(value, str) and "|" in value:
+        # A choice between options, e.g. "A|B"
+        return rng.choice(value.split("|"))
+    if value == "__NUMBER__":
+        return rng.randint(1, 5)
+    return value
+
+def fake_reply(prompt):
+    """
+    Build a schema-valid reply for any of the scripts' prompts.
+    """
+    rng = _rng_for(prompt)
+    template = _extract_template(prompt)
+    if template is None:
+        # Free-text prompts (e.g. condensing summaries)
+        return " ".join(rng.sample(FAKE_SENTENCES, 3))
+
+    template = re.sub(r"<number>", '"__NUMBER__"', template)
+    template = re.sub(r"<[^<>\"]+>", '"__ID__"', template)
+    try:
+        example = json.loads(template)
+    except json.JSONDecodeError:
+        return " ".join(rng.sample(FAKE_SENTENCES, 3))
+
+    if isinstance(example, list) and example:
+        # Packed prompts: one entry per "### PROJECT id: <id>" block
+        ids = [json.loads(match) for match in re.findall(r"^### PROJECT id: (.+)$", prompt, re.M)]
+        entries = []
+        for item_id in ids or [None]:
+            entry = _fill(example[0], rng)
+            if item_id is not None:
+                entry["id"] = item_id
+            entries.append(entry)
+        return json.dumps(entries, indent=2)
+
+    return json.dumps(_fill(example, rng), indent=2)
+
+def malform(content, rng):
+    """
+    Break a JSON reply the way real models do: wrapped in a code fence with
+    prose around it, a trailing comma, or one field left out.
+    """
+    try:
+        value = json.loads(content)
+    except json.JSONDecodeError:
+        return content
+    kind = rng.choice(["fenced", "trailing_comma", "missing_field"])
+    if kind == "fenced":
+        return f"Here is my evaluation:\n\n```json\n{content}\n```\n\nLet me know if you need more detail."
+    if kind == "trailing_comma":
+        return re.sub(r"(\S)(\s*)([}\]])\s*$", r"\1,\2\3", content)
+    target = value[0] if isinstance(value, list) and value else value
+    if isinstance(target, dict) and len(target) > 1:
+        target.pop(rng.choice([key for key in target if key != "id"]))
+    return json.dumps(value, indent=2)
+
+def ramble(content, rng):
+    """
+    Surround a reply with the paragraphs a model adds when it ignores "JSON
+    only": before the JSON, or after it.
+    """
+    prose = "\n\n".join(" ".join(rng.sample(FAKE_SENTENCES, 4)) for _ in range(3))
+    if rng.random() < 0.5:
+        return f"{prose}\n\n{content}"
+    return f"{content}\n\n{prose}"
+
+def completion_body(request, options, stats_request_id):
+    """
+    A chat.completion response body for one request body, with a fake reply.
+    Returns (body, malformed, rambling).
+    """
+    prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+    content = fake_reply(prompt)
+    malformed = random.random() < options["malformed_rate"]
+    if malformed:
+        content = malform(content, random)
+    rambling = random.random() < options["ramble_rate"]
+    if rambling:
+        content = ramble(content, random)
+    finish_reason = "stop"
+    max_tokens = request.get("max_tokens")
+    if max_tokens and len(content) // 4 > max_tokens:
+        content = content[:max_tokens * 4]
+        finish_reason = "length"
+
+    prompt_tokens = len(prompt) // 4 + 1
+    completion_tokens = len(content) // 4 + 1
+    return {
+        "id": f"chatcmpl-standin-{stats_request_id}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "gpt-4"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }, malformed, rambling
+
+def _parse_multipart(content_type, body):
+    """
+    {field name: bytes} for a multipart/form-data body.
+    """
+    message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+        for part in message.get_payload()
+    }
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The listen backlog; the default of 5 resets connections under a concurrent bench
+    request_queue_size = 128
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def record_latency(self, seconds):
+        with self.stats_lock:
+            self.latencies.append(seconds)
+
+    def add_file(self, content, purpose, filename):
+        with self.stats_lock:
+            file_id = f"file-standin-{len(self.files) + 1}"
+            self.files[file_id] = {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "content": content,
+            }
+        return {key: value for key, value in self.files[file_id].items() if key != "content"}
+
+    def run_batch(self, batch):
+        """
+        Answer every line of the batch's input file after the configured
+        delay, like the real endpoint: one output line per request.
+        """
+        time.sleep(self.options["batch_delay"] / 2)
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        output = []
+        for number, line in enumerate(line for line in lines if line.strip()):
+            request = json.loads(line)
+            body, malformed, rambling = completion_body(request["body"], self.options,
+                                                        f"batch-{batch['id']}-{number}")
+            if malformed:
+                self.count("malformed")
+            if rambling:
+                self.count("rambling")
+            self.count("batch_requests")
+            output.append(json.dumps({
+                "id": f"batch_req_{number}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": f"req_{number}", "body": body},
+                "error": None,
+            }))
+            batch["request_counts"]["completed"] += 1
+        time.sleep(self.options["batch_delay"] / 2)
+        batch["output_file_id"] = self.add_file(("\n".join(output) + "\n").encode("utf-8"),
+                                                "batch_output", f"{batch['id']}_output.jsonl")["id"]
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    server_version = "StandIn/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        batch = re.search(r"/batches/([^/]+)$", path)
+        content = re.search(r"/files/([^/]+)/content$", path)
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4", "object": "model"}]})
+        elif batch:
+            if batch.group(1) not in self.server.batches:
+                return self._not_found()
+            self._send_json(200, self.server.batches[batch.group(1)])
+        elif content:
+            stored = self.server.files.get(content.group(1))
+            if stored is None:
+                return self._not_found()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(stored["content"])))
+            self.end_headers()
+            self.wfile.write(stored["content"])
+        else:
+            self._not_found()
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/files"):
+            return self._upload_file()
+        if path.endswith("/batches"):
+            return self._create_batch()
+        if not path.endswith("/chat/completions"):
+            return self._not_found()
+        started = time.perf_counter()
+        self._chat_completion()
+        self.server.record_latency(time.perf_counter() - started)
+
+    def _upload_file(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        fields = _parse_multipart(self.headers.get("Content-Type", ""), self.rfile.read(length))
+        if "file" not in fields:
+            return self._send_json(400, {"error": {"message": "missing file"}})
+        purpose = (fields.get("purpose") or b"batch").decode("utf-8")
+        self._send_json(200, self.server.add_file(fields["file"], purpose, "upload.jsonl"))
+
+    def _create_batch(self):
+        request = self._read_json()
+        if request.get("input_file_id") not in self.server.files:
+            return self._send_json(400, {"error": {"message": "unknown input_file_id"}})
+        lines = self.server.files[request["input_file_id"]]["content"].decode("utf-8").splitlines()
+        with self.server.stats_lock:
+            batch_id = f"batch_standin_{len(self.server.batches) + 1}"
+            batch = self.server.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint"),
+                "input_file_id": request["input_file_id"],
+                "completion_window": request.get("completion_window", "24h"),
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": sum(1 for line in lines if line.strip()), "completed": 0, "failed": 0},
+            }
+        threading.Thread(target=self.server.run_batch, args=(batch,), daemon=True).start()
+        self._send_json(200, batch)
+
+    def _chat_completion(self):
+        request = self._read_json()
+        self.server.count("requests")
+        options = self.server.options
+
+        # Simulated network + generation time
+        delay = max(0.0, options["latency"] + random.uniform(-options["jitter"], options["jitter"]))
+        time.sleep(delay)
+
+        roll = random.random()
+        if roll < options["rate_limit_rate"]:
+            self.server.count("rate_limited")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (stand-in)", "type": "rate_limit_exceeded"}},
+                {"Retry-After": str(options["retry_after"])},
+            )
+            return
+        if roll < options["rate_limit_rate"] + options["error_rate"]:
+            self.server.count("errors")
+            self._send_json(500, {"error": {"message": "Internal error (stand-in)", "type": "server_error"}})
+            return
+
+        body, malformed, rambling = completion_body(request, options, self.server.stats["requests"])
+        if malformed:
+            self.server.count("malformed")
+        if rambling:
+            self.server.count("rambling")
+        if request.get("stream"):
+            self._stream_completion(body, bool((request.get("stream_options") or {}).get("include_usage")))
+            return
+        time.sleep(body["usage"]["completion_tokens"] * options["token_latency"])
+        self._send_json(200, body)
+
+    def _send_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_completion(self, body, include_usage):
+        """
+        Send a completion body as server-sent events, like the real API with
+        "stream": true. A client that closes the stream before the end is
+        counted in stats["streams_closed"].
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        choice = body["choices"][0]
+        content = choice["message"]["content"]
+        base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"], "model": body["model"]}
+        events = [
+            dict(base, choices=[{"index": 0, "delta": {"content": content[i:i + STREAM_CHUNK_CHARS]},
+                                 "finish_reason": None}])
+            for i in range(0, len(content), STREAM_CHUNK_CHARS)
+        ]
+        events.append(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}]))
+        if include_usage:
+            events.append(dict(base, choices=[], usage=body["usage"]))
+        delay = self.server.options["token_latency"] * STREAM_CHUNK_CHARS / 4
+        try:
+            for event in events:
+                time.sleep(delay)
+                self._send_chunk(f"data: {json.dumps(event)}\n\n")
+            self._send_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.count("streams_closed")
+            self.close_connection = True
+
+def start_standin_server(host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                         error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, malformed_rate=0.0,
+                         batch_delay=2.0, ramble_rate=0.0, token_latency=0.0):
+    """
+    Start the stand-in in a background thread and return the server;
+    `server.base_url` is the value for EVAL_BASE_URL, `server.stats` counts
+    requests, injected 429s, errors, malformed and rambling replies, batched
+    requests and streams the client closed early,
+    `server.latencies` holds the time spent on each request, and
+    `server.shutdown()` stops it.
+    Port 0 picks a free port.
+    """
+    server = StandInServer((host, port), StandInHandler)
+    server.options = {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "rate_limit_rate": rate_limit_rate,
+        "retry_after": retry_after,
+        "malformed_rate": malformed_rate,
+        "batch_delay": batch_delay,
+        "ramble_rate": ramble_rate,
+        "token_latency": token_latency,
+    }
+    server.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "malformed": 0, "rambling": 0,
+                    "batch_requests": 0, "streams_closed": 0}
+    server.files = {}
+    server.batches = {}
+    server.stats_lock = threading.Lock()
+    server.latencies = []
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server with fake evaluations.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds per reply")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with each 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="fraction of replies fenced in prose, with a trailing comma or missing a field")
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="seconds until a submitted batch completes")
+    parser.add_argument("--ramble-rate", type=float, default=0.0,
+                        help="fraction of replies with paragraphs of prose before or after the JSON")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="seconds per generated token, on top of --latency")
+    args = parser.parse_args(argv)
+
+    server = start_standin_server(
+        args.host, args.port, args.latency, args.jitter,
+        args.error_rate, args.rate_limit_rate, args.retry_after, args.malformed_rate, args.batch_delay,
+        args.ramble_rate, args.token_latency,
+    )
+    print(f"Stand-in server listening on {server.base_url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Stopped. {server.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import os
+import re
+import json
+
+from llm_client import chat_completion, remember
+from telemetry import get_telemetry
+from token_count import estimate_tokens
+
+# Structured replies are parsed tolerantly (code fences, prose around the
+# JSON, trailing commas, smart quotes) and checked against the script's
+# schema. When fields are missing or invalid, a short follow-up turn asks for
+# just those fields instead of re-running the whole evaluation.
+# Disable the follow-up with: export EVAL_REPAIR=off
+REPAIR_ENABLED = os.environ.get("EVAL_REPAIR", "on").lower() != "off"
+REPAIR_MAX_TOKENS = int(os.environ.get("EVAL_REPAIR_MAX_TOKENS", "400"))
+# Streamed replies (EVAL_STREAM=on) are capped at what their schema needs:
+# tokens allowed per text and per list field, and headroom on the total for a
+# code fence or a sentence around the JSON (see schema_max_tokens)
+STREAM_TEXT_FIELD_TOKENS = int(os.environ.get("EVAL_STREAM_TEXT_FIELD_TOKENS", "200"))
+STREAM_LIST_FIELD_TOKENS = int(os.environ.get("EVAL_STREAM_LIST_FIELD_TOKENS", "150"))
+STREAM_CAP_HEADROOM = float(os.environ.get("EVAL_STREAM_CAP_HEADROOM", "1.5"))
+
+SCORE_RANGE = (1, 5)
+# Positions tried for the start of the JSON value in a reply full of prose
+MAX_START_CANDIDATES = 20
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)```", re.S)
+_WORD_RE = re.compile(r"[A-Za-z_]+")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_decoder = json.JSONDecoder()
+
+class StructuredOutputError(ValueError):
+    """
+    A reply that could not be turned into a valid structured result.
+    Carries the raw `text`, what was parsed of it (`value`, or None) and the
+    `problems` found, one "field: what is wrong" string each.
+    """
+
+    def __init__(self, message, text="", value=None, problems=()):
+        super().__init__(message)
+        self.text = text
+        self.value = value
+        self.problems = list(problems)
+
+def _fix_syntax(text):
+    """
+    The usual near-misses, fixed outside string literals only: smart quotes
+    used as string delimiters, trailing commas and Python literals. String
+    contents ("It is True, really", typographic quotes in prose) are kept.
+    """
+    out = []
+    i, n = 0, len(text)
+    closing = None  # the characters that end the string being copied, if any
+    while i < n:
+        ch = text[i]
+        if closing:
+            if ch == "\\" and i + 1 < n:
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if ch in closing:
+                out.append('"')
+                closing = None
+            else:
+                out.append(ch)
+            i += 1
+            continue
+        if ch == '"':
+            closing = '"'
+            out.append(ch)
+        elif ch in "“”":
+            # A string opened with a smart quote may be closed by either kind
+            closing = '"“”'
+            out.append('"')
+        elif ch in "‘’":
+            out.append("'")
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j >= n or text[j] not in "}]":
+                out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            word = _WORD_RE.match(text, i).group()
+            out.append(_PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+def _first_value(text):
+    """
+    The first JSON value in `text`. At each { or [ in turn the value is
+    decoded as is and then with its syntax fixed, so a nested value is only
+    taken when the one enclosing it can't be decoded either way.
+    """
+    starts = [m.start() for m in re.finditer(r"[{\[]", text)][:MAX_START_CANDIDATES]
+    for start in starts:
+        try:
+            return _decoder.raw_decode(text, start)[0], True
+        except json.JSONDecodeError:
+            pass
+        try:
+            return _decoder.raw_decode(_fix_syntax(text[start:]))[0], True
+        except json.JSONDecodeError:
+            continue
+    return None, False
+
+def _extract(text):
+    """
+    Returns (value, cleaned): `cleaned` is True when the reply was not plain JSON.
+    """
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError as e:
+        error = e
+
+    for candidate in _FENCE_RE.findall(text) + [text]:
+        value, found = _first_value(candidate)
+        if found:
+            return value, True
+    raise error
+
+def extract_json(text):
+    """
+    Tolerant json.loads for model replies: takes the JSON inside a ``` fence
+    or the first JSON object/array in the text, ignoring prose around it,
+    and fixes minor syntax errors. Raises json.JSONDecodeError if there is
+    no JSON value to be found.
+    """
+    return _extract(text)[0]
+
+def _is_score(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and SCORE_RANGE[0] <= value <= SCORE_RANGE[1]
+
+def normalize(evaluation, score_keys, list_keys=()):
+    """
+    Coerce harmless variations in place: numeric strings ("4") for scores,
+    and a single string for a list field.
+    """
+    if not isinstance(evaluation, dict):
+        return evaluation
+    for key in score_keys:
+        value = evaluation.get(key)
+        if isinstance(value, str):
+            try:
+                evaluation[key] = float(value.strip()) if "." in value else int(value.strip())
+            except ValueError:
+                pass
+    for key in list_keys:
+        if isinstance(evaluation.get(key), str):
+            evaluation[key] = [evaluation[key]]
+    return evaluation
+
+def schema_problems(evaluation, score_keys, list_keys=(), text_keys=("summary",)):
+    """
+    Every way `evaluation` misses the schema: score keys must be numbers in
+    1-5, text keys strings, and list keys (optional) lists.
+    Returns a list of "field: problem" strings, empty when the evaluation is valid.
+    """
+    if not isinstance(evaluation, dict):
+        return [f"{key}: missing" for key in list(score_keys) + list(text_keys)]
+    problems = []
+    for key in score_keys:
+        if key not in evaluation:
+            problems.append(f"{key}: missing")
+        elif not _is_score(evaluation[key]):
+            problems.append(f"{key}: must be a number from {SCORE_RANGE[0]} to {SCORE_RANGE[1]}")
+    for key in text_keys:
+        if key not in evaluation:
+            problems.append(f"{key}: missing")
+        elif not isinstance(evaluation[key], str):
+            problems.append(f"{key}: must be a string")
+    for key in list_keys:
+        if key in evaluation and not isinstance(evaluation[key], list):
+            problems.append(f"{key}: must be a list of strings")
+    return problems
+
+def schema_parser(score_keys, list_keys=(), text_keys=("summary",)):
+    """
+    A `parse` function for chat_completion: tolerant extraction, then the
+    schema check. Raises StructuredOutputError (so the reply is not cached)
+    when the reply cannot be used as is, and counts what it saw in telemetry.
+    Its `is_valid(text)` runs the same check without counting, for streamed
+    replies checked as they arrive.
+    """
+    telemetry = get_telemetry()
+
+    def parse(text):
+        telemetry.count("structured_replies")
+        try:
+            value, cleaned = _extract(text)
+        except json.JSONDecodeError as e:
+            telemetry.count("structured_unparsable")
+            raise StructuredOutputError(f"no JSON in reply: {e}", text,
+                                        problems=schema_problems(None, score_keys, list_keys, text_keys))
+        if cleaned:
+            telemetry.count("structured_cleaned")
+        normalize(value, score_keys, list_keys)
+        problems = schema_problems(value, score_keys, list_keys, text_keys)
+        if problems:
+            telemetry.count("structured_invalid")
+            raise StructuredOutputError(f"reply does not match the schema ({'; '.join(problems)})",
+                                        text, value, problems)
+        return value
+
+    def is_valid(text):
+        try:
+            value = _extract(text)[0]
+        except json.JSONDecodeError:
+            return False
+        return not schema_problems(normalize(value, score_keys, list_keys), score_keys, list_keys, text_keys)
+
+    parse.is_valid = is_valid
+    return parse
+
+def schema_max_tokens(score_keys, list_keys=(), text_keys=("summary",)):
+    """
+    A max_tokens cap for a streamed reply matching the schema: the JSON for
+    the score keys, STREAM_TEXT_FIELD_TOKENS per text field and
+    STREAM_LIST_FIELD_TOKENS per list field, times STREAM_CAP_HEADROOM.
+    """
+    tokens = 10 + sum(estimate_tokens(f'  "{key}": 5,\n') for key in score_keys)
+    tokens += sum(estimate_tokens(f'  "{key}": "",\n') + STREAM_TEXT_FIELD_TOKENS for key in text_keys)
+    tokens += sum(estimate_tokens(f'  "{key}": [],\n') + STREAM_LIST_FIELD_TOKENS for key in list_keys)
+    return int(tokens * STREAM_CAP_HEADROOM)
+
+def build_repair_prompt(problems, score_keys, list_keys=(), text_keys=("summary",)):
+    """
+    Follow-up turn asking only for the fields listed in `problems`.
+    """
+    fields = [problem.split(":", 1)[0] for problem in problems]
+    example = []
+    for key in fields:
+        if key in score_keys:
+            example.append(f'  "{key}": <number>')
+        elif key in list_keys:
+            example.append(f'  "{key}": ["...", "..."]')
+        else:
+            example.append(f'  "{key}": "..."')
+    problem_lines = "\n".join(f"- {problem}" for problem in problems)
+    example_json = ",\n".join(example)
+    prompt_template = f"""
+Your previous reply could not be used as is:
+{problem_lines}
+
+Do not repeat the rest of the evaluation. Respond ONLY with valid JSON that
+contains just these fields (scores on a {SCORE_RANGE[0]}–{SCORE_RANGE[1]} scale):
+
+{{
+{example_json}
+}}
+"""
+    return prompt_template.strip()
+
+def structured_completion(client, model, prompt_text, score_keys, list_keys=(), text_keys=("summary",),
+                          temperature=0.0, max_tokens=None, persona=None, submission_id=None):
+    """
+    chat_completion for replies that must match a per-script schema.
+    A reply that fails the check gets one follow-up turn (the original
+    prompt and reply as history) asking only for the broken fields, which are
+    merged into what did parse. A repaired result is cached under the
+    original prompt, so later runs replay it without either call.
+    Streamed replies are capped per persona from the schema (schema_max_tokens).
+    Raises StructuredOutputError if the result is still invalid.
+    """
+    parse = schema_parser(score_keys, list_keys, text_keys)
+    try:
+        return chat_completion(client, model, prompt_text, temperature=temperature, parse=parse,
+                               max_tokens=max_tokens, persona=persona, submission_id=submission_id,
+                               stream_max_tokens=schema_max_tokens(score_keys, list_keys, text_keys))
+    except StructuredOutputError as e:
+        if not REPAIR_ENABLED:
+            raise
+        failed = e
+
+    telemetry = get_telemetry()
+    telemetry.count("structured_repair_attempts")
+    history = [
+        {"role": "user", "content": prompt_text},
+        {"role": "assistant", "content": failed.text},
+    ]
+    repair_prompt = build_repair_prompt(failed.problems, score_keys, list_keys, text_keys)
+    try:
+        fields = chat_completion(client, model, repair_prompt, temperature=temperature, parse=extract_json,
+                                 max_tokens=REPAIR_MAX_TOKENS, persona=f"{persona or 'reply'}-repair",
+                                 submission_id=submission_id, history=history, stream=False)
+    except Exception as e:
+        telemetry.count("structured_unrepaired")
+        raise StructuredOutputError(f"{failed} (repair failed: {e})", failed.text, failed.value, failed.problems)
+
+    value = dict(failed.value) if isinstance(failed.value, dict) else {}
+    if isinstance(fields, dict):
+        value.update(fields)
+    normalize(value, score_keys, list_keys)
+    problems = schema_problems(value, score_keys, list_keys, text_keys)
+    if problems:
+        telemetry.count("structured_unrepaired")
+        raise StructuredOutputError(f"reply still does not match the schema after repair ({'; '.join(problems)})",
+                                    failed.text, value, problems)
+
+    telemetry.count("structured_repaired")
+    remember(model, prompt_text, json.dumps(value, ensure_ascii=False), temperature, max_tokens)
+    return value
@@ -1,14 +1,27 @@
 import os
 import json
-from openai import OpenAI
+import argparse
+
+from dedup import DuplicateLinker, find_duplicates, DEDUP_MODE
+from eval_engine import run_jobs, iter_batches, STREAM_BATCH_SIZE
+from jsonl_io import JsonlWriter, iter_records, rank_jsonl, write_ranked_json
+from llm_cache import get_cache
+from llm_backend import get_backend
+from llm_client import chat_completion
+from multi_persona import is_valid_evaluation
+from profiling import add_profile_arguments, finish_profiling, profiled, stage, start_profiling
+from structured_output import StructuredOutputError, extract_json, normalize, schema_max_tokens, structured_completion
+from telemetry import report_run
+from token_count import estimate_tokens
 
 # 1) Provide your API key here, or let it come from an environment variable
 API_KEY = os.environ.get("OPENAI_API_KEY")
 # Alternatively, you could inline your key:
 # API_KEY = "sk-..."
 
-# 2) Create the OpenAI client
-client = OpenAI(api_key=API_KEY)
+# 2) Create the LLM client: the shared OpenAI backend by default
+# (set EVAL_BACKEND / EVAL_BASE_URL to use another one, see llm_backend.py)
+client = get_backend(api_key=API_KEY)
 
 # 3) Choose your model name here
 MODEL_NAME = "gpt-4"  
@@ -23,6 +36,19 @@ WEIGHTS = {
     "theme_alignment": 0.15,
 }
 
+# 5) Packed mode: several short pitches share one request (and its instruction block).
+# A pack holds at most PACK_SIZE submissions and PACK_TOKEN_BUDGET pitch tokens.
+PACK_SIZE = int(os.environ.get("EVAL_PACK_SIZE", "8"))
+PACK_TOKEN_BUDGET = int(os.environ.get("EVAL_PACK_TOKEN_BUDGET", "3000"))
+
+SCORE_KEYS = [
+    "short_pitch_score",
+    "originality_score",
+    "feasibility_score",
+    "impact_score",
+    "theme_alignment_score",
+]
+
 def build_prompt(high_level_pitch, project_pitch):
     """
     Construct the prompt describing the hackathon evaluation instructions.
@@ -62,26 +88,133 @@ Return your answer in JSON format without extra commentary, for example:
     """
     return prompt_template.strip()
 
-def get_ai_evaluation(high_level_pitch, project_pitch):
+def build_packed_prompt(submissions):
+    """
+    Construct one prompt that evaluates several submissions at once.
+    The instructions are sent once; each project is tagged with its `id`
+    and the AI must answer with a JSON array of score objects keyed by that id.
+    """
+    project_blocks = []
+    for sub in submissions:
+        project_blocks.append(
+            f"### PROJECT id: {json.dumps(sub.get('id'))}\n\n"
+            f"**HIGH-LEVEL PITCH**:\n{sub.get('high_level_pitch', '')}\n\n"
+            f"**DETAILED PROJECT PITCH**:\n{sub.get('project_pitch', '')}\n"
+        )
+    all_projects_text = "\n".join(project_blocks)
+
+    prompt_template = f"""
+You are an AI assistant helping to evaluate hackathon projects.
+
+Below are {len(submissions)} separate projects. Evaluate each one on its own merits,
+independently of the others.
+
+{all_projects_text}
+Evaluate each project according to these criteria (each on a 1–5 scale):
+1) short_pitch_score
+2) originality_score
+3) feasibility_score
+4) impact_score
+5) theme_alignment_score
+
+Then, for each project:
+- Provide a concise 2–3 sentence summary of the project.
+- List 2–3 open questions if there's any ambiguity.
+
+Return your answer as a JSON array with exactly one object per project, each carrying
+the project's "id" exactly as given above, without extra commentary, for example:
+
+[
+  {{
+    "id": <project id>,
+    "short_pitch_score": <number>,
+    "originality_score": <number>,
+    "feasibility_score": <number>,
+    "impact_score": <number>,
+    "theme_alignment_score": <number>,
+    "summary": "...",
+    "open_questions": ["...", "..."]
+  }}
+]
+    """
+    return prompt_template.strip()
+
+def pack_submissions(submissions, pack_size=None, token_budget=None):
+    """
+    Greedily group submissions into packs bounded by `pack_size` entries and
+    `token_budget` estimated pitch tokens. A pitch larger than the budget
+    still gets a pack of its own.
+    """
+    pack_size = pack_size or PACK_SIZE
+    token_budget = token_budget or PACK_TOKEN_BUDGET
+
+    packs = []
+    pack = []
+    pack_tokens = 0
+    for sub in submissions:
+        tokens = estimate_tokens(sub.get("high_level_pitch", ""), MODEL_NAME) \
+            + estimate_tokens(sub.get("project_pitch", ""), MODEL_NAME)
+        if pack and (len(pack) >= pack_size or pack_tokens + tokens > token_budget):
+            packs.append(pack)
+            pack = []
+            pack_tokens = 0
+        pack.append(sub)
+        pack_tokens += tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+def get_packed_evaluations(submissions):
     """
-    Calls the new style:
-        client.chat.completions.create(...)
-    Then parses the result as JSON.
+    Evaluate a pack of submissions in one call.
+    Returns {str(id): evaluation} for the entries that came back valid;
+    missing or malformed entries are simply absent so they can be re-queued.
     """
-    prompt_text = build_prompt(high_level_pitch, project_pitch)
+    with stage("render_prompt"):
+        prompt_text = build_packed_prompt(submissions)
 
     try:
-        response = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt_text}],
-            model=MODEL_NAME,
-            temperature=0.0
-        )
-        # The new interface returns an object with .choices
-        ai_text = response.choices[0].message.content.strip()
-        # Parse JSON from AI text
-        result_json = json.loads(ai_text)
-        return result_json
-    
+        reply = chat_completion(client, MODEL_NAME, prompt_text, temperature=0.0, parse=extract_json,
+                                persona="pitch-pack",
+                                submission_id=",".join(str(sub.get("id")) for sub in submissions),
+                                stream_max_tokens=len(submissions) * schema_max_tokens(SCORE_KEYS, ("open_questions",)))
+    except json.JSONDecodeError as e:
+        print(f"Invalid JSON from OpenAI API for a pack of {len(submissions)}: {e}")
+        return {}
+    except Exception as e:
+        print(f"Error calling OpenAI API for a pack of {len(submissions)}: {e}")
+        return {}
+
+    if not isinstance(reply, list):
+        return {}
+
+    wanted = {str(sub.get("id")) for sub in submissions}
+    evaluations = {}
+    for entry in reply:
+        if not isinstance(entry, dict):
+            continue
+        entry_id = str(entry.pop("id", None))
+        if entry_id in wanted and is_valid_evaluation(normalize(entry, SCORE_KEYS, ("open_questions",)), SCORE_KEYS):
+            evaluations[entry_id] = entry
+    return evaluations
+
+def get_ai_evaluation(high_level_pitch, project_pitch, submission_id=None):
+    """
+    Sends the pitch prompt to the configured backend (see get_backend())
+    through structured_completion, which caches the reply, parses it as JSON
+    and checks it against SCORE_KEYS. Returns None if the call fails.
+    """
+    with stage("render_prompt"):
+        prompt_text = build_prompt(high_level_pitch, project_pitch)
+
+    try:
+        return structured_completion(client, MODEL_NAME, prompt_text, SCORE_KEYS, ("open_questions",),
+                                     persona="pitch", submission_id=submission_id)
+
+    except StructuredOutputError as e:
+        print(f"Invalid JSON from OpenAI API: {e}")
+        return None
+
     except Exception as e:
         print(f"Error calling OpenAI API: {e}")
         return None
@@ -111,42 +244,125 @@ def calculate_weighted_score(ai_result):
 
     return round(total, 3)
 
-def main():
-    # Read input from datain/submissions.json
-    with open("datain/submissions.json", "r", encoding="utf-8") as f:
-        submissions = json.load(f)
+def evaluate_submission(sub):
+    """
+    Evaluate one submission and build its result record.
+    """
+    # Extract pitch fields
+    high_pitch = sub.get("high_level_pitch", "")
+    proj_pitch = sub.get("project_pitch", "")
 
-    results = []
+    # Evaluate via new 'client' interface
+    ai_evaluation = get_ai_evaluation(high_pitch, proj_pitch, sub.get("id"))
 
-    for sub in submissions:
-        # Extract pitch fields
-        high_pitch = sub.get("high_level_pitch", "")
-        proj_pitch = sub.get("project_pitch", "")
+    overall_score = 0
+    if ai_evaluation:
+        overall_score = calculate_weighted_score(ai_evaluation)
 
-        # Evaluate via new 'client' interface
-        ai_evaluation = get_ai_evaluation(high_pitch, proj_pitch)
+    # Build a result record
+    return {
+        "id": sub.get("id"),
+        "name": sub.get("name"),
+        "ai_evaluation": ai_evaluation or {},
+        "overall_score": overall_score
+    }
 
-        overall_score = 0
-        if ai_evaluation:
-            overall_score = calculate_weighted_score(ai_evaluation)
+def evaluate_pack(submissions):
+    """
+    Evaluate a pack of submissions with one request and build their result
+    records. Entries missing from the reply are re-queued on their own.
+    """
+    evaluations = get_packed_evaluations(submissions) if len(submissions) > 1 else {}
 
-        # Build a result record
-        result_entry = {
+    requeued = [sub for sub in submissions if str(sub.get("id")) not in evaluations]
+    if requeued and len(submissions) > 1:
+        print(f"Re-queuing {len(requeued)} of {len(submissions)} packed submissions on their own")
+
+    results = []
+    for sub in submissions:
+        ai_evaluation = evaluations.get(str(sub.get("id")))
+        if ai_evaluation is None:
+            results.append(evaluate_submission(sub))
+            continue
+        results.append({
             "id": sub.get("id"),
             "name": sub.get("name"),
-            "ai_evaluation": ai_evaluation or {},
-            "overall_score": overall_score
-        }
-        results.append(result_entry)
+            "ai_evaluation": ai_evaluation,
+            "overall_score": calculate_weighted_score(ai_evaluation)
+        })
+    return results
+
+def batch_prompts(sub):
+    """
+    The request a run makes for one submission, as a (persona, prompt) pair,
+    for Batch API mode (see batch_mode.py).
+    """
+    return [("pitch", build_prompt(sub.get("high_level_pitch", ""), sub.get("project_pitch", "")))]
+
+def evaluate_persona(sub, persona):
+    """
+    The evaluation of one submission, for job-queue workers (see
+    job_queue.py); `persona` is always "pitch". Returns None if the call failed.
+    """
+    return get_ai_evaluation(sub.get("high_level_pitch", ""), sub.get("project_pitch", ""), sub.get("id"))
+
+def pitch_text(sub):
+    """
+    The text compared by the near-duplicate pre-pass.
+    """
+    return f"{sub.get('high_level_pitch', '')} {sub.get('project_pitch', '')}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score hackathon pitches with GPT-4.")
+    parser.add_argument("--input", default="datain/submissions.json",
+                        help="submissions as a JSON array or a .jsonl file")
+    parser.add_argument("--pack", action="store_true",
+                        help="evaluate several short pitches per request")
+    parser.add_argument("--pack-size", type=int, default=PACK_SIZE,
+                        help=f"maximum submissions per packed request (default {PACK_SIZE})")
+    parser.add_argument("--dedup", action="store_true", default=DEDUP_MODE,
+                        help="evaluate one submission per cluster of near-duplicates and link the rest")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    start_profiling(args)
+
+    with stage("dedup"):
+        linker = DuplicateLinker(find_duplicates(iter_records(args.input), pitch_text) if args.dedup else {})
+
+    # Stream input from datain/submissions.json and write every result
+    # record to dataout/evaluate_submissions.jsonl as soon as it completes
+    results_file = "dataout/evaluate_submissions.jsonl"
+    with JsonlWriter(results_file) as writer:
+        if args.pack:
+            # Read enough submissions per window to keep every concurrent slot busy with a pack
+            for batch in iter_batches(profiled("load", iter_records(args.input)), STREAM_BATCH_SIZE * args.pack_size):
+                with stage("evaluate"):
+                    packs = pack_submissions(linker.originals(batch), args.pack_size)
+                    records = (entry for pack_results in run_jobs([(pack,) for pack in packs], evaluate_pack)
+                               for entry in pack_results)
+                with stage("write_results"):
+                    for result_entry in linker.link(batch, records):
+                        writer.write(result_entry)
+        else:
+            for batch in iter_batches(profiled("load", iter_records(args.input))):
+                with stage("evaluate"):
+                    records = run_jobs([(sub,) for sub in linker.originals(batch)], evaluate_submission)
+                with stage("write_results"):
+                    for result_entry in linker.link(batch, records):
+                        writer.write(result_entry)
 
-    # Sort results by overall_score descending
-    results.sort(key=lambda x: x["overall_score"], reverse=True)
+    # Separate pass: sort results by overall_score descending
+    with stage("rank"):
+        ranking = rank_jsonl(results_file)
 
     # Output to dataout/evaluate_submissions.json
-    with open("dataout/evaluate_submissions.json", "w", encoding="utf-8") as out:
-        json.dump(results, out, indent=2, ensure_ascii=False)
+    with stage("write_json"):
+        write_ranked_json(results_file, ranking, "dataout/evaluate_submissions.json")
 
     print("Evaluation complete. Results written to dataout/evaluate_submissions.json")
+    print(get_cache().summary())
+    report_run()
+    finish_profiling()
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
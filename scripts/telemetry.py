@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import threading
+
+# Every LLM call is appended to this JSON Lines file (one record per call).
+# Disable with: export EVAL_METRICS=off
+METRICS_PATH = os.environ.get("EVAL_METRICS_PATH", "metrics/llm_calls.jsonl")
+METRICS_ENABLED = os.environ.get("EVAL_METRICS", "on").lower() != "off"
+
+# Optional Prometheus textfile-collector export written at the end of a run,
+# e.g. export EVAL_PROMETHEUS_TEXTFILE=/var/lib/node_exporter/textfile/hackathon_eval.prom
+PROMETHEUS_TEXTFILE = os.environ.get("EVAL_PROMETHEUS_TEXTFILE")
+
+# USD per 1K tokens as (prompt, completion). Update when pricing changes.
+PRICES_PER_1K = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+def call_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = PRICES_PER_1K.get(model, (0.0, 0.0))
+    return ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1000.0
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class Telemetry:
+    """
+    Records one entry per LLM call (model, persona, submission id, tokens,
+    latency, retries, outcome, cost) to the metrics file, and keeps per
+    (model, persona) aggregates in memory for the end-of-run summary.
+    """
+
+    def __init__(self, path=METRICS_PATH, enabled=METRICS_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._file = None
+        self.groups = {}
+        self.counters = {}
+
+    def _write(self, record):
+        if self._file is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def record(self, model, persona, submission_id, prompt_tokens, completion_tokens,
+               latency_seconds, retries, outcome):
+        """
+        outcome is one of "ok", "cache_hit", "parse_error", "api_error" or
+        "stream_aborted" (a streamed reply given up on and sent again).
+        """
+        cost = 0.0 if outcome == "cache_hit" else call_cost(model, prompt_tokens, completion_tokens)
+        record = {
+            "ts": round(time.time(), 3),
+            "model": model,
+            "persona": persona,
+            "submission_id": submission_id,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency_seconds * 1000, 1),
+            "retries": retries,
+            "outcome": outcome,
+            "cost_usd": round(cost, 6),
+        }
+        with self._lock:
+            group = self.groups.setdefault((model, persona or "-"), {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0,
+                "cost_usd": 0.0, "latencies": [], "outcomes": {},
+            })
+            group["calls"] += 1
+            group["retries"] += retries
+            group["outcomes"][outcome] = group["outcomes"].get(outcome, 0) + 1
+            if outcome != "cache_hit":
+                group["prompt_tokens"] += prompt_tokens or 0
+                group["completion_tokens"] += completion_tokens or 0
+                group["cost_usd"] += cost
+                group["latencies"].append(latency_seconds)
+            if self.enabled:
+                self._write(record)
+
+    def count(self, name, n=1):
+        """
+        Bump a run-wide event counter, e.g. "structured_repaired".
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def structured_summary(self):
+        """
+        One line on structured replies: how many needed cleanup, failed the
+        schema, and were repaired by a follow-up (see structured_output.py).
+        """
+        c = self.counters
+        replies = c.get("structured_replies", 0)
+        if not replies:
+            return None
+        failed = c.get("structured_unparsable", 0) + c.get("structured_invalid", 0)
+        attempts = c.get("structured_repair_attempts", 0)
+
+        def rate(n, total):
+            return f"{100.0 * n / total:.1f}%" if total else "0.0%"
+
+        return (f"Structured replies: {replies} parsed, {c.get('structured_cleaned', 0)} needed cleanup, "
+                f"{failed} failed the schema ({rate(failed, replies)}), "
+                f"{c.get('structured_repaired', 0)} of {attempts} repaired by a follow-up "
+                f"({rate(c.get('structured_repaired', 0), attempts)}), "
+                f"{c.get('structured_unrepaired', 0)} unrepaired")
+
+    def stream_summary(self):
+        """
+        One line on streamed replies: how many were closed as soon as their
+        JSON was complete, given up on, or cut off by their max_tokens cap
+        (see json_stream.py).
+        """
+        c = self.counters
+        streamed = c.get("stream_replies", 0)
+        if not streamed:
+            return None
+        return (f"Streamed replies: {streamed}, {c.get('stream_completed_early', 0)} closed as soon as their JSON "
+                f"was complete, {c.get('stream_aborted', 0)} given up on (prose without JSON) and sent again, "
+                f"{c.get('stream_capped', 0)} cut off by max_tokens")
+
+    def totals(self, include=None):
+        """
+        Sum calls, tokens and cost over the (model, persona) groups for which
+        `include(model, persona)` is true (all groups by default).
+        """
+        totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        with self._lock:
+            for (model, persona), g in self.groups.items():
+                if include is None or include(model, persona):
+                    for key in totals:
+                        totals[key] += g[key]
+        return totals
+
+    def summary(self):
+        """
+        End-of-run table: calls, tokens, cost and latency per model and persona.
+        """
+        with self._lock:
+            if not self.groups:
+                return "LLM calls: none"
+            lines = [f"{'model':<14} {'persona':<22} {'calls':>6} {'cached':>6} {'failed':>6} {'retries':>7} "
+                     f"{'prompt tok':>10} {'compl tok':>9} {'cost $':>9} {'p50 ms':>8} {'p95 ms':>8}"]
+            totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+            for (model, persona), g in sorted(self.groups.items(), key=lambda item: -item[1]["cost_usd"]):
+                latencies = sorted(g["latencies"])
+                failed = g["outcomes"].get("parse_error", 0) + g["outcomes"].get("api_error", 0)
+                lines.append(
+                    f"{model:<14} {persona[:22]:<22} {g['calls']:>6} {g['outcomes'].get('cache_hit', 0):>6} "
+                    f"{failed:>6} {g['retries']:>7} {g['prompt_tokens']:>10} {g['completion_tokens']:>9} "
+                    f"{g['cost_usd']:>9.4f} {_percentile(latencies, 50) * 1000:>8.0f} "
+                    f"{_percentile(latencies, 95) * 1000:>8.0f}"
+                )
+                for key in totals:
+                    totals[key] += g[key]
+            lines.append(
+                f"Total: {totals['calls']} calls, {totals['prompt_tokens']} prompt + "
+                f"{totals['completion_tokens']} completion tokens, ${totals['cost_usd']:.4f}"
+                + (f" (per-call records in {self.path})" if self.enabled else "")
+            )
+            structured = self.structured_summary()
+            if structured:
+                lines.append(structured)
+            streamed = self.stream_summary()
+            if streamed:
+                lines.append(streamed)
+            return "\n".join(lines)
+
+    def write_prometheus(self, path):
+        """
+        Write the aggregates in Prometheus text format, atomically (write to a
+        temporary file, then rename) as the node_exporter textfile collector expects.
+        """
+        with self._lock:
+            lines = [
+                "# HELP hackathon_eval_llm_calls_total LLM calls by outcome.",
+                "# TYPE hackathon_eval_llm_calls_total counter",
+            ]
+            for (model, persona), g in sorted(self.groups.items()):
+                for outcome, count in sorted(g["outcomes"].items()):
+                    lines.append(f'hackathon_eval_llm_calls_total{{model="{model}",persona="{persona}",outcome="{outcome}"}} {count}')
+            lines += [
+                "# HELP hackathon_eval_llm_tokens_total Tokens sent and received.",
+                "# TYPE hackathon_eval_llm_tokens_total counter",
+            ]
+            for (model, persona), g in sorted(self.groups.items()):
+                lines.append(f'hackathon_eval_llm_tokens_total{{model="{model}",persona="{persona}",kind="prompt"}} {g["prompt_tokens"]}')
+                lines.append(f'hackathon_eval_llm_tokens_total{{model="{model}",persona="{persona}",kind="completion"}} {g["completion_tokens"]}')
+            lines += [
+                "# HELP hackathon_eval_llm_cost_usd_total Estimated spend in USD.",
+                "# TYPE hackathon_eval_llm_cost_usd_total counter",
+            ]
+            for (model, persona), g in sorted(self.groups.items()):
+                lines.append(f'hackathon_eval_llm_cost_usd_total{{model="{model}",persona="{persona}"}} {g["cost_usd"]:.6f}')
+            lines += [
+                "# HELP hackathon_eval_llm_retries_total Retried attempts.",
+                "# TYPE hackathon_eval_llm_retries_total counter",
+            ]
+            for (model, persona), g in sorted(self.groups.items()):
+                lines.append(f'hackathon_eval_llm_retries_total{{model="{model}",persona="{persona}"}} {g["retries"]}')
+            lines += [
+                "# HELP hackathon_eval_llm_latency_seconds Wall latency per uncached call.",
+                "# TYPE hackathon_eval_llm_latency_seconds summary",
+            ]
+            for (model, persona), g in sorted(self.groups.items()):
+                latencies = sorted(g["latencies"])
+                for q in (0.5, 0.95, 0.99):
+                    lines.append(f'hackathon_eval_llm_latency_seconds{{model="{model}",persona="{persona}",quantile="{q}"}} '
+                                 f'{_percentile(latencies, q * 100):.4f}')
+                lines.append(f'hackathon_eval_llm_latency_seconds_sum{{model="{model}",persona="{persona}"}} {sum(latencies):.4f}')
+                lines.append(f'hackathon_eval_llm_latency_seconds_count{{model="{model}",persona="{persona}"}} {len(latencies)}')
+            lines += [
+                "# HELP hackathon_eval_events_total Run-wide events, e.g. structured-output repairs.",
+                "# TYPE hackathon_eval_events_total counter",
+            ]
+            for name, count in sorted(self.counters.items()):
+                lines.append(f'hackathon_eval_events_total{{event="{name}"}} {count}')
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+def get_telemetry():
+    """
+    Process-wide telemetry shared by every script and thread.
+    """
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry()
+        return _telemetry
+
+def report_run():
+    """
+    End of a run: print the summary, write the Prometheus file if one is
+    configured, and close the metrics file.
+    """
+    telemetry = get_telemetry()
+    print(telemetry.summary())
+    if PROMETHEUS_TEXTFILE:
+        telemetry.write_prometheus(PROMETHEUS_TEXTFILE)
+        print(f"Prometheus metrics written to {PROMETHEUS_TEXTFILE}")
+    telemetry.close()
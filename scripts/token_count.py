@@ -0,0 +1,71 @@
+import importlib.util
+
+# tiktoken is optional (without it counts fall back to a character-based
+# estimate) and is only imported on the first count, to keep startup fast
+HAVE_TIKTOKEN = importlib.util.find_spec("tiktoken") is not None
+
+# Rough average for English prose and code with the GPT-4 tokenizer
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+
+def _get_encoding(model):
+    if model not in _encodings:
+        import tiktoken
+
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+def estimate_tokens(text, model="gpt-4"):
+    """
+    Count the tokens `text` will use for `model`.
+    Exact when tiktoken is installed, otherwise a ~4 characters per token estimate.
+    """
+    if not text:
+        return 0
+    if HAVE_TIKTOKEN:
+        return len(_get_encoding(model).encode(text))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4"):
+    """
+    Cut `text` down to at most `max_tokens` tokens.
+    """
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+    if HAVE_TIKTOKEN:
+        encoding = _get_encoding(model)
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[:max(0, (max_tokens - 1) * CHARS_PER_TOKEN)]
+
+def split_into_chunks(text, max_tokens, model="gpt-4"):
+    """
+    Split `text` into chunks of at most `max_tokens` tokens, breaking on line
+    boundaries where possible so code and markdown stay readable.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = estimate_tokens(line, model)
+        # A single line longer than a chunk is hard-split
+        while line_tokens > max_tokens:
+            head = truncate_to_tokens(line, max_tokens, model) or line[:CHARS_PER_TOKEN]
+            if current:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            chunks.append(head)
+            line = line[len(head):]
+            line_tokens = estimate_tokens(line, model)
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        if line:
+            current.append(line)
+            current_tokens += line_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import threading
+
+from eval_engine import run_jobs
+from leaderboard import write_csv_atomic
+from llm_client import chat_completion
+from structured_output import extract_json
+
+# Pairwise ranking stage for the finalists: absolute 1-5 scores tie a lot
+# near the top, so the top K are re-ordered by asking the model which of two
+# candidates is stronger. A bottom-up merge sort needs at most about
+# K*log2(K) comparisons instead of all K*(K-1)/2 pairs, and the merges of each
+# round run concurrently. Every comparison goes through the response cache,
+# and the order a pair is shown in depends only on the pair, so reruns and
+# overlapping top-K lists cost nothing.
+TOURNAMENT_SIZE = int(os.environ.get("EVAL_TOURNAMENT_SIZE", "20"))
+COMPARISON_MAX_TOKENS = int(os.environ.get("EVAL_TOURNAMENT_MAX_TOKENS", "200"))
+# Ask each pair in both orders and keep the score order when the answers
+# disagree, so a model's preference for the first (or second) candidate
+# can't decide the ranking. Off halves the calls.
+BOTH_ORDERS = os.environ.get("EVAL_TOURNAMENT_BOTH_ORDERS", "on").lower() != "off"
+
+def pair_order(a, b):
+    """
+    `a` and `b` in the order they are first shown to the model: fixed for
+    the pair, so it is cached, but not the id order, which would put the
+    same candidates in position A every time.
+    """
+    first, second = sorted((a, b), key=lambda record: str(record.get("id")))
+    digest = hashlib.sha256(f"{first.get('id')}\0{second.get('id')}".encode("utf-8")).digest()
+    return (first, second) if digest[0] % 2 == 0 else (second, first)
+
+def build_comparison_prompt(context, text_a, text_b):
+    """
+    Ask which of two candidates is stronger, as JSON {"winner": "A"|"B", "reason"}.
+    """
+    prompt_template = f"""
+You are the selection committee comparing two finalists that scored about the same.
+
+Context:
+{context}
+
+=== CANDIDATE A ===
+{text_a}
+
+=== CANDIDATE B ===
+{text_b}
+
+Which candidate is the stronger choice overall? Judge only the content, not the
+order or length of the two texts. Answer "A" or "B" and give a one-sentence reason.
+
+Return ONLY valid JSON:
+{{
+  "winner": "A|B",
+  "reason": "..."
+}}
+"""
+    return prompt_template.strip()
+
+class Tournament:
+    """
+    Ranks records best-first with pairwise LLM comparisons.
+    `text_of(record)` renders a candidate for the prompt; a comparison the
+    model fails to answer falls back to the records' `score_key`.
+    """
+
+    def __init__(self, client, model, context, text_of, score_key="overall_score", persona="tournament",
+                 both_orders=BOTH_ORDERS):
+        self.client = client
+        self.model = model
+        self.context = context
+        self.text_of = text_of
+        self.score_key = score_key
+        self.persona = persona
+        self.both_orders = both_orders
+        self.comparisons = 0
+        self.fallbacks = 0
+        self.disagreements = 0
+        self.wins = {}
+        self.reasons = []
+        self._lock = threading.Lock()
+
+    def _ask(self, first, second):
+        prompt_text = build_comparison_prompt(self.context, self.text_of(first), self.text_of(second))
+        try:
+            reply = chat_completion(self.client, self.model, prompt_text, parse=extract_json,
+                                    max_tokens=COMPARISON_MAX_TOKENS, persona=self.persona,
+                                    submission_id=f"{first.get('id')} vs {second.get('id')}")
+            winner = str(reply.get("winner", "")).strip().upper() if isinstance(reply, dict) else ""
+            if winner in ("A", "B"):
+                return winner == "A", reply.get("reason", "")
+        except Exception as e:
+            print(f"Comparison {first.get('id')} vs {second.get('id')} failed: {e}")
+        return None, None
+
+    def better(self, a, b):
+        """
+        True if `a` should rank above `b`.
+        """
+        first, second = pair_order(a, b)
+        first_wins, reason = self._ask(first, second)
+        disagree = False
+        if self.both_orders:
+            second_wins, swapped_reason = self._ask(second, first)
+            if first_wins is None:
+                first_wins, reason = (None if second_wins is None else not second_wins), swapped_reason
+            elif second_wins is not None and second_wins == first_wins:
+                disagree = True
+                first_wins = reason = None
+        with self._lock:
+            self.comparisons += 1
+            if first_wins is None:
+                # Keep the score order (and the current order on a tie)
+                if disagree:
+                    self.disagreements += 1
+                else:
+                    self.fallbacks += 1
+                a_wins = a.get(self.score_key, 0) >= b.get(self.score_key, 0)
+            else:
+                a_wins = first_wins == (first is a)
+            winner = a if a_wins else b
+            self.wins[winner.get("id")] = self.wins.get(winner.get("id"), 0) + 1
+            if reason:
+                self.reasons.append({"winner": winner.get("id"), "loser": (b if a_wins else a).get("id"),
+                                     "reason": reason})
+        return a_wins
+
+    def _merge(self, left, right):
+        merged = []
+        i = j = 0
+        while i < len(left) and j < len(right):
+            if self.better(left[i], right[j]):
+                merged.append(left[i])
+                i += 1
+            else:
+                merged.append(right[j])
+                j += 1
+        return merged + left[i:] + right[j:]
+
+    def rank(self, records):
+        """
+        Bottom-up merge sort of `records` (best first). All merges of a round
+        are independent and run concurrently; each merge compares in turn.
+        """
+        runs = [[record] for record in records]
+        while len(runs) > 1:
+            pairs = [(runs[i], runs[i + 1]) for i in range(0, len(runs) - 1, 2)]
+            merged = run_jobs(pairs, self._merge)
+            if len(runs) % 2:
+                merged.append(runs[-1])
+            runs = merged
+        return runs[0] if runs else []
+
+    def report(self, size):
+        all_pairs = size * (size - 1) // 2
+        orders = " (each asked in both orders)" if self.both_orders else ""
+        return (f"Tournament: top {size} re-ranked with {self.comparisons} pairwise comparisons{orders} "
+                f"(all pairs would be {all_pairs}), {self.disagreements} answered differently in the two "
+                f"orders and {self.fallbacks} failed (these keep the score order)")
+
+def write_tournament_outputs(output_folder, ranked, tournament, score_key="overall_score"):
+    """
+    tournament_ranking.csv (refined rank next to the score rank) and
+    tournament_comparisons.json (each decided comparison and its reason).
+    """
+    score_order = sorted(ranked, key=lambda record: record.get(score_key, 0), reverse=True)
+    score_rank = {record.get("id"): rank for rank, record in enumerate(score_order, start=1)}
+    rows = [["rank", "id", "score_rank", score_key, "comparisons_won"]]
+    for rank, record in enumerate(ranked, start=1):
+        rows.append([rank, record.get("id"), score_rank[record.get("id")], record.get(score_key, 0),
+                     tournament.wins.get(record.get("id"), 0)])
+    ranking_file = os.path.join(output_folder, "tournament_ranking.csv")
+    write_csv_atomic(ranking_file, rows)
+    with open(os.path.join(output_folder, "tournament_comparisons.json"), "w", encoding="utf-8") as out:
+        json.dump(tournament.reasons, out, indent=2, ensure_ascii=False)
+    return ranking_file
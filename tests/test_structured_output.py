@@ -0,0 +1,28 @@
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from structured_output import _extract, _fix_syntax  # noqa: E402
+
+def test_trailing_comma_keeps_outer_object():
+    value, cleaned = _extract('{"a_score_1": 3, "open_questions": ["x","y"], "summary": "s",}')
+    assert value == {"a_score_1": 3, "open_questions": ["x", "y"], "summary": "s"}
+    assert cleaned
+
+def test_trailing_comma_keeps_outer_object_over_nested_one():
+    value, _ = _extract('Here it is: {"a": {"b": 1}, "summary": "s",\n}')
+    assert value == {"a": {"b": 1}, "summary": "s"}
+
+def test_fixes_leave_string_contents_alone():
+    value, _ = _extract('{"summary": "It is True, really “quoted”", "flag": True, "list": [1, 2,],}')
+    assert value == {"summary": "It is True, really “quoted”", "flag": True, "list": [1, 2]}
+
+def test_smart_quoted_strings():
+    assert _fix_syntax('{“summary”: “ok, None”}') == '{"summary": "ok, None"}'
+
+def test_fenced_reply():
+    value, cleaned = _extract('Sure:\n```json\n{"a_score_1": 4, "summary": "s"}\n```\nDone.')
+    assert value == {"a_score_1": 4, "summary": "s"}
+    assert cleaned